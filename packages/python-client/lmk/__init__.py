@@ -1,29 +1,89 @@
-import lmk.patches
+"""
+``import lmk`` only loads this module and ``lmk.constants``. The API client (including
+the generated models and aiohttp) and the Jupyter integration are imported the first
+time an attribute that needs them is accessed, e.g. ``lmk.notify``, so that scripts
+that only notify at the end don't pay for them at startup.
+"""
 
-lmk.patches.patch()
+import importlib
+import importlib.util
+import sys
 
-from lmk import jupyter, methods  # noqa: E402
-from lmk.constants import VERSION as __version__  # noqa: E402
-from lmk.instance import get_instance, set_instance  # noqa: E402
-from lmk.jupyter import (  # noqa: E402
-    _jupyter_labextension_paths,
-    _jupyter_nbextension_paths,
-)
+from lmk.constants import VERSION as __version__  # noqa: F401
 
-__all__ = [
+# Attributes that are loaded from other modules on first access
+LAZY_ATTRIBUTES = {
+    "jupyter": ("lmk.jupyter", None),
+    "methods": ("lmk.methods", None),
+    "get_instance": ("lmk.instance", "get_instance"),
+    "set_instance": ("lmk.instance", "set_instance"),
+    "LoggingHandler": ("lmk.log_handler", "LoggingHandler"),
+    "install_excepthook": ("lmk.excepthook", "install_excepthook"),
+    "progress": ("lmk.progress_bar", "progress"),
+    "log_metric": ("lmk.progress_bar", "log_metric"),
+    "monitor": ("lmk.monitoring", "monitor"),
+    "enable_aggregation": ("lmk.aggregation", "enable_aggregation"),
+    "_jupyter_labextension_paths": ("lmk.jupyter.hooks", "_jupyter_labextension_paths"),
+    "_jupyter_nbextension_paths": ("lmk.jupyter.hooks", "_jupyter_nbextension_paths"),
+}
+
+STATIC_ALL = [
     "__version__",
     "jupyter",
     "get_instance",
     "set_instance",
+    "LoggingHandler",
+    "install_excepthook",
+    "progress",
+    "log_metric",
+    "monitor",
+    "enable_aggregation",
     "_jupyter_labextension_paths",
     "_jupyter_nbextension_paths",
 ]
-__all__ += methods.__all__
+
+
+def _load(name: str):
+    module_name, attr = LAZY_ATTRIBUTES[name]
+    module = importlib.import_module(module_name)
+    value = module if attr is None else getattr(module, attr)
+    globals()[name] = value
+    return value
 
 
 def __getattr__(name: str):
-    if name in globals():
-        return globals()[name]
+    if name in LAZY_ATTRIBUTES:
+        return _load(name)
+    if name == "__all__":
+        methods = _load("methods")
+        value = STATIC_ALL + methods.__all__
+        globals()["__all__"] = value
+        return value
+    # Instance methods such as notify() are looked up on the current default
+    # instance each time, so they're never cached here
+    methods = globals().get("methods")
+    if methods is not None and name in methods.__all__:
+        return getattr(methods, name)
+    # `from lmk import exc` checks for an attribute before importing the submodule, so
+    # submodules must not trigger loading methods (which imports them in turn)
+    if name.startswith("__") or importlib.util.find_spec(f"{__name__}.{name}"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    methods = _load("methods")
     if name in methods.__all__:
         return getattr(methods, name)
     raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__getattr__("__all__")))
+
+
+def _in_ipython() -> bool:
+    ipython = sys.modules.get("IPython")
+    return ipython is not None and ipython.get_ipython() is not None
+
+
+# In IPython, importing lmk.jupyter registers the %lmk magics and Colab support,
+# which users expect from just ``import lmk``
+if _in_ipython():
+    _load("jupyter")
@@ -0,0 +1,587 @@
+import asyncio
+import atexit
+import collections
+import contextlib
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import socket
+import tempfile
+import threading
+import time
+from typing import (
+    Any,
+    Awaitable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    TYPE_CHECKING,
+    cast,
+)
+
+from lmk.dedup import DEFAULT_NORMALIZERS, normalize_message
+from lmk.instance import get_instance
+from lmk.utils.asyncio import asyncio_event
+
+if TYPE_CHECKING:
+    from lmk.instance import Instance
+
+
+LOGGER = logging.getLogger(__name__)
+
+# (rank, world size, local rank) environment variables set by common launchers, in
+# order of preference
+RANK_ENV_VARS = [
+    ("RANK", "WORLD_SIZE", "LOCAL_RANK"),  # torchrun, accelerate, deepspeed
+    ("SLURM_PROCID", "SLURM_NTASKS", "SLURM_LOCALID"),
+    ("OMPI_COMM_WORLD_RANK", "OMPI_COMM_WORLD_SIZE", "OMPI_COMM_WORLD_LOCAL_RANK"),
+    ("PMI_RANK", "PMI_SIZE", "MPI_LOCALRANKID"),
+]
+
+# Environment variables that identify a job, used to pick the aggregator socket
+JOB_ID_ENV_VARS = [
+    "LMK_AGGREGATE_ID",
+    "TORCHELASTIC_RUN_ID",
+    "SLURM_JOB_ID",
+    "OMPI_MCA_orte_ess_jobid",
+]
+
+MAX_MESSAGE_LENGTH = 4000
+
+MAX_PENDING = 1000
+
+# Messages from different ranks often only differ by the rank itself
+SUMMARY_NORMALIZERS = [
+    (re.compile(r"\b(rank|worker)([\s:=#]*)\d+\b", re.I), r"\1\2<rank>"),
+] + DEFAULT_NORMALIZERS
+
+
+@dataclasses.dataclass
+class RankInfo:
+    """
+    Where this process is in a distributed job
+    """
+
+    rank: int
+    world_size: int
+    local_rank: int
+
+
+def detect_rank() -> Optional[RankInfo]:
+    """
+    Detect this process's rank from the environment variables set by ``torchrun``,
+    SLURM, Open MPI or MPICH.
+
+    :return: The rank, or ``None`` if this doesn't look like a distributed job
+    :rtype: RankInfo, optional
+    """
+    for rank_var, size_var, local_var in RANK_ENV_VARS:
+        rank = os.getenv(rank_var)
+        size = os.getenv(size_var)
+        if rank is None or size is None:
+            continue
+        try:
+            info = RankInfo(int(rank), int(size), int(os.getenv(local_var, rank)))
+        except ValueError:
+            continue
+        if info.world_size > 1:
+            return info
+    return None
+
+
+def default_socket_path() -> str:
+    """
+    The aggregator socket for the current job. It's derived from the job ID environment
+    variables (or the master address and port, or the parent process), so that all
+    workers of a job on a host agree on it.
+    """
+    job_id = next((os.environ[var] for var in JOB_ID_ENV_VARS if os.getenv(var)), None)
+    if job_id is None and os.getenv("MASTER_ADDR") and os.getenv("MASTER_PORT"):
+        job_id = f"{os.environ['MASTER_ADDR']}:{os.environ['MASTER_PORT']}"
+    if job_id is None:
+        job_id = f"ppid-{os.getppid()}"
+    uid = os.getuid() if hasattr(os, "getuid") else 0
+    digest = hashlib.sha256(f"{uid}:{job_id}".encode()).hexdigest()[:16]
+    # Unix socket paths are limited to ~100 characters, so these go in the temp dir
+    return os.path.join(tempfile.gettempdir(), f"lmk-agg-{digest}.sock")
+
+
+def _format_ranks(ranks: List[int]) -> str:
+    ranges: List[str] = []
+    for rank in sorted(set(ranks)):
+        if ranges and ranges[-1].rsplit("-", 1)[-1] == str(rank - 1):
+            ranges[-1] = f"{ranges[-1].split('-')[0]}-{rank}"
+        else:
+            ranges.append(str(rank))
+    noun = "rank" if len(ranges) == 1 and "-" not in ranges[0] else "ranks"
+    return f"{noun} {', '.join(ranges)}"
+
+
+def format_summary(events: List[Dict[str, Any]], world_size: int) -> str:
+    """
+    Format notifications from several ranks as a single markdown message. Messages that
+    are the same once timestamps, IDs and such are normalized out are listed once, with
+    the ranks that sent them.
+    """
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for event in events:
+        key = normalize_message(event["message"], SUMMARY_NORMALIZERS)
+        groups.setdefault(key, []).append(event)
+
+    ranks = {event["rank"] for event in events}
+    lines = [f"**Notifications from {len(ranks)} of {world_size} workers**", ""]
+    for group in groups.values():
+        summary = group[0]["message"].strip().splitlines()
+        first_line = summary[0][:200] if summary else ""
+        count = (
+            f" ({len(group)}x)" if len(group) > len({e["rank"] for e in group}) else ""
+        )
+        lines.append(
+            f"- {_format_ranks([event['rank'] for event in group])}{count}: {first_line}"
+        )
+
+    message = "\n".join(lines)[: MAX_MESSAGE_LENGTH // 2]
+    # Include the first message in full, e.g. for its traceback
+    first = events[0]["message"]
+    if "\n" in first.strip():
+        remaining = MAX_MESSAGE_LENGTH - len(message)
+        message += f"\n\n---\n\n{first[:remaining]}"
+    return message
+
+
+class Aggregator:
+    """
+    Aggregates notifications, progress and metrics from the processes of a distributed
+    job, so that a job with many workers sends one summary notification and reports to
+    one session. The process with local rank 0 (the leader) listens on a unix socket;
+    the other workers on the host send their notifications and session updates to it
+    rather than to the LMK API. The leader collects notifications for ``window`` seconds
+    after the first one and sends them as a single summary, and reports everyone's
+    progress bars and metrics through its ``ProgressReporter``.
+
+    Workers write to the socket from a background thread, so ``notify()`` never waits
+    on it. If a worker can't reach the leader within ``connect_timeout`` seconds, it
+    sends its notifications directly. Since unix sockets are local, a job that spans
+    several hosts gets one summary per host. Durable notifications aren't aggregated,
+    since they have to be saved in the outbox before ``notify()`` returns.
+
+    Use ``lmk.enable_aggregation()`` to create one.
+    """
+
+    def __init__(
+        self,
+        rank: RankInfo,
+        instance: Optional["Instance"] = None,
+        socket_path: Optional[str] = None,
+        window: float = 10.0,
+        connect_timeout: float = 30.0,
+        exit_timeout: float = 5.0,
+    ) -> None:
+        self.rank = rank
+        self.instance = instance
+        self.socket_path = socket_path or default_socket_path()
+        self.window = window
+        self.connect_timeout = connect_timeout
+        self.exit_timeout = exit_timeout
+        self.is_leader = rank.local_rank == 0
+
+        # Leader state
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self.events: List[Dict[str, Any]] = []
+        self._summary_handle: Optional[asyncio.TimerHandle] = None
+        self._stopped: Optional[asyncio.Event] = None
+        self._started = threading.Event()
+        self._clients: Dict["asyncio.Task[None]", asyncio.StreamWriter] = {}
+
+        # Worker state. Lines are put on _queue by the caller and written to the
+        # socket by the worker thread; _lock is held while writing
+        self._sock: Optional[socket.socket] = None
+        self._queue: "queue.SimpleQueue[bytes]" = queue.SimpleQueue()
+        self._pending: Deque[bytes] = collections.deque(maxlen=MAX_PENDING)
+        self._first_failure: Optional[float] = None
+        self._last_attempt = 0.0
+        self._fallback = False
+        self._closed = False
+        self._wakeup = threading.Event()
+        self._worker_thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def _instance(self) -> "Instance":
+        return self.instance if self.instance is not None else get_instance()
+
+    def start(self) -> None:
+        if self.is_leader:
+            loop = asyncio.new_event_loop()
+            self.loop = loop
+            self._stopped = asyncio_event(loop=loop)
+            self.thread = threading.Thread(
+                target=self._run, args=(loop,), name="lmk-aggregator", daemon=True
+            )
+            self.thread.start()
+            self._started.wait(5)
+        atexit.register(self.close)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Send pending notifications, waiting at most ``timeout`` seconds (defaults to
+        ``exit_timeout``). The leader sends its summary right away.
+        """
+        if timeout is None:
+            timeout = self.exit_timeout
+        atexit.unregister(self.close)
+        if not self.is_leader:
+            self._closed = True
+            self._wakeup.set()
+            with self._lock:
+                self._flush_pending(force=True)
+                if self._sock is not None:
+                    self._sock.close()
+                    self._sock = None
+            thread = self._worker_thread
+            if thread is not None and thread is not threading.current_thread():
+                thread.join(timeout)
+            return
+
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+        with contextlib.suppress(RuntimeError):
+            loop.call_soon_threadsafe(self._stopped.set)  # type: ignore
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+            if self.thread.is_alive():
+                LOGGER.warning(
+                    "Timed out after %.2fs sending aggregated notifications", timeout
+                )
+
+    # Called by Instance.notify()
+
+    def submit(
+        self,
+        message: str,
+        content_type: str,
+        notification_channels: Optional[List[str]],
+        notify: bool,
+        job: Optional[str] = None,
+    ) -> None:
+        event = {
+            "rank": self.rank.rank,
+            "message": message,
+            "content_type": content_type,
+            "notification_channels": notification_channels,
+            "notify": notify,
+            "job": job,
+        }
+        if self.is_leader:
+            loop = self.loop
+            if loop is not None and not loop.is_closed():
+                loop.call_soon_threadsafe(self._add_event, event)
+                return
+            self._send_direct([event])
+            return
+        self._send({"type": "event", "event": event})
+
+    # Called by ProgressReporter on workers
+
+    def forward_update(self, message: Dict[str, Any]) -> None:
+        self._send({"type": "update", "rank": self.rank.rank, "message": message})
+
+    # Worker side
+
+    def _send(self, data: Dict[str, Any]) -> None:
+        if self._fallback:
+            self._send_fallback([data])
+            return
+        self._queue.put((json.dumps(data) + "\n").encode())
+        self._ensure_worker_started()
+        self._wakeup.set()
+
+    def _ensure_worker_started(self) -> None:
+        if self._worker_thread is not None:
+            return
+        with self._lock:
+            if self._worker_thread is None:
+                thread = threading.Thread(
+                    target=self._run_worker, name="lmk-aggregator-worker", daemon=True
+                )
+                thread.start()
+                self._worker_thread = thread
+
+    def _run_worker(self) -> None:
+        while not self._closed:
+            # While the leader can't be reached, try again every second
+            self._wakeup.wait(1.0 if self._pending else None)
+            self._wakeup.clear()
+            with self._lock:
+                if self._closed:
+                    break
+                self._flush_pending()
+
+    def _take_queued(self) -> None:
+        while True:
+            try:
+                self._pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                return
+
+    def _connect(self, force: bool = False) -> bool:
+        now = time.monotonic()
+        if not force and now - self._last_attempt < 1.0:
+            return False
+        self._last_attempt = now
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(1.0)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            if self._first_failure is None:
+                self._first_failure = now
+            return False
+        self._sock = sock
+        self._first_failure = None
+        return True
+
+    def _flush_pending(self, force: bool = False) -> None:
+        self._take_queued()
+        while self._pending:
+            if self._sock is None and not self._connect(force):
+                if force or (
+                    self._first_failure is not None
+                    and time.monotonic() - self._first_failure >= self.connect_timeout
+                ):
+                    LOGGER.warning(
+                        "Unable to reach the aggregator at %s; sending notifications "
+                        "directly",
+                        self.socket_path,
+                    )
+                    self._fallback = not force
+                    pending = [json.loads(line) for line in self._pending]
+                    self._pending.clear()
+                    self._send_fallback(pending)
+                return
+            try:
+                self._sock.sendall(self._pending[0])  # type: ignore
+            except OSError:
+                LOGGER.debug("Aggregator connection lost", exc_info=True)
+                self._sock.close()  # type: ignore
+                self._sock = None
+                self._first_failure = time.monotonic()
+                continue
+            self._pending.popleft()
+
+    def _send_fallback(self, items: List[Dict[str, Any]]) -> None:
+        events = [item["event"] for item in items if item["type"] == "event"]
+        if events:
+            self._send_direct(events)
+
+    def _send_direct(self, events: List[Dict[str, Any]]) -> None:
+        instance = self._instance
+        for event in events:
+            instance.notify(
+                event["message"],
+                content_type=event["content_type"],
+                notification_channels=event["notification_channels"],
+                notify=event["notify"],
+                job=event.get("job"),
+                deferred=True,
+                aggregate=False,
+            )
+
+    # Leader side
+
+    def _run(self, loop: asyncio.AbstractEventLoop) -> None:
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self._main())
+        except Exception:
+            LOGGER.exception("Error in aggregator")
+            self._started.set()
+        finally:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+    async def _main(self) -> None:
+        stopped = self._stopped
+        assert stopped is not None
+
+        with contextlib.suppress(FileNotFoundError):
+            # Left over from an earlier run of the same job
+            os.remove(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        LOGGER.debug("Aggregator listening on %s", self.socket_path)
+        self._started.set()
+        try:
+            await stopped.wait()
+        finally:
+            server.close()
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.socket_path)
+            # Workers keep their connections open until they exit, and on Python
+            # 3.12+ wait_closed() waits for every connection, so they're closed here
+            # rather than holding up the summary
+            for task, writer in list(self._clients.items()):
+                writer.close()
+                task.cancel()
+            if self._clients:
+                await asyncio.wait(list(self._clients))
+            await self._send_summary()
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(server.wait_closed(), 1.0)
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        task = cast("asyncio.Task[None]", asyncio.current_task())
+        self._clients[task] = writer
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    data = json.loads(line)
+                    if data["type"] == "event":
+                        self._add_event(data["event"])
+                    elif data["type"] == "update":
+                        reporter = self._instance.progress_reporter
+                        reporter.add_remote(data["rank"], data["message"])
+                except (ValueError, KeyError, TypeError):
+                    LOGGER.warning("Invalid aggregator message: %r", line[:200])
+        except (asyncio.CancelledError, ConnectionError):
+            pass
+        finally:
+            self._clients.pop(task, None)
+            writer.close()
+
+    def _add_event(self, event: Dict[str, Any]) -> None:
+        self.events.append(event)
+        if self._summary_handle is None:
+            loop = cast(asyncio.AbstractEventLoop, self.loop)
+            self._summary_handle = loop.call_later(
+                self.window, lambda: asyncio.ensure_future(self._send_summary())
+            )
+
+    async def _send_summary(self) -> None:
+        if self._summary_handle is not None:
+            self._summary_handle.cancel()
+            self._summary_handle = None
+        events, self.events = self.events, []
+        if not events:
+            return
+
+        groups: Dict[Tuple[Any, ...], List[Dict[str, Any]]] = {}
+        for event in events:
+            channels = event["notification_channels"]
+            key = (
+                event["notify"],
+                None if channels is None else tuple(channels),
+                event.get("job"),
+            )
+            groups.setdefault(key, []).append(event)
+
+        instance = self._instance
+        for (notify, channels, job), group in groups.items():
+            if len(group) == 1:
+                event = group[0]
+                message, content_type = event["message"], event["content_type"]
+            else:
+                message = format_summary(group, self.rank.world_size)
+                content_type = "text/markdown"
+            try:
+                await cast(
+                    Awaitable[Any],
+                    instance.notify(
+                        message,
+                        content_type=content_type,
+                        notification_channels=None
+                        if channels is None
+                        else list(channels),
+                        notify=notify,
+                        job=job,
+                        async_req=True,
+                        aggregate=False,
+                    ),
+                )
+            except Exception:
+                LOGGER.warning("Unable to send aggregated notification", exc_info=True)
+
+
+def enable_aggregation(
+    rank: Optional[int] = None,
+    world_size: Optional[int] = None,
+    local_rank: Optional[int] = None,
+    instance: Optional["Instance"] = None,
+    socket_path: Optional[str] = None,
+    window: float = 10.0,
+) -> Optional[Aggregator]:
+    """
+    Aggregate notifications, progress bars and metrics from all processes of a
+    distributed job (e.g. under ``torchrun`` or SLURM) into one summary notification and
+    one session. Call this in every process; the rank is detected from the launcher's
+    environment variables unless given. The process with local rank 0 collects
+    everyone's notifications for ``window`` seconds and sends a single summary.
+
+    <details><summary>Usage Example</summary>
+    <p>
+
+    ```python
+    import lmk
+
+    lmk.enable_aggregation()
+
+    # With 64 workers, this sends one notification listing the ranks that failed
+    try:
+        train()
+    except Exception as err:
+        lmk.notify(f"Training failed: {err}")
+        raise
+    ```
+    </p>
+    </details>
+
+    :param rank: This process's rank. Defaults to the detected rank
+    :type rank: int, optional
+    :param world_size: The number of processes. Defaults to the detected world size
+    :type world_size: int, optional
+    :param local_rank: This process's rank on this host. Defaults to the detected local
+    rank, or ``rank``
+    :type local_rank: int, optional
+    :param instance: The instance to aggregate. Defaults to the default instance
+    :type instance: Instance, optional
+    :param socket_path: The unix socket the leader listens on. Defaults to a path derived
+    from the job ID
+    :type socket_path: str, optional
+    :param window: How long the leader collects notifications before sending a summary,
+    in seconds. Defaults to 10
+    :type window: float, optional
+
+    :return: The aggregator, or ``None`` if this isn't a distributed job
+    :rtype: Aggregator, optional
+    """
+    info = detect_rank()
+    if rank is not None and world_size is not None:
+        info = RankInfo(rank, world_size, rank if local_rank is None else local_rank)
+    if info is None or info.world_size <= 1:
+        LOGGER.debug("Not aggregating notifications; not a distributed job")
+        return None
+
+    if instance is None:
+        instance = get_instance()
+    if instance.aggregator is not None:
+        instance.aggregator.close()
+    aggregator = Aggregator(info, instance, socket_path=socket_path, window=window)
+    aggregator.start()
+    instance.aggregator = aggregator
+    if aggregator.is_leader:
+        # Other ranks' updates are tagged by the leader when it reports them
+        instance.progress_reporter.rank = info.rank
+    return aggregator
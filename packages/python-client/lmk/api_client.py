@@ -1,18 +1,43 @@
 import asyncio
 import atexit
+import email.utils
+import enum
+import inspect
+import json
 import logging
+import math
+import os
+import random
+import re
+import ssl
+import struct
+import sys
+import threading
 import time
+import weakref
 from concurrent.futures import ThreadPoolExecutor, Executor
 from functools import wraps
-from typing import Optional, Callable
+from typing import Optional, Callable, Any, Dict, List, Tuple, Union, TYPE_CHECKING
+from urllib.parse import quote, urlsplit
 
+import urllib3  # type: ignore
+from blinker import signal
+
+from lmk import exc
 from lmk.constants import API_URL
 from lmk.generated.api_client import ApiClient as DefaultApiClient, Configuration
 from lmk.generated.exceptions import ApiException
+from lmk.instrumentation import ClientStats, current_operation, operation_name
+from lmk.utils.os import file_lock
+
+if TYPE_CHECKING:
+    import aiohttp
 
 
 LOGGER = logging.getLogger(__name__)
 
+circuit_breaker_state_changed = signal("circuit-breaker-state-changed")
+
 
 class _ExecutorWrapper:
     """
@@ -45,6 +70,31 @@ def retry(
             return None
 
     def dec(f):
+        if inspect.iscoroutinefunction(f):
+
+            @wraps(f)
+            async def async_wrapper(*args, **kwargs):
+                attempt = 0
+                while True:
+                    attempt += 1
+                    try:
+                        return await f(*args, **kwargs)
+                    except Exception as error:
+                        retry_ivl = retry_in(error, attempt)
+
+                        if retry_ivl is None:
+                            raise
+
+                        LOGGER.debug(
+                            "Retrying %s in %.2fs",
+                            f.__name__,
+                            retry_ivl,
+                            exc_info=True,
+                        )
+                        await asyncio.sleep(retry_ivl)
+
+            return async_wrapper
+
         @wraps(f)
         def wrapper(*args, **kwargs):
             attempt = 0
@@ -71,25 +121,830 @@ def retry(
     return dec(func)
 
 
-def api_client_retry_in(error: Exception, attempt: int) -> Optional[float]:
-    if not isinstance(error, ApiException):
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a ``Retry-After`` header value, which is either a number of seconds or
+    an HTTP date
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def error_retry_after(error: Exception) -> Optional[float]:
+    if not isinstance(error, ApiException) or not error.headers:
         return None
+    return parse_retry_after(error.headers.get("Retry-After"))
+
+
+def is_connection_error(error: Exception) -> bool:
+    if isinstance(
+        error,
+        (
+            asyncio.TimeoutError,
+            urllib3.exceptions.HTTPError,
+            ConnectionError,
+            TimeoutError,
+        ),
+    ):
+        return True
+    # aiohttp is only imported once an async request is sent, and its errors can't
+    # have been raised before then
+    aiohttp = sys.modules.get("aiohttp")
+    return aiohttp is not None and isinstance(error, aiohttp.ClientConnectionError)
+
+
+def is_server_unavailable(error: Exception) -> bool:
+    """
+    Whether an error indicates that the API is down or unreachable, as opposed to
+    rejecting a particular request
+    """
+    if isinstance(error, ApiException):
+        # status 0 is used by the generated client for SSL and other transport errors
+        return error.status == 0 or (error.status or 0) >= 500
+    return is_connection_error(error)
+
+
+class RetryPolicy:
+    """
+    Decides whether and when to retry failed API requests. Connection errors, timeouts,
+    5xx responses and 429 responses are retried up to ``max_attempts`` times in total,
+    with "full jitter" exponential backoff; 429 responses wait for ``Retry-After``
+    instead when it's given. A timeout or 5xx response can come after the server acted
+    on a request, so ``Instance`` sends an ``Idempotency-Key`` with the ``POST``
+    requests that create events and sessions, and the server only acts on them once.
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        base: float = 0.5,
+        max_backoff: float = 10.0,
+    ) -> None:
+        self.max_attempts = max_attempts
+        self.base = base
+        self.max_backoff = max_backoff
+
+    def should_retry(self, error: Exception) -> bool:
+        if isinstance(error, ApiException):
+            return error.status in self.RETRY_STATUSES
+        return is_connection_error(error)
+
+    def retry_in(self, error: Exception, attempt: int) -> Optional[float]:
+        if attempt >= self.max_attempts or not self.should_retry(error):
+            return None
+
+        retry_after = error_retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff * 6)
+
+        return random.uniform(0, min(self.max_backoff, self.base * 2**attempt))
+
+
+class CircuitState(str, enum.Enum):
+    Closed = "closed"
+    Open = "open"
+    HalfOpen = "half-open"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for API requests. After ``failure_threshold`` consecutive requests
+    fail because the API is unavailable (connection errors, timeouts or 5xx responses),
+    the breaker opens and requests fail immediately with ``CircuitOpen`` for
+    ``reset_timeout`` seconds rather than each waiting for a timeout. After that a
+    single trial request is let through; if it succeeds the breaker closes again.
 
-    if error.status == 429:
-        return min(10.0, 0.5 * 2**attempt)
+    State changes are sent with the ``circuit_breaker_state_changed`` signal.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = CircuitState.Closed
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> CircuitState:
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        """
+        ``True`` if requests would currently fail fast
+        """
+        return self._state == CircuitState.Open and self.retry_in() > 0
+
+    def retry_in(self) -> float:
+        """
+        The number of seconds until a trial request will be allowed, if the breaker is open
+        """
+        if self._state != CircuitState.Open:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def _set_state(self, value: CircuitState) -> Optional[CircuitState]:
+        if value == self._state:
+            return None
+        old_value, self._state = self._state, value
+        return old_value
+
+    def _notify(self, old_value: Optional[CircuitState]) -> None:
+        if old_value is None:
+            return
+        LOGGER.info("Circuit breaker state changed: %s -> %s", old_value, self._state)
+        circuit_breaker_state_changed.send(
+            self, old_value=old_value, new_value=self._state
+        )
+
+    def before_request(self) -> None:
+        """
+        Check whether a request may be sent.
+
+        :raises CircuitOpen: if the breaker is open
+        """
+        with self._lock:
+            old_value = None
+            if self._state == CircuitState.Open:
+                retry_in = self.retry_in()
+                if retry_in > 0:
+                    raise exc.CircuitOpen(retry_in)
+                old_value = self._set_state(CircuitState.HalfOpen)
+            if self._state == CircuitState.HalfOpen:
+                if self._trial_in_flight:
+                    raise exc.CircuitOpen(0.0)
+                self._trial_in_flight = True
+        self._notify(old_value)
+
+    def record_cancelled(self) -> None:
+        """
+        Record that a request was cancelled before it completed, so it doesn't count
+        as a trial request
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            old_value = self._set_state(CircuitState.Closed)
+        self._notify(old_value)
+
+    def record_failure(self, error: Exception) -> None:
+        with self._lock:
+            self._trial_in_flight = False
+            if not is_server_unavailable(error):
+                # The API responded, so it's available
+                self._failures = 0
+                old_value = self._set_state(CircuitState.Closed)
+            else:
+                self._failures += 1
+                old_value = None
+                if (
+                    self._state == CircuitState.HalfOpen
+                    or self._failures >= self.failure_threshold
+                ):
+                    self._opened_at = time.monotonic()
+                    old_value = self._set_state(CircuitState.Open)
+        self._notify(old_value)
+
+
+BucketState = Tuple[float, float]
+
+_BUCKET_STATE = struct.Struct("dd")
 
-    return None
+
+class TokenBucket:
+    """
+    Token bucket that allows bursts of up to ``burst`` requests and ``rate`` requests per
+    second on average. Callers reserve a token and are told how long to wait before
+    using it, so waiting happens outside of any lock and works with both ``time.sleep``
+    and ``asyncio.sleep``.
+
+    If ``path`` is given, the bucket's state is stored in that file and updated under an
+    advisory lock, so it's shared by all local processes using the same path.
+    """
+
+    def __init__(self, rate: float, burst: float, path: Optional[str] = None) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.path = path
+        self._state: BucketState = (burst, 0.0)
+        self._lock = threading.Lock()
+
+    def _read_state(self, fd: int) -> BucketState:
+        data = os.pread(fd, _BUCKET_STATE.size, 0)
+        if len(data) < _BUCKET_STATE.size:
+            return (self.burst, 0.0)
+        return _BUCKET_STATE.unpack(data)
+
+    def _update(self, func: Callable[[BucketState], BucketState]) -> BucketState:
+        with self._lock:
+            if self.path is None:
+                self._state = func(self._state)
+                return self._state
+
+            with file_lock(self.path + ".lock"):
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+                try:
+                    state = func(self._read_state(fd))
+                    os.pwrite(fd, _BUCKET_STATE.pack(*state), 0)
+                finally:
+                    os.close(fd)
+                return state
+
+    def reserve(self) -> float:
+        """
+        Take a token from the bucket.
+
+        :return: The number of seconds to wait before sending the request
+        :rtype: float
+        """
+        now = time.time()
+
+        def take(state: BucketState) -> BucketState:
+            tokens, updated = state
+            if now > updated:
+                tokens = min(self.burst, tokens + (now - updated) * self.rate)
+                updated = now
+            return (tokens - 1, updated)
+
+        tokens, updated = self._update(take)
+        return (updated - now) + max(0.0, -tokens) / self.rate
+
+    def block(self, seconds: float) -> None:
+        """
+        Don't hand out any tokens for the next ``seconds`` seconds, e.g. because the server
+        responded with a ``Retry-After`` header
+        """
+        until = time.time() + seconds
+
+        def block(state: BucketState) -> BucketState:
+            tokens, updated = state
+            if until <= updated:
+                return state
+            return (min(tokens, 0.0), until)
+
+        self._update(block)
+
+
+def endpoint_class(url: str) -> str:
+    """
+    Requests are rate limited by the first path component after the API version,
+    e.g. ``event`` for ``/v1/event``
+    """
+    parts = [part for part in urlsplit(url).path.split("/") if part]
+    if len(parts) >= 2 and re.match(r"^v\d+$", parts[0]):
+        return parts[1]
+    return parts[0] if parts else "default"
+
+
+class RateLimiter:
+    """
+    Client-side rate limiter with a token bucket per endpoint class (see
+    ``endpoint_class()``). Limits are given as ``(rate, burst)`` tuples; endpoint classes
+    without an entry in ``limits`` use the ``default`` limit, if there is one.
+
+    By default there are no limits, and requests to an endpoint class are only held back
+    for the ``Retry-After`` of a 429 response from the server. Pass ``limits`` (e.g.
+    ``{"event": (5.0, 20.0)}`` for 5 events per second with bursts of 20) to also limit
+    requests up front.
+
+    If ``shared_dir`` is given, bucket state is kept in files in that directory so that
+    it applies across all local processes using it, e.g. so that a 429 seen by one
+    ``lmk run`` daemon holds back the others.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, Tuple[float, float]]] = None,
+        shared_dir: Optional[str] = None,
+    ) -> None:
+        self.limits = dict(limits or {})
+        self.shared_dir = shared_dir
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url: str) -> TokenBucket:
+        name = endpoint_class(url)
+        bucket = self._buckets.get(name)
+        if bucket is not None:
+            return bucket
+
+        with self._lock:
+            if name not in self._buckets:
+                # Without a limit, the bucket never runs out of tokens unless it's
+                # blocked by a 429 response
+                rate, burst = self.limits.get(
+                    name, self.limits.get("default", (math.inf, math.inf))
+                )
+                path = None
+                if self.shared_dir is not None:
+                    os.makedirs(self.shared_dir, exist_ok=True)
+                    path = os.path.join(self.shared_dir, f"{name}.bucket")
+                self._buckets[name] = TokenBucket(rate, burst, path)
+            return self._buckets[name]
+
+    def acquire(self, url: str) -> None:
+        delay = self.bucket(url).reserve()
+        if delay > 0:
+            LOGGER.debug("Rate limited; waiting %.2fs to request %s", delay, url)
+            time.sleep(delay)
+
+    async def acquire_async(self, url: str) -> None:
+        delay = self.bucket(url).reserve()
+        if delay > 0:
+            LOGGER.debug("Rate limited; waiting %.2fs to request %s", delay, url)
+            await asyncio.sleep(delay)
+
+    def observe(self, url: str, error: Exception) -> None:
+        """
+        Block the endpoint's bucket for the duration of the ``Retry-After`` header
+        of a 429 response
+        """
+        if not isinstance(error, ApiException) or error.status != 429:
+            return
+        retry_after = error_retry_after(error)
+        if retry_after:
+            self.bucket(url).block(retry_after)
+
+
+class _PreparedRequest:
+    """
+    A request built by ApiClient._prepare_request() for the native async transport
+    """
+
+    __slots__ = (
+        "method",
+        "url",
+        "headers",
+        "post_params",
+        "body",
+        "request_timeout",
+    )
+
+    def __init__(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]],
+        post_params: Optional[List[Tuple[str, Any]]],
+        body: Any,
+        request_timeout: Optional[Union[float, Tuple[float, float]]],
+    ) -> None:
+        self.method = method
+        self.url = url
+        self.headers = headers
+        self.post_params = post_params
+        self.body = body
+        self.request_timeout = request_timeout
+
+
+class AiohttpResponse:
+    """
+    Response from the native async transport. This has the same interface as the
+    generated RESTResponse class, so it can be deserialized by the API client and
+    wrapped in ApiException the same way
+    """
+
+    def __init__(
+        self, status: int, reason: Optional[str], headers: Any, data: bytes
+    ) -> None:
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.data: Any = data
+
+    def getheaders(self) -> Any:
+        """Returns a dictionary of the response headers."""
+        return self.headers
+
+    def getheader(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        """Returns a given response header."""
+        return self.headers.get(name, default)
+
+
+class AiohttpTransport:
+    """
+    Native asyncio transport for the API client. This keeps one long-lived keep-alive
+    ``aiohttp.ClientSession`` per event loop, so connections and TLS sessions are reused
+    across requests rather than each async request being run in a worker thread.
+
+    Connecting times out after ``connect_timeout`` seconds, unless a request gives its
+    own timeout.
+    """
+
+    def __init__(
+        self, configuration: Configuration, connect_timeout: Optional[float] = 10.0
+    ) -> None:
+        self.configuration = configuration
+        self.connect_timeout = connect_timeout
+        self._sessions: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._close_registered = False
+
+    def _ssl_context(self) -> Union[ssl.SSLContext, bool]:
+        config = self.configuration
+        if not config.verify_ssl:
+            return False
+        context = ssl.create_default_context(cafile=config.ssl_ca_cert)
+        if config.cert_file:
+            context.load_cert_chain(config.cert_file, keyfile=config.key_file)
+        return context
+
+    def session(self) -> "aiohttp.ClientSession":
+        """
+        Get the session for the running event loop, creating it if needed
+        """
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            session = self._sessions.get(loop)
+            if session is None or session.closed:
+                connector = aiohttp.TCPConnector(
+                    limit=self.configuration.connection_pool_maxsize or 100,
+                    ssl=self._ssl_context(),
+                )
+                session = aiohttp.ClientSession(
+                    connector=connector,
+                    timeout=aiohttp.ClientTimeout(connect=self.connect_timeout),
+                )
+                self._sessions[loop] = session
+                if not self._close_registered:
+                    atexit.register(self.close)
+                    self._close_registered = True
+            return session
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        post_params: Optional[List[Tuple[str, Any]]] = None,
+        body: Any = None,
+        request_timeout: Optional[Union[float, Tuple[float, float]]] = None,
+    ) -> AiohttpResponse:
+        import aiohttp
+
+        headers = dict(headers or {})
+        kws: Dict[str, Any] = {}
+
+        if isinstance(request_timeout, (int, float)):
+            kws["timeout"] = aiohttp.ClientTimeout(
+                total=request_timeout, connect=self.connect_timeout
+            )
+        elif isinstance(request_timeout, tuple) and len(request_timeout) == 2:
+            kws["timeout"] = aiohttp.ClientTimeout(
+                sock_connect=request_timeout[0], sock_read=request_timeout[1]
+            )
+
+        if self.configuration.proxy:
+            kws["proxy"] = self.configuration.proxy
+
+        content_type = headers.get("Content-Type")
+        if method in {"POST", "PUT", "PATCH", "OPTIONS", "DELETE"}:
+            if isinstance(body, (str, bytes)):
+                kws["data"] = body
+            elif not content_type or re.search("json", content_type, re.IGNORECASE):
+                if body is not None:
+                    kws["data"] = json.dumps(body)
+            elif content_type == "application/x-www-form-urlencoded":
+                kws["data"] = dict(post_params or [])
+            elif content_type == "multipart/form-data":
+                # Let aiohttp generate the Content-Type w/ the boundary
+                del headers["Content-Type"]
+                form = aiohttp.FormData()
+                for name, value in post_params or []:
+                    form.add_field(name, value)
+                kws["data"] = form
+
+        async with self.session().request(method, url, headers=headers, **kws) as resp:
+            data = await resp.read()
+            LOGGER.debug("response body: %s", data)
+            return AiohttpResponse(resp.status, resp.reason, resp.headers, data)
+
+    async def aclose(self) -> None:
+        """
+        Close the session for the running event loop, if there is one
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            session = self._sessions.pop(loop, None)
+        if session is not None:
+            await session.close()
+
+    def close(self) -> None:
+        with self._lock:
+            sessions = list(self._sessions.items())
+            self._sessions = weakref.WeakKeyDictionary()
+
+        try:
+            current_loop: Optional[asyncio.AbstractEventLoop] = (
+                asyncio.get_running_loop()
+            )
+        except RuntimeError:
+            current_loop = None
+
+        for loop, session in sessions:
+            if session.closed:
+                continue
+            if loop.is_closed():
+                # The close() coroutine can't run on this loop anymore. Mark the
+                # connector as closed so it doesn't warn about being unclosed;
+                # the sockets are released when it's garbage collected
+                connector = session.connector
+                session.detach()
+                if connector is not None:
+                    connector._close()
+            elif current_loop is not None and loop is current_loop:
+                current_loop.create_task(session.close())
+            elif loop.is_running():
+                asyncio.run_coroutine_threadsafe(session.close(), loop)
+            else:
+                loop.run_until_complete(session.close())
 
 
 class ApiClient(DefaultApiClient):
     """
     ApiClient subclass that uses a ThreadPoolExecutor wrapped with _ExecutorWrapper
-    rather than a ThreadPool from multiprocessing
+    rather than a ThreadPool from multiprocessing. ``async_req=True`` requests are sent
+    with the native asyncio transport when ``native_async`` is ``True`` (the default),
+    and fall back to the executor otherwise.
     """
 
-    @retry(retry_in=api_client_retry_in)
-    def request(self, *args, **kwargs):
-        return super().request(*args, **kwargs)
+    def __init__(
+        self,
+        *args,
+        native_async: bool = True,
+        rate_limiter: Optional[RateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        stats: Optional[ClientStats] = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.native_async = native_async
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.stats = stats or ClientStats()
+        self.transport = AiohttpTransport(self.configuration)
+        self._request_sync = retry(self._send_sync, retry_in=self._retry_in)
+        self._request_async = retry(self._send_async, retry_in=self._retry_in)
+
+    def _retry_in(self, error: Exception, attempt: int) -> Optional[float]:
+        retry_in = self.retry_policy.retry_in(error, attempt)
+        if retry_in is not None:
+            self.stats.record_retry(current_operation.get())
+        return retry_in
+
+    def call_api(self, *args, **kwargs):
+        if (
+            not kwargs.get("async_req")
+            or not self.native_async
+            or not kwargs.get("_preload_content", True)
+        ):
+            return super().call_api(*args, **kwargs)
+
+        return self._call_api_async(*args, **kwargs)
+
+    def call_json(
+        self,
+        method: str,
+        resource_path: str,
+        body: Optional[Dict[str, Any]],
+        headers: Dict[str, str],
+        response_types_map: Dict[str, str],
+        async_req: bool = False,
+    ) -> Any:
+        """
+        Send a request whose body is already a JSON-compatible dictionary, skipping the
+        argument validation and model serialization done by the generated API classes.
+        Used for hot endpoints such as ``POST /v1/event``; the response is deserialized
+        as usual.
+        """
+        header_params = dict(headers)
+        header_params["Accept"] = "application/json"
+        header_params["Content-Type"] = "application/json"
+        return self.call_api(
+            resource_path,
+            method,
+            {},
+            [],
+            header_params,
+            body=body,
+            post_params=[],
+            files={},
+            response_types_map=response_types_map,
+            auth_settings=[],
+            async_req=async_req,
+            _return_http_data_only=True,
+            _preload_content=True,
+            collection_formats={},
+        )
+
+    def _prepare_request(
+        self,
+        resource_path: str,
+        method: str,
+        path_params: Optional[Dict[str, Any]] = None,
+        query_params: Optional[List[Tuple[str, Any]]] = None,
+        header_params: Optional[Dict[str, Any]] = None,
+        body: Any = None,
+        post_params: Optional[List[Tuple[str, Any]]] = None,
+        files: Optional[Dict[str, Any]] = None,
+        response_types_map: Optional[Dict[str, str]] = None,
+        auth_settings: Optional[List[str]] = None,
+        async_req: Optional[bool] = None,
+        _return_http_data_only: Optional[bool] = None,
+        collection_formats: Optional[Dict[str, str]] = None,
+        _preload_content: bool = True,
+        _request_timeout: Optional[Union[float, Tuple[float, float]]] = None,
+        _host: Optional[str] = None,
+        _request_auth: Optional[Dict[str, Any]] = None,
+    ) -> _PreparedRequest:
+        # Takes the same arguments as call_api(), and builds the request the same way
+        # as the generated client's __call_api() before it's sent
+        config = self.configuration
+
+        header_params = header_params or {}
+        header_params.update(self.default_headers)
+        if self.cookie:
+            header_params["Cookie"] = self.cookie
+        if header_params:
+            header_params = self.sanitize_for_serialization(header_params)
+            header_params = dict(
+                self.parameters_to_tuples(header_params, collection_formats)
+            )
+
+        if path_params:
+            path_params = self.sanitize_for_serialization(path_params)
+            for key, value in self.parameters_to_tuples(
+                path_params, collection_formats
+            ):
+                resource_path = resource_path.replace(
+                    "{%s}" % key,
+                    quote(str(value), safe=config.safe_chars_for_path_param),
+                )
+
+        if post_params or files:
+            post_params = self.sanitize_for_serialization(post_params or [])
+            post_params = self.parameters_to_tuples(post_params, collection_formats)
+            post_params.extend(self.files_parameters(files))
+
+        self.update_params_for_auth(
+            header_params,
+            query_params,
+            auth_settings,
+            resource_path,
+            method,
+            body,
+            request_auth=_request_auth,
+        )
+
+        if body:
+            body = self.sanitize_for_serialization(body)
+
+        url = (config.host if _host is None else _host) + resource_path
+        if query_params:
+            query_params = self.sanitize_for_serialization(query_params)
+            url += "?" + self.parameters_to_url_query(query_params, collection_formats)
+
+        return _PreparedRequest(
+            method, url, header_params, post_params, body, _request_timeout
+        )
+
+    async def _call_api_async(self, *args, **kwargs):
+        prepared = self._prepare_request(*args, **kwargs)
+
+        operation = operation_name(prepared.method, prepared.url)
+        token = current_operation.set(operation)
+        start = time.perf_counter()
+        try:
+            response_data = await self._request_async(prepared)
+        except ApiException as e:
+            self.stats.record(operation, time.perf_counter() - start, e)
+            if e.body:
+                e.body = e.body.decode("utf-8")
+            raise e
+        except Exception as e:
+            self.stats.record(operation, time.perf_counter() - start, e)
+            raise
+        else:
+            self.stats.record(operation, time.perf_counter() - start)
+        finally:
+            current_operation.reset(token)
+
+        response_type = (kwargs.get("response_types_map") or {}).get(
+            str(response_data.status), None
+        )
+
+        if response_type not in ["file", "bytes"]:
+            match = None
+            content_type = response_data.getheader("content-type")
+            if content_type is not None:
+                match = re.search(r"charset=([a-zA-Z\-\d]+)[\s;]?", content_type)
+            encoding = match.group(1) if match else "utf-8"
+            response_data.data = response_data.data.decode(encoding)
+
+        return_data = None
+        if response_type:
+            return_data = self.deserialize(response_data, response_type)
+
+        if kwargs.get("_return_http_data_only"):
+            return return_data
+        return (return_data, response_data.status, response_data.getheaders())
+
+    async def _send_async(self, prepared: _PreparedRequest) -> AiohttpResponse:
+        self.circuit_breaker.before_request()
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire_async(prepared.url)
+        try:
+            response = await self.transport.request(
+                prepared.method,
+                prepared.url,
+                headers=prepared.headers,
+                post_params=prepared.post_params,
+                body=prepared.body,
+                request_timeout=prepared.request_timeout,
+            )
+            if not 200 <= response.status <= 299:
+                raise ApiException(http_resp=response)
+        except Exception as error:
+            self._handle_request_error(prepared.url, error)
+            raise
+        except BaseException:
+            self.circuit_breaker.record_cancelled()
+            raise
+        self.circuit_breaker.record_success()
+        return response
+
+    def _handle_request_error(self, url: str, error: Exception) -> None:
+        self.circuit_breaker.record_failure(error)
+        if self.rate_limiter is not None:
+            self.rate_limiter.observe(url, error)
+
+    def request(
+        self,
+        method,
+        url,
+        query_params=None,
+        headers=None,
+        post_params=None,
+        body=None,
+        _preload_content=True,
+        _request_timeout=None,
+    ):
+        operation = operation_name(method, url)
+        token = current_operation.set(operation)
+        start = time.perf_counter()
+        try:
+            response = self._request_sync(
+                method,
+                url,
+                query_params=query_params,
+                headers=headers,
+                post_params=post_params,
+                body=body,
+                _preload_content=_preload_content,
+                _request_timeout=_request_timeout,
+            )
+        except Exception as e:
+            self.stats.record(operation, time.perf_counter() - start, e)
+            raise
+        finally:
+            current_operation.reset(token)
+        self.stats.record(operation, time.perf_counter() - start)
+        return response
+
+    def _send_sync(self, method, url, *args, **kwargs):
+        self.circuit_breaker.before_request()
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(url)
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except Exception as error:
+            self._handle_request_error(url, error)
+            raise
+        except BaseException:
+            self.circuit_breaker.record_cancelled()
+            raise
+        self.circuit_breaker.record_success()
+        return response
 
     @property
     def pool(self):
@@ -98,20 +953,30 @@ class ApiClient(DefaultApiClient):
             self._pool = _ExecutorWrapper(ThreadPoolExecutor(self.pool_threads))
         return self._pool
 
+    def close(self) -> None:
+        super().close()
+        self.transport.close()
+
 
 def api_client(
     server_url: Optional[str] = None,
     logger: Optional[logging.Logger] = None,
+    native_async: bool = True,
+    rate_limiter: Optional[RateLimiter] = None,
 ) -> ApiClient:
     """
-    Create an API client instance
+    Create an API client instance. If ``rate_limiter`` isn't given, a ``RateLimiter``
+    without limits is used for this client, so requests are only held back after a 429
+    response.
     """
     if server_url is None:
         server_url = API_URL
     if logger is None:
         logger = LOGGER
+    if rate_limiter is None:
+        rate_limiter = RateLimiter()
 
     config = Configuration(host=server_url)
     config.logger = {key: logger for key in config.logger}
 
-    return ApiClient(config)
+    return ApiClient(config, native_async=native_async, rate_limiter=rate_limiter)
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from lmk.generated.models.notification_channel_response import (
+    NotificationChannelResponse,
+)
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+def channel_type(channel: NotificationChannelResponse) -> str:
+    return channel.payload.actual_instance.type
+
+
+class ChannelIndex:
+    """
+    Notification channels indexed by ID, exact name, lowercase name and type, so that
+    ``Channels.get()`` and ``Channels.list()`` don't have to scan every channel.
+    """
+
+    def __init__(self, channels: List[NotificationChannelResponse]) -> None:
+        self.channels = channels
+        self.by_id: Dict[str, NotificationChannelResponse] = {}
+        self.by_name: Dict[str, List[NotificationChannelResponse]] = {}
+        self.by_type: Dict[str, List[NotificationChannelResponse]] = {}
+        # Names are matched by case-insensitive substring, so lowercase names are
+        # kept in a list (in API order) rather than a dict
+        self.lower_names: List[Tuple[str, NotificationChannelResponse]] = []
+        self._dicts: Optional[List[Dict[str, Any]]] = None
+
+        for channel in channels:
+            self.by_id[channel.notification_channel_id] = channel
+            self.by_name.setdefault(channel.name, []).append(channel)
+            self.by_type.setdefault(channel_type(channel), []).append(channel)
+            self.lower_names.append((channel.name.lower(), channel))
+
+    def dicts(self) -> List[Dict[str, Any]]:
+        """
+        ``to_dict()`` of each channel, computed on first use. The dictionaries are
+        shared between calls and shouldn't be modified.
+        """
+        if self._dicts is None:
+            self._dicts = [channel.to_dict() for channel in self.channels]
+        return list(self._dicts)
+
+    def find(
+        self,
+        name: Optional[str] = None,
+        type: Optional[str] = None,
+        name_exact: bool = False,
+        channel_id: Optional[str] = None,
+    ) -> List[NotificationChannelResponse]:
+        candidates: List[NotificationChannelResponse]
+        if channel_id is not None:
+            channel = self.by_id.get(channel_id)
+            candidates = [] if channel is None else [channel]
+            if name is not None and name_exact:
+                candidates = [c for c in candidates if c.name == name]
+        elif name is not None and name_exact:
+            candidates = self.by_name.get(name, [])
+        elif type is not None:
+            candidates = self.by_type.get(type, [])
+        else:
+            candidates = self.channels
+
+        if name is not None and not name_exact:
+            lower_name = name.lower()
+            matches = {
+                channel.notification_channel_id
+                for channel_name, channel in self.lower_names
+                if lower_name in channel_name
+            }
+            candidates = [c for c in candidates if c.notification_channel_id in matches]
+
+        if type is not None:
+            candidates = [c for c in candidates if channel_type(c) == type]
+
+        return list(candidates)
+
+
+class ChannelCache:
+    """
+    On-disk cache of notification channels, stored as JSON in ``~/.lmk/cache`` by
+    default. Cached channels are fresh for ``ttl`` seconds; after that they may still
+    be used for up to ``max_stale`` seconds while they're revalidated in the background.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: float = 3600.0,
+        max_stale: float = 7 * 24 * 3600,
+    ) -> None:
+        if path is None:
+            path = os.path.expanduser("~/.lmk/cache")
+        self.path = path
+        self.ttl = ttl
+        self.max_stale = max_stale
+
+    def _file(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode()).hexdigest()[:32]
+        return os.path.join(self.path, f"channels-{digest}.json")
+
+    def load(
+        self, key: str
+    ) -> Optional[Tuple[List[NotificationChannelResponse], float]]:
+        """
+        Load cached channels for ``key``.
+
+        :return: The cached channels and the time they were fetched, or ``None`` if
+        there is no usable cache entry
+        :rtype: Tuple[List[NotificationChannelResponse], float] | None
+        """
+        try:
+            with open(self._file(key)) as f:
+                obj = json.load(f)
+            fetched_at = float(obj["fetched_at"])
+            if time.time() - fetched_at > self.ttl + self.max_stale:
+                return None
+            channels = [
+                NotificationChannelResponse.from_dict(channel)
+                for channel in obj["channels"]
+            ]
+        except FileNotFoundError:
+            return None
+        except Exception:
+            LOGGER.debug("Unable to read channel cache", exc_info=True)
+            return None
+
+        return channels, fetched_at
+
+    def save(
+        self,
+        key: str,
+        channels: List[NotificationChannelResponse],
+        fetched_at: Optional[float] = None,
+    ) -> None:
+        if fetched_at is None:
+            fetched_at = time.time()
+
+        obj = {
+            "fetched_at": fetched_at,
+            "channels": [channel.to_dict() for channel in channels],
+        }
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix=".channels-")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(obj, f)
+                os.replace(tmp_path, self._file(key))
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        except OSError:
+            LOGGER.debug("Unable to write channel cache", exc_info=True)
+
+    def clear(self, key: str) -> None:
+        try:
+            os.remove(self._file(key))
+        except FileNotFoundError:
+            pass
+
+    def is_fresh(self, fetched_at: float) -> bool:
+        return time.time() - fetched_at <= self.ttl
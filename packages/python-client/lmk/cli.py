@@ -3,14 +3,20 @@ from lmk.cli_deps import check_cli_deps
 check_cli_deps()
 
 import click  # noqa: E402
+import json  # noqa: E402
 import os  # noqa: E402
 import psutil  # noqa: E402
+import re  # noqa: E402
 import shlex  # noqa: E402
 import signal as signal_module  # noqa: E402
 import sys  # noqa: E402
 import textwrap  # noqa: E402
+import time  # noqa: E402
+from datetime import datetime  # noqa: E402
 from typing import List, Optional, Dict, Any  # noqa: E402
 
+from dateutil.parser import parse as parse_dt  # noqa: E402
+
 from lmk.constants import DOCS_ONLY  # noqa: E402
 from lmk.instance import get_instance, set_instance, Instance  # noqa: E402
 from lmk.process import exc  # noqa: E402
@@ -236,7 +242,8 @@ async def run(
     job = await manager.create_job(name, notify)
     click.secho(f"Job ID: {job.name}", fg="green", bold=True)
 
-    monitor = ChildMonitor(command)
+    # Notifications sent by the command are recorded under the job's name
+    monitor = ChildMonitor(command, env={**os.environ, "LMK_JOB_NAME": job.name})
 
     if daemon:
         await run_daemon(job.name, monitor, manager, ctx.obj["log_level"])
@@ -399,6 +406,155 @@ async def jobs(ctx: click.Context, all: bool):
         )
 
 
+TIME_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def _parse_time(
+    ctx: click.Context, param: click.Parameter, value: Optional[str]
+) -> Optional[float]:
+    if value is None:
+        return None
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([smhdw])", value.strip())
+    if match:
+        amount, unit = match.groups()
+        return time.time() - float(amount) * TIME_UNITS[unit]
+    try:
+        return parse_dt(value).timestamp()
+    except (ValueError, OverflowError):
+        raise click.BadParameter(
+            f"{value!r} is not a time; use e.g. 30m, 2h, 7d or 2024-01-31T12:00"
+        )
+
+
+@cli.command(
+    short_help="List notifications sent from this machine",
+    help=(
+        "List notifications sent from this machine, most recent first, from the local "
+        "event ledger. --since and --until take a duration ago (e.g. 30m, 2h, 7d) or a date. "
+        "Events are read a page at a time; pass --before with the ID printed at the end "
+        "to see the next page."
+    ),
+)
+@click.option(
+    "-s",
+    "--since",
+    default=None,
+    callback=_parse_time,
+    help="Only show events after this time",
+)
+@click.option(
+    "-u",
+    "--until",
+    default=None,
+    callback=_parse_time,
+    help="Only show events before this time",
+)
+@click.option("-j", "--job", default=None, help="Only show events sent by this job")
+@click.option(
+    "-c", "--channel", default=None, help="Only show events sent to this channel ID"
+)
+@click.option(
+    "--status",
+    type=click.Choice(["sent", "failed"]),
+    default=None,
+    help="Only show events with this status",
+)
+@click.option(
+    "-n",
+    "--limit",
+    type=int,
+    default=50,
+    help="Maximum number of events to show, defaults to 50; 0 shows all",
+)
+@click.option(
+    "--before", type=int, default=None, help="Only show events with a lower ID"
+)
+@click.option("--json", "as_json", is_flag=True, help="Print events as JSON lines")
+def events(
+    since: Optional[float],
+    until: Optional[float],
+    job: Optional[str],
+    channel: Optional[str],
+    status: Optional[str],
+    limit: int,
+    before: Optional[int],
+    as_json: bool,
+):
+    ledger = get_instance().ledger
+    if ledger is None:
+        click.echo("The event ledger is disabled")
+        return
+
+    records = ledger.iter_events(
+        page_size=100 if limit <= 0 else min(limit + 1, 100),
+        since=since,
+        until=until,
+        job=job,
+        channel=channel,
+        status=status,
+        before=before,
+    )
+
+    if not as_json:
+        click.echo(
+            " ".join(
+                [
+                    pad("id", 8, bold=True),
+                    pad("time", 20, bold=True),
+                    pad("status", 8, bold=True),
+                    pad("latency", 9, bold=True),
+                    pad("job", 24, bold=True),
+                    pad("channels", 20, bold=True),
+                    "message",
+                ]
+            )
+        )
+
+    count = 0
+    last_id: Optional[int] = None
+    for record in records:
+        if limit > 0 and count == limit:
+            # There's at least one more event
+            click.secho(
+                f"More events available; pass --before {last_id} to see them",
+                fg="yellow",
+                err=True,
+            )
+            break
+        count += 1
+        last_id = record.id
+
+        if as_json:
+            click.echo(json.dumps(record.to_dict()))
+            continue
+
+        created = datetime.fromtimestamp(record.created).strftime("%Y-%m-%d %H:%M:%S")
+        lines = record.message.strip().splitlines()
+        summary = lines[0] if lines else ""
+        if record.error is not None:
+            summary = record.error
+        click.echo(
+            " ".join(
+                [
+                    pad(str(record.id), 8),
+                    pad(created, 20),
+                    pad(
+                        record.status,
+                        8,
+                        fg="green" if record.status == "sent" else "red",
+                    ),
+                    pad(f"{record.latency * 1000:.0f}ms", 9),
+                    pad(record.job or "", 24, bold=True),
+                    pad(",".join(record.channels), 20),
+                    summary[:80],
+                ]
+            )
+        )
+
+    if count == 0 and not as_json:
+        click.echo("No events found")
+
+
 @async_command(
     cli,
     short_help="Send a signal to a monitored job",
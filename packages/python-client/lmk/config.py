@@ -0,0 +1,174 @@
+import atexit
+import configparser
+import logging
+import os
+import tempfile
+import threading
+from typing import Dict, Optional, Tuple
+
+from lmk.utils.os import file_lock
+
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CONFIG_PATH = "~/.lmk/config"
+
+StatKey = Tuple[int, int, int]
+
+
+def _stat_key(path: str) -> Optional[StatKey]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class ConfigStore:
+    """
+    Reads and writes profiles in an LMK config file (``~/.lmk/config`` by default).
+    Parsed contents are cached until the file's mtime changes, so repeated reads don't
+    touch the disk beyond a ``stat()``. Writes are debounced by ``write_delay`` seconds so
+    that bursts of changes result in a single write, and are made by writing to a
+    temporary file and renaming it over the config file while holding an advisory lock,
+    merging with any profiles other processes have written in the meantime.
+
+    Use ``config_store()`` to get the shared store for a path.
+    """
+
+    def __init__(self, path: str, write_delay: float = 0.5) -> None:
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.write_delay = write_delay
+        self._lock = threading.RLock()
+        self._parsed: Optional[configparser.ConfigParser] = None
+        self._parsed_key: Optional[StatKey] = None
+        # Profiles waiting to be written; None means the profile will be removed
+        self._pending: Dict[str, Optional[Dict[str, str]]] = {}
+        self._timer: Optional[threading.Timer] = None
+        self._flush_registered = False
+
+    def _read(self) -> configparser.ConfigParser:
+        key = _stat_key(self.path)
+        if self._parsed is not None and key == self._parsed_key:
+            return self._parsed
+
+        parser = configparser.ConfigParser()
+        if key is not None:
+            parser.read([self.path])
+        self._parsed = parser
+        self._parsed_key = key
+        return parser
+
+    def get_profile(self, profile: str) -> Optional[Dict[str, str]]:
+        """
+        Get the values in a profile, including changes that haven't been written yet.
+
+        :return: The profile's values, or ``None`` if the profile doesn't exist
+        :rtype: Dict[str, str] | None
+        """
+        with self._lock:
+            if profile in self._pending:
+                values = self._pending[profile]
+                return None if values is None else dict(values)
+
+            parser = self._read()
+            if profile not in parser:
+                return None
+            return dict(parser[profile])
+
+    def set_profile(
+        self, profile: str, values: Optional[Dict[str, str]], immediate: bool = False
+    ) -> None:
+        """
+        Replace the values in a profile, or remove it if ``values`` is ``None``. Other
+        profiles in the file are left as they are.
+
+        :param immediate: Write the change right away rather than after ``write_delay``
+        :type immediate: bool, optional
+        """
+        with self._lock:
+            self._pending[profile] = None if values is None else dict(values)
+            if immediate or self.write_delay <= 0:
+                self.flush()
+                return
+
+            if not self._flush_registered:
+                atexit.register(self.flush)
+                self._flush_registered = True
+            if self._timer is None:
+                self._timer = threading.Timer(self.write_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        """
+        Write any pending changes to disk
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+
+            dirname = os.path.dirname(self.path)
+            if dirname and not os.path.exists(dirname):
+                os.makedirs(dirname, exist_ok=True)
+
+            with file_lock(self.lock_path):
+                parser = configparser.ConfigParser()
+                parser.read_dict(self._read())
+                for profile, values in self._pending.items():
+                    if values is None:
+                        parser.remove_section(profile)
+                    else:
+                        parser[profile] = values
+
+                self._write(parser)
+                self._pending.clear()
+
+            LOGGER.info("wrote config to %s", self.path)
+
+    def _write(self, parser: configparser.ConfigParser) -> None:
+        try:
+            mode = os.stat(self.path).st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o600
+
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(self.path) or None, prefix=".config-"
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                parser.write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self._parsed = parser
+        self._parsed_key = _stat_key(self.path)
+
+
+_stores: Dict[str, ConfigStore] = {}
+_stores_lock = threading.Lock()
+
+
+def config_store(path: Optional[str] = None) -> ConfigStore:
+    """
+    Get the shared ``ConfigStore`` for a config file path, so that all instances using
+    the same file share parsed contents and pending writes.
+    """
+    if path is None:
+        path = DEFAULT_CONFIG_PATH
+    path = os.path.abspath(os.path.expanduser(path))
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = ConfigStore(path)
+        return store
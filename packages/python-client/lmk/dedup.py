@@ -0,0 +1,282 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Generator, Iterable, List, Optional, Pattern, Tuple
+
+
+LOGGER = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    fingerprint TEXT PRIMARY KEY,
+    target TEXT NOT NULL,
+    message TEXT NOT NULL,
+    last_sent REAL NOT NULL,
+    suppressed INTEGER NOT NULL DEFAULT 0,
+    first_suppressed REAL
+);
+CREATE TABLE IF NOT EXISTS digest (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    last_sent REAL NOT NULL
+);
+"""
+
+# Volatile parts of messages that are replaced before fingerprinting, so that e.g. the
+# same failure reported at different times or by different processes is a duplicate.
+# Bare numbers are left alone, since they're often meaningful (exit codes, counts), so
+# hex strings have to contain a letter.
+DEFAULT_NORMALIZERS: List[Tuple[Pattern[str], str]] = [
+    (
+        re.compile(
+            r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.I
+        ),
+        "<uuid>",
+    ),
+    (
+        re.compile(
+            r"\b\d{4}-\d{2}-\d{2}(?:[T ]\d{1,2}:\d{2}(?::\d{2}(?:[.,]\d+)?)?"
+            r"(?:Z|[+-]\d{2}:?\d{2})?)?\b"
+        ),
+        "<time>",
+    ),
+    (re.compile(r"\b\d{1,2}:\d{2}(?::\d{2}(?:[.,]\d+)?)?\b"), "<time>"),
+    (re.compile(r"\b(pid|process)([\s:=#]*)\d+\b", re.I), r"\1\2<pid>"),
+    (re.compile(r"\b(?:0x[0-9a-f]+|(?=[0-9]*[a-f])[0-9a-f]{8,})\b", re.I), "<hex>"),
+    (
+        re.compile(
+            r"\b\d+(?:\.\d+)?\s?(?:ms|s|sec|secs|seconds?|m|mins?|minutes?|h|hours?)\b"
+        ),
+        "<duration>",
+    ),
+    (re.compile(r"\s+"), " "),
+]
+
+
+def normalize_message(
+    message: str, normalizers: Optional[Iterable[Tuple[Pattern[str], str]]] = None
+) -> str:
+    if normalizers is None:
+        normalizers = DEFAULT_NORMALIZERS
+    for pattern, replacement in normalizers:
+        message = pattern.sub(replacement, message)
+    return message.strip()
+
+
+@dataclass
+class DigestEntry:
+    """
+    Duplicates of a notification that were suppressed since the last digest
+    """
+
+    target: Dict[str, Any]
+    message: str
+    count: int
+    first_suppressed: float
+
+
+class Deduplicator:
+    """
+    Suppresses duplicate notifications. Messages are fingerprinted after replacing
+    volatile parts such as timestamps, UUIDs and PIDs (see ``DEFAULT_NORMALIZERS``), and
+    a notification is only sent if no notification with the same fingerprint, content
+    type and channels was sent in the last ``window`` seconds. Suppressed notifications
+    are counted and rolled up into a digest that's sent at most every ``digest_interval``
+    seconds.
+
+    State is kept in a SQLite database (``~/.lmk/dedup.db`` by default), so that
+    duplicates are also suppressed across processes, e.g. a flapping cron job.
+
+    <details><summary>Usage Example</summary>
+    <p>
+
+    ```python
+    import lmk
+    from lmk.dedup import Deduplicator
+
+    lmk.get_instance().deduplicator = Deduplicator(window=600)
+
+    for _ in range(10):
+        # Only the first of these is sent; the others are counted in the next digest
+        lmk.notify("Job failed at 2023-10-10 12:00:01 (pid 1234)")
+    ```
+    </p>
+    </details>
+    """
+
+    def __init__(
+        self,
+        window: float = 3600.0,
+        digest_interval: float = 3600.0,
+        path: Optional[str] = None,
+        normalizers: Optional[Iterable[Tuple[Pattern[str], str]]] = None,
+    ) -> None:
+        if path is None:
+            path = os.path.expanduser("~/.lmk/dedup.db")
+        self.window = window
+        self.digest_interval = digest_interval
+        self.path = path
+        self.normalizers = (
+            DEFAULT_NORMALIZERS if normalizers is None else list(normalizers)
+        )
+        self._local = threading.local()
+        # Earliest time a digest could be due, so that most calls don't need to check
+        # the database
+        self._next_digest_check = 0.0
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            dirname = os.path.dirname(self.path)
+            if dirname and not os.path.exists(dirname):
+                os.makedirs(dirname, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Generator[sqlite3.Connection, None, None]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    def fingerprint(self, message: str, target: Dict[str, Any]) -> str:
+        normalized = normalize_message(message, self.normalizers)
+        key = json.dumps([normalized, target], sort_keys=True)
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def check(self, message: str, target: Dict[str, Any]) -> bool:
+        """
+        Record a notification that's about to be sent.
+
+        :param message: The notification message
+        :type message: str
+        :param target: Where the notification is going, e.g. its content type and
+        channels. Only notifications with the same target can be duplicates.
+        :type target: Dict[str, Any]
+
+        :return: ``True`` if the notification should be sent, ``False`` if it's a
+        duplicate and was suppressed
+        :rtype: bool
+        """
+        fingerprint = self.fingerprint(message, target)
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT last_sent FROM fingerprints WHERE fingerprint = ?",
+                (fingerprint,),
+            ).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT INTO fingerprints (fingerprint, target, message, last_sent) "
+                    "VALUES (?, ?, ?, ?)",
+                    (fingerprint, json.dumps(target), message, now),
+                )
+                return True
+
+            if now - row[0] >= self.window:
+                conn.execute(
+                    "UPDATE fingerprints SET last_sent = ? WHERE fingerprint = ?",
+                    (now, fingerprint),
+                )
+                return True
+
+            conn.execute(
+                "UPDATE fingerprints SET suppressed = suppressed + 1, message = ?, "
+                "first_suppressed = COALESCE(first_suppressed, ?) WHERE fingerprint = ?",
+                (message, now, fingerprint),
+            )
+
+        LOGGER.debug("Suppressed duplicate notification %s", fingerprint[:12])
+        return False
+
+    def digest_due(self) -> bool:
+        """
+        Cheap check for whether ``take_digest()`` might return anything
+        """
+        return time.time() >= self._next_digest_check
+
+    def take_digest(self, force: bool = False) -> List[DigestEntry]:
+        """
+        Take the suppressed notifications since the last digest, if one is due (or if
+        ``force`` is ``True``), and reset their counts. Expired fingerprints are also
+        removed. Only one process gets a given digest.
+
+        :return: The suppressed notifications, or an empty list if a digest isn't due
+        :rtype: List[DigestEntry]
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT last_sent FROM digest WHERE id = 1").fetchone()
+            if row is None:
+                # Start the first interval now rather than sending a digest right away
+                conn.execute("INSERT INTO digest (id, last_sent) VALUES (1, ?)", (now,))
+                last_sent = now
+            else:
+                last_sent = row[0]
+
+            if not force and now - last_sent < self.digest_interval:
+                self._next_digest_check = last_sent + self.digest_interval
+                return []
+
+            rows = conn.execute(
+                "SELECT target, message, suppressed, first_suppressed FROM fingerprints "
+                "WHERE suppressed > 0 ORDER BY first_suppressed"
+            ).fetchall()
+            conn.execute(
+                "UPDATE fingerprints SET suppressed = 0, first_suppressed = NULL "
+                "WHERE suppressed > 0"
+            )
+            conn.execute(
+                "DELETE FROM fingerprints WHERE last_sent < ?", (now - self.window,)
+            )
+            conn.execute("UPDATE digest SET last_sent = ? WHERE id = 1", (now,))
+
+        self._next_digest_check = now + self.digest_interval
+        return [
+            DigestEntry(
+                target=json.loads(target),
+                message=message,
+                count=count,
+                first_suppressed=first_suppressed,
+            )
+            for target, message, count, first_suppressed in rows
+        ]
+
+    def next_digest_in(self) -> float:
+        """
+        Seconds until the next digest might be due
+        """
+        return max(0.0, self._next_digest_check - time.time())
+
+
+def format_digest(entries: List[DigestEntry], content_type: str) -> str:
+    """
+    Format suppressed notifications with the same target as a single message
+    """
+    total = sum(entry.count for entry in entries)
+    if content_type == "text/markdown":
+        lines = [f"**{total} duplicate notifications were suppressed:**", ""]
+        for entry in entries:
+            summary = entry.message.strip().splitlines()[0] if entry.message else ""
+            lines.append(f"- {entry.count}x: {summary[:200]}")
+    else:
+        lines = [f"{total} duplicate notifications were suppressed:", ""]
+        for entry in entries:
+            summary = entry.message.strip().splitlines()[0] if entry.message else ""
+            lines.append(f"{entry.count}x: {summary[:200]}")
+    return "\n".join(lines)
@@ -89,3 +89,50 @@ class MultipleChannelsMatched(LMKError):
         self.channels = channels
         channels_str = ", ".join([channel.name for channel in channels])
         super().__init__(f"Multiple channels matched parameters: {channels_str}")
+
+
+class NotificationQueueFull(LMKError):
+    """
+    Error indicating that a deferred notification could not be queued because
+    the notification sender's queue is full
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        super().__init__(f"Notification queue is full ({max_size} items)")
+
+
+class NotificationSenderClosed(LMKError):
+    """
+    Error indicating that a deferred notification was submitted after the
+    notification sender was closed
+    """
+
+    def __init__(self) -> None:
+        super().__init__("The notification sender has been closed.")
+
+
+class DeliveryDeferred(LMKError):
+    """
+    Error indicating that a durable request could not be delivered right away,
+    but it has been saved in the outbox and will be retried
+    """
+
+    def __init__(self, key: str, kind: str) -> None:
+        self.key = key
+        self.kind = kind
+        super().__init__(f"Delivery of {kind} deferred; saved in outbox as {key}")
+
+
+class CircuitOpen(LMKError):
+    """
+    Error indicating that a request wasn't sent because the circuit breaker is open,
+    i.e. recent requests to the API have been failing
+    """
+
+    def __init__(self, retry_in: float) -> None:
+        self.retry_in = retry_in
+        super().__init__(
+            f"The LMK API appears to be unavailable; not sending requests for "
+            f"another {retry_in:.1f}s"
+        )
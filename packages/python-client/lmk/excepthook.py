@@ -0,0 +1,317 @@
+import asyncio
+import atexit
+import logging
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+import traceback
+from types import TracebackType
+from typing import Any, Callable, Dict, List, Optional, Type, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from lmk.instance import Instance
+
+
+LOGGER = logging.getLogger(__name__)
+
+MAX_TRACEBACK_LENGTH = 4000
+
+
+class ExceptHook:
+    """
+    Sends a notification for uncaught exceptions in the main thread
+    (``sys.excepthook``), in other threads (``threading.excepthook``) and in an asyncio
+    event loop's exception handler. Hooks that were installed before are still called.
+
+    Exceptions are put on a queue as they are, and their tracebacks are formatted and
+    sent from a background thread. At interpreter exit, queued notifications are given
+    up to ``exit_timeout`` seconds to be delivered, so an unreachable API never hangs
+    shutdown.
+
+    If ``on`` is ``"stop"``, a notification is also sent when the interpreter exits
+    without an uncaught exception.
+
+    Use ``lmk.install_excepthook()`` to create and install one.
+    """
+
+    def __init__(
+        self,
+        on: str = "error",
+        instance: Optional["Instance"] = None,
+        exit_timeout: float = 5.0,
+        max_notifications: int = 10,
+        notification_channels: Optional[List[str]] = None,
+    ) -> None:
+        if on not in {"error", "stop"}:
+            raise ValueError(f"on must be 'error' or 'stop', got {on!r}")
+        self.on = on
+        self.instance = instance
+        self.exit_timeout = exit_timeout
+        self.max_notifications = max_notifications
+        self.notification_channels = notification_channels
+
+        self.queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self.thread: Optional[threading.Thread] = None
+        self._idle = threading.Condition()
+        self._pending = 0
+        self._queued = 0
+        self._installed = False
+        self._previous_excepthook: Optional[Callable[..., Any]] = None
+        self._previous_threading_excepthook: Optional[Callable[..., Any]] = None
+        self._loops: List[asyncio.AbstractEventLoop] = []
+
+    def install(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """
+        Install the hooks. The asyncio exception handler is set on ``loop``, or on the
+        running loop if called from one.
+        """
+        if not self._installed:
+            self._previous_excepthook = sys.excepthook
+            sys.excepthook = self._excepthook
+            # threading.excepthook was added in python 3.8
+            if hasattr(threading, "excepthook"):
+                self._previous_threading_excepthook = threading.excepthook
+                threading.excepthook = self._threading_excepthook
+            atexit.register(self._at_exit)
+            self._installed = True
+
+        if loop is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+        if loop is not None and loop not in self._loops:
+            self.install_loop(loop)
+
+    def install_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        Set this hook as the exception handler of an asyncio event loop
+        """
+        previous = loop.get_exception_handler()
+
+        def handler(loop: asyncio.AbstractEventLoop, context: Dict[str, Any]) -> None:
+            self._asyncio_exception_handler(context)
+            if previous is not None:
+                previous(loop, context)
+            else:
+                loop.default_exception_handler(context)
+
+        loop.set_exception_handler(handler)
+        self._loops.append(loop)
+
+    def uninstall(self) -> None:
+        if not self._installed:
+            return
+        if sys.excepthook == self._excepthook:
+            sys.excepthook = self._previous_excepthook  # type: ignore
+        if (
+            hasattr(threading, "excepthook")
+            and threading.excepthook == self._threading_excepthook
+        ):
+            threading.excepthook = self._previous_threading_excepthook  # type: ignore
+        for loop in self._loops:
+            if not loop.is_closed():
+                loop.set_exception_handler(None)
+        self._loops.clear()
+        atexit.unregister(self._at_exit)
+        self._installed = False
+
+    def _excepthook(
+        self,
+        exc_type: Type[BaseException],
+        exc: BaseException,
+        tb: Optional[TracebackType],
+    ) -> None:
+        if not issubclass(exc_type, KeyboardInterrupt):
+            self._submit({"exc_info": (exc_type, exc, tb), "where": "main thread"})
+        if self._previous_excepthook is not None:
+            self._previous_excepthook(exc_type, exc, tb)
+
+    def _threading_excepthook(self, args: Any) -> None:
+        if not issubclass(args.exc_type, SystemExit):
+            name = args.thread.name if args.thread is not None else "unknown"
+            self._submit(
+                {
+                    "exc_info": (args.exc_type, args.exc_value, args.exc_traceback),
+                    "where": f"thread `{name}`",
+                }
+            )
+        if self._previous_threading_excepthook is not None:
+            self._previous_threading_excepthook(args)
+
+    def _asyncio_exception_handler(self, context: Dict[str, Any]) -> None:
+        exc = context.get("exception")
+        if exc is None:
+            # e.g. "Unclosed client session" or "Task was destroyed but it is pending",
+            # which are only warnings
+            return
+        self._submit(
+            {
+                "exc_info": (type(exc), exc, exc.__traceback__),
+                "where": "asyncio event loop",
+                "message": context.get("message"),
+            }
+        )
+
+    def _submit(self, item: Dict[str, Any]) -> None:
+        with self._idle:
+            if self._queued >= self.max_notifications:
+                return
+            self._queued += 1
+            self._pending += 1
+        self._ensure_started()
+        self.queue.put(item)
+
+    def _ensure_started(self) -> None:
+        if self.thread is not None:
+            return
+        with self._idle:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(
+                target=self._run, name="lmk-excepthook", daemon=True
+            )
+            self.thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            try:
+                self._send(item)
+            except Exception:
+                LOGGER.warning(
+                    "Unable to send uncaught exception notification", exc_info=True
+                )
+            finally:
+                with self._idle:
+                    self._pending -= 1
+                    self._idle.notify_all()
+
+    def _program(self) -> str:
+        argv0 = sys.argv[0] if sys.argv and sys.argv[0] else "python"
+        return os.path.basename(argv0)
+
+    def _send(self, item: Dict[str, Any]) -> None:
+        if item.get("stop"):
+            message = (
+                f"`{self._program()}` finished on `{socket.gethostname()}` "
+                f"(pid {os.getpid()})"
+            )
+        else:
+            exc_info = item.get("exc_info")
+            title = "Uncaught exception"
+            if exc_info is not None:
+                title = f"Uncaught `{exc_info[0].__name__}`"
+            lines = [
+                f"{title} in {item['where']} of `{self._program()}` on "
+                f"`{socket.gethostname()}` (pid {os.getpid()})"
+            ]
+            if item.get("message"):
+                lines.extend(["", str(item["message"])])
+            if exc_info is not None:
+                formatted = "".join(traceback.format_exception(*exc_info))
+                lines.extend(["", "```", formatted[-MAX_TRACEBACK_LENGTH:], "```"])
+            message = "\n".join(lines)
+
+        instance = self.instance
+        if instance is None:
+            from lmk.instance import get_instance
+
+            instance = get_instance()
+        instance.notify(
+            message,
+            content_type="text/markdown",
+            notification_channels=self.notification_channels,  # type: ignore
+        )
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait up to ``timeout`` seconds for queued notifications to be sent
+
+        :return: ``True`` if all queued notifications were sent (or failed) in time
+        :rtype: bool
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def _at_exit(self) -> None:
+        deadline = time.monotonic() + self.exit_timeout
+        with self._idle:
+            errored = self._queued > 0
+        if self.on == "stop" and not errored:
+            with self._idle:
+                self._pending += 1
+            self._ensure_started()
+            self.queue.put({"stop": True})
+
+        if not self.flush(max(0.0, deadline - time.monotonic())):
+            LOGGER.warning(
+                "Timed out after %.2fs sending %d uncaught exception notifications",
+                self.exit_timeout,
+                self._pending,
+            )
+
+
+_hook: Optional[ExceptHook] = None
+
+
+def install_excepthook(
+    on: str = "error",
+    instance: Optional["Instance"] = None,
+    exit_timeout: float = 5.0,
+    notification_channels: Optional[List[str]] = None,
+    loop: Optional[asyncio.AbstractEventLoop] = None,
+) -> ExceptHook:
+    """
+    Send a notification when the program crashes with an uncaught exception, in the main
+    thread, another thread or an asyncio event loop (the running one, or ``loop``).
+    Calling this again replaces the hook installed before.
+
+    <details><summary>Usage Example</summary>
+    <p>
+
+    ```python
+    import lmk
+
+    lmk.install_excepthook()
+
+    # No try/except needed; if this raises, you'll get a notification with the traceback
+    main()
+    ```
+    </p>
+    </details>
+
+    :param on: ``"error"`` to only notify about uncaught exceptions, or ``"stop"`` to also
+    notify when the program exits normally. Defaults to ``"error"``
+    :type on: str, optional
+    :param instance: The instance to send notifications with. Defaults to the default instance
+    :type instance: Instance, optional
+    :param exit_timeout: The maximum time to wait at exit for notifications to be sent, in
+    seconds. Defaults to 5
+    :type exit_timeout: float, optional
+    :param notification_channels: The notification channel IDs to send notifications to.
+    Defaults to the default channel
+    :type notification_channels: List[str], optional
+    :param loop: An event loop to set the exception handler on, if not called from a
+    running loop
+    :type loop: asyncio.AbstractEventLoop, optional
+
+    :return: The installed hook, which you can ``uninstall()``
+    :rtype: ExceptHook
+    """
+    global _hook
+    if _hook is not None:
+        _hook.uninstall()
+    _hook = ExceptHook(
+        on=on,
+        instance=instance,
+        exit_timeout=exit_timeout,
+        notification_channels=notification_channels,
+    )
+    _hook.install(loop)
+    return _hook
@@ -1,15 +1,21 @@
 import asyncio
-import configparser
+import concurrent.futures
 import contextlib
 import enum
+import hashlib
 import inspect
 import json
 import logging
 import os
+import random
+import sqlite3
 import threading
 import time
+import uuid
+import weakref
 import webbrowser
 from datetime import datetime, timedelta
+from functools import partial
 from typing import (
     Callable,
     Optional,
@@ -22,17 +28,22 @@ from typing import (
     cast,
     ContextManager,
     AsyncContextManager,
+    Iterable,
+    Set,
+    TYPE_CHECKING,
 )
 
-import aiohttp
 from blinker import signal
 from dateutil.parser import parse as parse_dt
 
+import lmk.patches
 from lmk import exc
-from lmk.api_client import api_client
+from lmk.api_client import ApiClient, api_client
+from lmk.channel_cache import ChannelCache, ChannelIndex
+from lmk.config import ConfigStore, config_store
+from lmk.dedup import Deduplicator, DigestEntry, format_digest
 from lmk.constants import APP_ID, API_URL
 from lmk.generated.api.app_api import AppApi
-from lmk.generated.api.event_api import EventApi
 from lmk.generated.api.headless_auth_api import HeadlessAuthApi
 from lmk.generated.api.notification_api import NotificationApi
 from lmk.generated.api.session_api import SessionApi
@@ -42,11 +53,6 @@ from lmk.generated.models.app_connection_self_response import AppConnectionSelfR
 from lmk.generated.models.create_headless_auth_session_request import (
     CreateHeadlessAuthSessionRequest,
 )
-from lmk.generated.models.create_session_request import CreateSessionRequest
-from lmk.generated.models.event_request import (
-    EventRequest,
-    EventNotificationConfiguration,
-)
 from lmk.generated.models.event_response import EventResponse
 from lmk.generated.models.headless_auth_refresh_token_request import (
     HeadlessAuthRefreshTokenRequest,
@@ -57,17 +63,25 @@ from lmk.generated.models.headless_auth_session_response import (
 from lmk.generated.models.notification_channel_response import (
     NotificationChannelResponse,
 )
-from lmk.generated.models.create_session_request_state import CreateSessionRequestState
 from lmk.generated.models.process_session_state import ProcessSessionState
 from lmk.generated.models.jupyter_session_state import JupyterSessionState
 from lmk.generated.models.session_response import SessionResponse
-from lmk.jupyter import is_jupyter, run_javascript
-from lmk.utils.asyncio import async_callback, asyncio_lock
-from lmk.utils.ws import WebSocket, ws_connected
+from lmk.ledger import DEFAULT_CHANNEL, EventLedger, default_job_name
+from lmk.outbox import Outbox, OutboxEntry
+from lmk.sender import NotificationSender
+from lmk.utils.asyncio import async_file_lock, asyncio_lock, deadline_retry_rule
+from lmk.utils.os import file_lock
+
+if TYPE_CHECKING:
+    from lmk.aggregation import Aggregator
+    from lmk.progress_bar import ProgressReporter
+    from lmk.utils.ws import WebSocket
 
 
 LOGGER = logging.getLogger(__name__)
 
+lmk.patches.patch()
+
 default_instance_changed = signal("default-instance-changed")
 
 access_token_changed = signal("access-token-changed")
@@ -78,6 +92,12 @@ default_channel_changed = signal("default-channel-changed")
 
 channels_fetch_state_changed = signal("channels-fetch-state-changed")
 
+# Access tokens are refreshed this many seconds before they expire, both in the
+# background and on the request path
+ACCESS_TOKEN_REFRESH_MARGIN = 60.0
+
+EVENT_CONTENT_TYPES = ("text/plain", "text/markdown")
+
 
 class ChannelType(str, enum.Enum):
     """ """
@@ -154,7 +174,10 @@ def handle_error(is_async: bool = False) -> Any:
         try:
             return await func()
         except error_type as err:
-            return handle_error(err)
+            result = handle_error(err)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
 
     return async_handle_error if is_async else sync_handle_error
 
@@ -198,8 +221,13 @@ class Channels:
         self.instance = instance
         self._fetch_state = ChannelsState.None_
         self._fetch_lock = threading.Lock()
-        self._afetch_lock = asyncio_lock()
-        self.data: Optional[List[NotificationChannelResponse]] = None
+        self._afetch_locks: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._data: Optional[List[NotificationChannelResponse]] = None
+        self._index: Optional[ChannelIndex] = None
+        self._fetched_at: Optional[float] = None
+        self._cache: Optional[ChannelCache] = None
+        self._revalidating = False
+        self._revalidate_tasks: Set[asyncio.Task] = set()
 
         @access_token_changed.connect_via(instance)
         def handle_access_token_changed(sender, old_value, new_value):
@@ -207,6 +235,149 @@ class Channels:
                 self.fetch_state = ChannelsState.None_
                 self.data = None
 
+    @property
+    def data(self) -> Optional[List[NotificationChannelResponse]]:
+        return self._data
+
+    @data.setter
+    def data(self, value: Optional[List[NotificationChannelResponse]]) -> None:
+        self._data = value
+        self._index = None if value is None else ChannelIndex(value)
+        self._fetched_at = None if value is None else time.time()
+
+    @property
+    def cache(self) -> ChannelCache:
+        """
+        The on-disk cache that fetched channels are saved to, so that new processes
+        can use them without fetching them again. This is stored next to the config
+        file (``~/.lmk/cache`` by default); assign a ``ChannelCache`` to change the
+        location or TTL.
+        """
+        if self._cache is None:
+            config_path = self.instance.config_path or os.path.expanduser(
+                "~/.lmk/config"
+            )
+            self._cache = ChannelCache(
+                os.path.join(os.path.dirname(config_path), "cache")
+            )
+        return self._cache
+
+    @cache.setter
+    def cache(self, value: ChannelCache) -> None:
+        self._cache = value
+
+    def _cache_key(self) -> Optional[str]:
+        instance = self.instance
+        token = instance.refresh_token or instance.access_token
+        if not token:
+            return None
+        return "|".join([instance.server_url, instance.profile, token])
+
+    def _load_cached(self) -> bool:
+        key = self._cache_key()
+        if key is None:
+            return False
+        cached = self.cache.load(key)
+        if cached is None:
+            return False
+
+        channels, fetched_at = cached
+        LOGGER.debug("Loaded %d channels from cache", len(channels))
+        self._set_channels(channels)
+        self._fetched_at = fetched_at
+        return True
+
+    def _set_channels(self, channels: List[NotificationChannelResponse]) -> None:
+        LOGGER.debug("Channels: %s", channels)
+        self.data = channels
+        if channels:
+            self.default = channels[0].notification_channel_id
+        else:
+            self.default = None
+        self.fetch_state = ChannelsState.Loaded
+
+    def _async_fetch_lock(self) -> asyncio.Lock:
+        # asyncio locks can only be used with the loop they were created on
+        loop = asyncio.get_running_loop()
+        lock = self._afetch_locks.get(loop)
+        if lock is None:
+            lock = self._afetch_locks[loop] = asyncio_lock(loop)
+        return lock
+
+    def _maybe_revalidate(self, async_req: bool = False) -> None:
+        """
+        If the loaded channels are stale, fetch them again in the background; the stale
+        channels are used in the meantime.
+        """
+        if (
+            self.fetch_state != ChannelsState.Loaded
+            or self._fetched_at is None
+            or self.cache.is_fresh(self._fetched_at)
+            or self._revalidating
+        ):
+            return
+
+        self._revalidating = True
+
+        def done() -> None:
+            self._revalidating = False
+
+        if async_req:
+
+            async def revalidate_async() -> None:
+                try:
+                    await self._fetch_remote(async_req=True, revalidate=True)
+                except Exception:
+                    LOGGER.debug("Failed to revalidate channels", exc_info=True)
+                finally:
+                    done()
+
+            task = asyncio.get_running_loop().create_task(revalidate_async())
+            self._revalidate_tasks.add(task)
+            task.add_done_callback(self._revalidate_tasks.discard)
+            return
+
+        def revalidate() -> None:
+            try:
+                self._fetch_remote(revalidate=True)
+            except Exception:
+                LOGGER.debug("Failed to revalidate channels", exc_info=True)
+            finally:
+                done()
+
+        threading.Thread(
+            target=revalidate, name="lmk-channels-revalidate", daemon=True
+        ).start()
+
+    def _fetch_remote(self, async_req: bool = False, revalidate: bool = False) -> Any:
+        if not revalidate:
+            self.fetch_state = ChannelsState.Loading
+
+        def handle_channels(channels: List[NotificationChannelResponse]):
+            self._set_channels(channels)
+            key = self._cache_key()
+            if key is not None:
+                self.cache.save(key, channels)
+
+        def handle_error_value(error: Exception):
+            # Keep using the stale channels if revalidating them fails
+            if revalidate:
+                raise error
+            if isinstance(error, ApiException) and error.status == 403:
+                self.fetch_state = ChannelsState.Forbidden
+            else:
+                self.fetch_state = ChannelsState.Error
+            raise error
+
+        return handle_error(async_req)(
+            lambda: pipeline(async_req)(
+                lambda _: self.instance.list_notification_channels(async_req),
+                handle_channels,
+            ),
+            Exception,
+            handle_error_value,
+        )
+
     @property
     def fetch_state(self) -> ChannelsState:
         return self._fetch_state
@@ -227,6 +398,7 @@ class Channels:
         def maybe_fetch():
             if self.fetch_state != ChannelsState.Loaded and fetch:
                 return self.fetch(async_req=async_req)
+            self._maybe_revalidate(async_req)
             return None
 
         def check():
@@ -272,52 +444,33 @@ class Channels:
         :type async_req: bool, optional
         :param force: If ``True``, refetch notification channels even if they have already
         been fetched successfully. By default, fetching will be skipped if it's already been done
-        successfully.
+        successfully, or if the channels can be loaded from the on-disk cache (see ``cache``). Stale
+        cached channels are used while they're fetched again in the background.
 
         :return: This method does not return anything
         :rtype: None
         """
-        ctx_managers: List[Union[ContextManager[Any], AsyncContextManager[Any]]] = []
-        if async_req:
-            ctx_managers.append(self._afetch_lock)
-        ctx_managers.append(self._fetch_lock)
-
-        if (
-            self.fetch_state
-            not in {ChannelsState.None_, ChannelsState.Error, ChannelsState.Forbidden}
-            and not force
-        ):
-            return
-
-        self.fetch_state = ChannelsState.Loading
 
-        def handle_channels(channels: List[NotificationChannelResponse]):
-            LOGGER.debug("Channels: %s", channels)
-            self.data = channels
-            if channels:
-                self.default = channels[0].notification_channel_id
-            else:
-                self.default = None
-            self.fetch_state = ChannelsState.Loaded
+        def fetch_channels():
+            if not force and self.fetch_state == ChannelsState.Loaded:
+                return None
+            if not force and self._load_cached():
+                self._maybe_revalidate(async_req)
+                return None
+            return self._fetch_remote(async_req)
 
-        def handle_error_value(error: Exception):
-            if isinstance(error, ApiException) and error.status == 403:
-                self.fetch_state = ChannelsState.Forbidden
-            else:
-                self.fetch_state = ChannelsState.Error
-            raise error
+        if not async_req:
+            with self._fetch_lock:
+                return fetch_channels()
 
-        error_handler = handle_error(async_req)
+        # The async path only waits on an asyncio lock, so it never blocks the loop
+        async def fetch_channels_async():
+            async with self._async_fetch_lock():
+                result = fetch_channels()
+                if inspect.isawaitable(result):
+                    await result
 
-        return error_handler(
-            lambda: pipeline(async_req)(
-                lambda _: self.instance.list_notification_channels(async_req),
-                handle_channels,
-                ctx_managers=ctx_managers,
-            ),
-            Exception,
-            handle_error_value,
-        )
+        return fetch_channels_async()  # type: ignore
 
     def __repr__(self) -> str:
         if self.fetch_state != ChannelsState.Loaded:
@@ -344,6 +497,18 @@ class Channels:
 
         return f"{type(self).__name__}(\n{channels_str}\n)"
 
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """
+        The fetched channels as dictionaries (as returned by ``to_dict()``), or an empty
+        list if channels haven't been fetched. These are computed once each time channels
+        are fetched, so this is cheap to call repeatedly.
+
+        :rtype: List[Dict[str, Any]]
+        """
+        if self._index is None:
+            return []
+        return self._index.dicts()
+
     def __iter__(self):
         self._ensure_fetched(fetch=True)
         yield from self.data
@@ -360,6 +525,7 @@ class Channels:
         name_exact: bool = False,
         fetch: bool = True,
         async_req: bool = False,
+        channel_id: Optional[str] = None,
     ) -> List[NotificationChannelResponse]:
         """
         List notification channels. This will fetch notification channels if they haven't been
@@ -377,6 +543,8 @@ class Channels:
         :param async_req: ``True`` if you want to send the request asynchronously, in which case this
         method will return a coroutine. Defaults to ``False``.
         :type async_req: bool, optional
+        :param channel_id: Filter to the notification channel with this ID
+        :type channel_id: str, optional
 
         :return: A list of notification channels matching the given parameters
         :rtype: List[NotificationChannelResponse]
@@ -385,16 +553,12 @@ class Channels:
             type = ChannelType(type)
 
         def filter():
-            channels = self.data
-            if type is not None:
-                channels = [
-                    c for c in channels if c.payload.actual_instance.type == type.value
-                ]
-            if name is not None and name_exact:
-                channels = [c for c in channels if c.name == name]
-            if name is not None and not name_exact:
-                channels = [c for c in channels if name in c.name.lower()]
-            return channels
+            return cast(ChannelIndex, self._index).find(
+                name=name,
+                type=None if type is None else type.value,
+                name_exact=name_exact,
+                channel_id=channel_id,
+            )
 
         return pipeline(async_req)(
             lambda _: self._ensure_fetched(fetch=fetch, async_req=async_req),
@@ -408,6 +572,7 @@ class Channels:
         name_exact: bool = False,
         fetch: bool = True,
         async_req: bool = False,
+        channel_id: Optional[str] = None,
     ) -> Optional[NotificationChannelResponse]:
         """
         Get a single notification channel with the given parameters.
@@ -424,6 +589,8 @@ class Channels:
         :param async_req: ``True`` if you want to send the request asynchronously, in which case this
         method will return a coroutine. Defaults to ``False``.
         :type async_req: bool, optional
+        :param channel_id: Filter to the notification channel with this ID
+        :type channel_id: str, optional
 
         :return: A notification channel matching the given parameters, or ``None`` if none exists.
         :rtype: NotificationChannelResponse | None
@@ -443,6 +610,7 @@ class Channels:
                 name_exact=name_exact,
                 fetch=fetch,
                 async_req=async_req,
+                channel_id=channel_id,
             ),
             pick,
         )
@@ -463,6 +631,9 @@ class Instance:
         access_token_expires: Optional[Union[datetime, str]] = None,
         logger: Optional[logging.Logger] = None,
         sync_config: bool = True,
+        client: Optional[ApiClient] = None,
+        sender: Optional[NotificationSender] = None,
+        background_refresh: bool = True,
     ) -> None:
         if profile is None:
             profile = os.getenv("LMK_PROFILE")
@@ -496,11 +667,39 @@ class Instance:
         self._access_token: Optional[str] = None
         self._server_url: Optional[str] = None
         self._default_channel: Optional[str] = None
-
-        self.client = api_client(
-            server_url=server_url or API_URL,
-            logger=logger,
-        )
+        # A sender passed in may be shared with other instances (see InstancePool), so
+        # it's only closed by close() if this instance created it
+        self._sender: Optional[NotificationSender] = sender
+        self._owns_sender = sender is None
+        self._sender_lock = threading.Lock()
+        self._progress_reporter: Optional["ProgressReporter"] = None
+        self._outbox: Optional[Outbox] = None
+        self._ledger: Optional[EventLedger] = None
+        self._ledger_enabled = True
+        self._refresh_lock = threading.Lock()
+        self._refresh_tasks: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._refresh_timer: Optional[threading.Timer] = None
+        self._refresh_timer_lock = threading.Lock()
+        self._refresh_timer_expires: Optional[int] = None
+        # Refresh the access token in a background thread before it expires
+        self.background_refresh = background_refresh
+        self._digest_timer: Optional[threading.Timer] = None
+        self._digest_lock = threading.Lock()
+        # Set to a Deduplicator to suppress duplicate notifications
+        self.deduplicator: Optional[Deduplicator] = None
+        # Set by lmk.enable_aggregation() in distributed jobs
+        self.aggregator: Optional["Aggregator"] = None
+
+        # A client passed in may be shared with other instances (see InstancePool),
+        # so it's only closed by close() if this instance created it
+        self._owns_client = client is None
+        self._logger = logger
+        if client is None:
+            client = api_client(
+                server_url=server_url or API_URL,
+                logger=logger,
+            )
+        self.client = client
         self.channels = Channels(self)
 
         # Set this to False before loading initial values so that we
@@ -517,8 +716,356 @@ class Instance:
 
         self._load_config()
 
+        # Requests left in the outbox by earlier processes, e.g. a notification queued
+        # as a job exited while the API was unreachable, are delivered in the background
+        if self.logged_in() and os.path.exists(self.outbox.path):
+            self.sender.drain_outbox(self)
+
     def close(self) -> None:
-        self.client.close()
+        self._cancel_refresh_timer()
+        with self._digest_lock:
+            if self._digest_timer is not None:
+                self._digest_timer.cancel()
+                self._digest_timer = None
+        if self._sender is not None and self._owns_sender:
+            self._sender.close()
+        if self._progress_reporter is not None:
+            self._progress_reporter.close()
+        if self.aggregator is not None:
+            self.aggregator.close()
+        if self._owns_client:
+            self.client.close()
+
+    @property
+    def sender(self) -> NotificationSender:
+        """
+        The background sender used for ``notify(..., deferred=True)``. This is created
+        with default settings the first time it's used; assign a ``NotificationSender``
+        to configure the queue size, batch window or concurrency.
+        """
+        if self._sender is None:
+            with self._sender_lock:
+                if self._sender is None:
+                    self._sender = NotificationSender(self)
+        return self._sender
+
+    @sender.setter
+    def sender(self, value: NotificationSender) -> None:
+        with self._sender_lock:
+            old_value, self._sender = self._sender, value
+            owned, self._owns_sender = self._owns_sender, True
+        if old_value is not None and old_value is not value and owned:
+            old_value.close()
+
+    @property
+    def progress_reporter(self) -> "ProgressReporter":
+        """
+        The background reporter that sends ``progress()`` bars and ``log_metric()``
+        values to a session. This is created with default settings the first time it's
+        used; assign a ``ProgressReporter`` to configure the update interval or session.
+        """
+        reporter = self._progress_reporter
+        if reporter is None:
+            from lmk.progress_bar import ProgressReporter
+
+            with self._sender_lock:
+                if self._progress_reporter is None:
+                    self._progress_reporter = ProgressReporter(self)
+                reporter = self._progress_reporter
+        return reporter
+
+    @progress_reporter.setter
+    def progress_reporter(self, value: "ProgressReporter") -> None:
+        with self._sender_lock:
+            old_value, self._progress_reporter = self._progress_reporter, value
+        if old_value is not None and old_value is not value:
+            old_value.close()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for notifications sent with ``notify(..., deferred=True)`` to be delivered.
+
+        :param timeout: The maximum time to wait, in seconds. If ``None``, wait indefinitely.
+        :type timeout: float, optional
+
+        :return: ``True`` if all deferred notifications were sent before the timeout
+        :rtype: bool
+        """
+        if self._sender is None:
+            return True
+        return self._sender.flush(timeout)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Statistics for the API requests sent by this instance's client, by operation (e.g.
+        ``post_event``, ``create_session``, ``refresh_headless_auth_token``): request,
+        error and retry counts, and a latency histogram. See ``ClientStats`` for details and
+        for exporting these with a signal. Instances in an ``InstancePool`` share a client,
+        so they also share statistics.
+
+        <details><summary>Usage Example</summary>
+        <p>
+
+        ```python
+        import lmk
+
+        lmk.notify("Hello, world!")
+
+        stats = lmk.stats()["post_event"]
+        print(stats["count"], stats["retries"], stats["total_time"] / stats["count"])
+        ```
+
+        </p>
+        </details>
+
+        :return: Statistics for each operation that has been called
+        :rtype: Dict[str, Dict[str, Any]]
+        """
+        return self.client.stats.snapshot()
+
+    @property
+    def outbox(self) -> Outbox:
+        """
+        The durable outbox used for ``notify(..., durable=True)`` and
+        ``end_session(..., durable=True)``. This is stored next to the config file
+        (``~/.lmk/outbox.db`` by default) and shared by every profile, so this
+        instance only delivers the entries it saved itself (see ``_outbox_owner()``).
+        """
+        if self._outbox is None:
+            with self._sender_lock:
+                if self._outbox is None:
+                    config_path = self.config_path or os.path.expanduser(
+                        "~/.lmk/config"
+                    )
+                    self._outbox = Outbox(
+                        os.path.join(os.path.dirname(config_path), "outbox.db"),
+                        owner=self._outbox_owner(),
+                    )
+        return self._outbox
+
+    @outbox.setter
+    def outbox(self, value: Outbox) -> None:
+        self._outbox = value
+
+    def _outbox_owner(self) -> str:
+        # Profiles synced with the config file keep the same owner when their tokens
+        # are refreshed; other instances are identified by their token, since several
+        # of them can use the same profile name
+        parts = [self.server_url, self.profile]
+        if not self.sync_config:
+            parts.append(self.refresh_token or self.access_token or "")
+        return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+    @property
+    def ledger(self) -> Optional[EventLedger]:
+        """
+        The ledger that notifications sent by ``notify()`` are recorded in (see
+        ``EventLedger``). This is stored next to the config file (``~/.lmk/events.db``
+        by default); set it to ``None`` to stop recording notifications.
+        """
+        if self._ledger is None and self._ledger_enabled:
+            with self._sender_lock:
+                if self._ledger is None:
+                    config_path = self.config_path or os.path.expanduser(
+                        "~/.lmk/config"
+                    )
+                    self._ledger = EventLedger(
+                        os.path.join(os.path.dirname(config_path), "events.db")
+                    )
+        return self._ledger
+
+    @ledger.setter
+    def ledger(self, value: Optional[EventLedger]) -> None:
+        self._ledger = value
+        self._ledger_enabled = value is not None
+
+    def _record_event(
+        self,
+        body: Dict[str, Any],
+        job: Optional[str],
+        started: float,
+        start_time: float,
+        response: Optional[EventResponse] = None,
+        error: Optional[BaseException] = None,
+        async_req: bool = False,
+    ) -> Any:
+        ledger = self.ledger
+        if ledger is None:
+            return None
+        latency = time.perf_counter() - started
+        if async_req:
+            # Recording can wait on the database lock, so it's kept off the event loop
+            return asyncio.get_running_loop().run_in_executor(
+                None,
+                partial(
+                    self._write_event,
+                    ledger,
+                    body,
+                    job,
+                    start_time,
+                    latency,
+                    response,
+                    error,
+                ),
+            )
+        self._write_event(ledger, body, job, start_time, latency, response, error)
+        return None
+
+    def _write_event(
+        self,
+        ledger: EventLedger,
+        body: Dict[str, Any],
+        job: Optional[str],
+        start_time: float,
+        latency: float,
+        response: Optional[EventResponse],
+        error: Optional[BaseException],
+    ) -> None:
+        notification_config = body.get("notificationConfig")
+        if notification_config is None:
+            channels: List[str] = []
+        else:
+            channels = notification_config.get("channelIds") or [DEFAULT_CHANNEL]
+        try:
+            ledger.record(
+                body["message"],
+                body["contentType"],
+                channels,
+                created=start_time,
+                latency=latency,
+                event_id=None if response is None else response.event_id,
+                job=job,
+                error=error,
+            )
+        except (sqlite3.Error, OSError):
+            # The ledger is only a local record, so it never stops a notification,
+            # including when its directory can't be written to
+            LOGGER.warning("Failed to record event in %s", ledger.path, exc_info=True)
+
+    def _auth_headers(
+        self, access_token: str, idempotency_key: Optional[str] = None
+    ) -> Dict[str, str]:
+        headers = {"Authorization": f"Bearer {access_token}"}
+        if idempotency_key is not None:
+            headers["Idempotency-Key"] = idempotency_key
+        return headers
+
+    def _send_durable(
+        self, kind: str, payload: Dict[str, Any], async_req: bool = False
+    ) -> Any:
+        if not async_req:
+            return self._deliver_outbox_entry(self.outbox.put(kind, payload))
+
+        async def send() -> Any:
+            # Saving the entry waits on the outbox's file lock, so it's done off the
+            # event loop
+            loop = asyncio.get_running_loop()
+            entry = await loop.run_in_executor(None, self.outbox.put, kind, payload)
+            return await self._deliver_outbox_entry(entry, async_req=True)
+
+        return send()
+
+    def _deliver_outbox_entry(self, entry: OutboxEntry, async_req: bool = False) -> Any:
+        outbox = self.outbox
+
+        methods: Dict[str, Callable[..., Any]] = {
+            # Deduplication and aggregation were already applied when the entry was
+            # saved, so a second pass must not suppress it
+            "event": partial(self.notify, dedupe=False, aggregate=False),
+            "end_session": self.end_session,
+        }
+        if entry.kind not in methods:
+            outbox.remove(entry.key)
+            raise ValueError(f"Unknown outbox entry kind: {entry.kind}")
+
+        method = methods[entry.kind]
+
+        def send() -> Any:
+            return method(
+                **entry.payload, async_req=async_req, idempotency_key=entry.key
+            )
+
+        def handle_success(result: Any) -> Any:
+            outbox.remove(entry.key)
+            return result
+
+        def handle_error_value(error: Exception):
+            if outbox.record_failure(entry, error):
+                self.sender.drain_outbox(self)
+                raise exc.DeliveryDeferred(entry.key, entry.kind) from error
+            raise error
+
+        return handle_error(async_req)(
+            lambda: pipeline(async_req)(lambda _: send(), handle_success),
+            Exception,
+            handle_error_value,
+        )
+
+    def drain_outbox(
+        self, limit: int = 100, concurrency: int = 4, async_req: bool = False
+    ) -> int:
+        """
+        Attempt to deliver requests saved in the outbox that are due for a retry. Requests
+        that fail again are rescheduled with backoff, and ones that fail with a non-retryable
+        error are discarded.
+
+        :param limit: The maximum number of requests to attempt. Defaults to 100
+        :type limit: int, optional
+        :param concurrency: The maximum number of requests in flight at once when
+        ``async_req=True``. Defaults to 4
+        :type concurrency: int, optional
+        :param async_req: ``True`` if you want to send the requests asynchronously, in which case this
+        method will return a coroutine. Defaults to ``False``.
+        :type async_req: bool, optional
+
+        :return: The number of requests that were delivered
+        :rtype: int
+        """
+
+        def claim() -> List[OutboxEntry]:
+            if self.client.circuit_breaker.is_open:
+                # Don't use up delivery attempts while the API is known to be down
+                LOGGER.debug("Not draining outbox because the circuit breaker is open")
+                return []
+            return self.outbox.claim(limit)
+
+        def handle_delivery_error(entry: OutboxEntry, error: Exception) -> None:
+            if isinstance(error, exc.DeliveryDeferred):
+                LOGGER.debug("Delivery of outbox entry %s failed again", entry.key)
+            else:
+                LOGGER.warning(
+                    "Discarded outbox entry %s (%s): %s", entry.key, entry.kind, error
+                )
+
+        if not async_req:
+            delivered = 0
+            for entry in claim():
+                try:
+                    self._deliver_outbox_entry(entry)
+                except Exception as err:
+                    handle_delivery_error(entry, err)
+                else:
+                    delivered += 1
+            return delivered
+
+        async def drain() -> int:
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def deliver(entry: OutboxEntry) -> bool:
+                async with semaphore:
+                    try:
+                        await self._deliver_outbox_entry(entry, async_req=True)
+                    except Exception as err:
+                        handle_delivery_error(entry, err)
+                        return False
+                    return True
+
+            # Claiming waits on the outbox's file lock, so it's done off the event loop
+            entries = await asyncio.get_running_loop().run_in_executor(None, claim)
+            results = await asyncio.gather(*[deliver(entry) for entry in entries])
+            return sum(results)
+
+        return drain()  # type: ignore
 
     @property
     def access_token(self) -> Optional[str]:
@@ -541,7 +1088,13 @@ class Instance:
             return
         old_value, self._server_url = self._server_url, value
 
-        self.client.configuration.host = value
+        if not self._owns_client and self.client.configuration.host != self.server_url:
+            # Don't change the server of a shared client out from under the other
+            # instances using it
+            self.client = api_client(server_url=self.server_url, logger=self._logger)
+            self._owns_client = True
+        else:
+            self.client.configuration.host = value
         server_url_changed.send(
             self,
             old_value=old_value,
@@ -572,109 +1125,214 @@ class Instance:
             new_value=value,
         )
 
+    @property
+    def config_store(self) -> ConfigStore:
+        return config_store(self.config_path)
+
     def _load_config(self, force: bool = False, overwrite: bool = False) -> None:
         if self._config_loaded and not force:
             return
 
-        parser = configparser.ConfigParser()
-        if self.config_path is None:
-            config_paths = [os.path.expanduser("~/.lmk/config")]
-        elif not os.path.isfile(self.config_path):
+        if self.config_path is not None and not os.path.isfile(self.config_path):
             raise exc.ConfigFileNotFound(self.config_path)
-        else:
-            config_paths = [self.config_path]
-
-        read_config_paths = [path for path in config_paths if os.path.isfile(path)]
 
-        parser.read(read_config_paths)
-        if self.profile in parser:
-            section = parser[self.profile]
+        section = self.config_store.get_profile(self.profile)
+        if section is not None:
             if self.access_token is None or overwrite:
                 self.access_token = section.get("access_token", self.access_token)
             if self.refresh_token is None or overwrite:
                 self.refresh_token = section.get("refresh_token", self.refresh_token)
-            if self.access_token_expires is None or overwrite:
-                self.access_token_expires = section.getint(
-                    "access_token_expires", self.access_token_expires
-                )
+            if (
+                self.access_token_expires is None or overwrite
+            ) and "access_token_expires" in section:
+                self.access_token_expires = int(section["access_token_expires"])
             if self._server_url is None or overwrite:
                 self.server_url = section.get("server_url", self._server_url)
 
         self._config_loaded = True
 
     def _save_config(self) -> None:
-        config_path = self.config_path
-        if config_path is None:
-            config_path = os.path.expanduser("~/.lmk/config")
-
-        config_dir = os.path.dirname(config_path)
-        if not os.path.exists(config_dir):
-            os.makedirs(config_dir)
-
-        parser = configparser.ConfigParser()
-        obj: Dict[str, Any] = {}
+        obj: Dict[str, str] = {}
         if self.access_token is not None:
             obj["access_token"] = self.access_token
         if self.refresh_token is not None:
             obj["refresh_token"] = self.refresh_token
         if self.access_token_expires is not None:
-            obj["access_token_expires"] = self.access_token_expires
+            obj["access_token_expires"] = str(self.access_token_expires)
         if self._server_url is not None:
             obj["server_url"] = self.server_url
 
-        parser[self.profile] = obj
-        with open(config_path, "w+") as f:
-            parser.write(f)
-
-        LOGGER.info("wrote config to %s", config_path)
+        self.config_store.set_profile(self.profile, obj)
 
         self._config_loaded = True
 
-    def _refresh_access_token_sync(self) -> None:
-        api = HeadlessAuthApi(self.client)
-        response = api.refresh_headless_auth_token(
-            HeadlessAuthRefreshTokenRequest(
-                appId=APP_ID, refreshToken=cast(str, self.refresh_token)
-            )
-        )
+    def _token_lock_path(self) -> str:
+        return self.config_store.path + ".refresh.lock"
+
+    def _access_token_needs_refresh(self) -> bool:
+        if not self.access_token_expires:
+            return False
+        now = datetime.utcnow().timestamp() * 1000
+        margin = ACCESS_TOKEN_REFRESH_MARGIN if self.refresh_token else 0.0
+        return self.access_token_expires - margin * 1000 < now
+
+    def _adopt_config_access_token(self) -> bool:
+        """
+        Another process sharing the config file may have already refreshed the
+        access token; if so, use that rather than refreshing it again
+        """
+        if not self.sync_config:
+            return False
+
+        section = self.config_store.get_profile(self.profile)
+        if section is None:
+            return False
+
+        expires_str = section.get("access_token_expires")
+        expires = None if expires_str is None else int(expires_str)
+        if (
+            section.get("refresh_token") != self.refresh_token
+            or expires is None
+            or expires <= (self.access_token_expires or 0)
+        ):
+            return False
+
+        LOGGER.debug("Using access token refreshed by another process")
+        self.access_token = section.get("access_token")
+        self.access_token_expires = expires
+        return not self._access_token_needs_refresh()
+
+    def _token_file_lock(self) -> ContextManager[None]:
+        if not self.sync_config:
+            return contextlib.nullcontext()
+        return file_lock(self._token_lock_path())
+
+    def _async_token_file_lock(self) -> AsyncContextManager[None]:
+        if not self.sync_config:
+            return contextlib.nullcontext()  # type: ignore
+        return async_file_lock(self._token_lock_path())
+
+    def _set_refreshed_access_token(self, response: AccessTokenResponse) -> None:
         self.set_access_token(
             response.access_token,
             self.refresh_token,
             datetime.utcnow() + timedelta(seconds=response.expires_in),
         )
+        # Write the new token right away so other processes waiting on the
+        # refresh lock can pick it up
+        if self.sync_config:
+            self.config_store.flush()
+
+    def _refresh_access_token_sync(self) -> None:
+        # Only one thread refreshes at a time; the others wait for it and then
+        # find that the token no longer needs to be refreshed. The file lock does
+        # the same for other processes sharing the config file.
+        with self._refresh_lock, self._token_file_lock():
+            if not self._access_token_needs_refresh():
+                return
+            if self._adopt_config_access_token():
+                return
+
+            api = HeadlessAuthApi(self.client)
+            response = api.refresh_headless_auth_token(
+                HeadlessAuthRefreshTokenRequest(
+                    appId=APP_ID, refreshToken=cast(str, self.refresh_token)
+                )
+            )
+            self._set_refreshed_access_token(response)
 
     def _get_access_token_sync(self) -> str:
-        now = datetime.utcnow().timestamp() * 1000
-        if self.access_token_expires and self.access_token_expires < now:
+        if self._access_token_needs_refresh():
             self._refresh_access_token_sync()
         if self.access_token is None:
             raise exc.NotLoggedIn()
 
+        self._schedule_refresh()
         return self.access_token
 
+    async def _do_refresh_access_token_async(self) -> None:
+        # Reading and writing the config file are done off the event loop, since
+        # writing it waits on fsync
+        loop = asyncio.get_running_loop()
+        async with self._async_token_file_lock():
+            if not self._access_token_needs_refresh():
+                return
+            if await loop.run_in_executor(None, self._adopt_config_access_token):
+                return
+
+            api = HeadlessAuthApi(self.client)
+            response = await api.refresh_headless_auth_token(  # type: ignore
+                HeadlessAuthRefreshTokenRequest(
+                    appId=APP_ID, refreshToken=cast(str, self.refresh_token)
+                ),
+                async_req=True,
+            )
+            await loop.run_in_executor(None, self._set_refreshed_access_token, response)
+
     async def _refresh_access_token_async(self) -> None:
-        api = HeadlessAuthApi(self.client)
-        response = await api.refresh_headless_auth_token(  # type: ignore
-            HeadlessAuthRefreshTokenRequest(
-                appId=APP_ID, refreshToken=cast(str, self.refresh_token)
-            ),
-            async_req=True,
-        )
-        self.set_access_token(
-            response.access_token,
-            self.refresh_token,
-            datetime.utcnow() + timedelta(seconds=response.expires_in),
-        )
+        # Concurrent callers on the same event loop all wait for a single refresh
+        loop = asyncio.get_running_loop()
+        task = self._refresh_tasks.get(loop)
+        if task is None or task.done():
+            task = loop.create_task(self._do_refresh_access_token_async())
+            self._refresh_tasks[loop] = task
+        await asyncio.shield(task)
 
     async def _get_access_token_async(self) -> str:
-        now = datetime.utcnow().timestamp() * 1000
-        if self.access_token_expires and self.access_token_expires < now:
+        if self._access_token_needs_refresh():
             await self._refresh_access_token_async()
         if self.access_token is None:
             raise exc.NotLoggedIn()
 
+        self._schedule_refresh()
         return self.access_token
 
+    def _cancel_refresh_timer(self) -> None:
+        timer, self._refresh_timer = self._refresh_timer, None
+        self._refresh_timer_expires = None
+        if timer is not None:
+            timer.cancel()
+
+    def _schedule_refresh(self, delay: Optional[float] = None) -> None:
+        """
+        Refresh the access token in a background thread shortly before it expires, so
+        requests don't have to wait for it. The delay is jittered so that processes
+        sharing a config file don't all wake up at once.
+        """
+        with self._refresh_timer_lock:
+            expires = self.access_token_expires
+            if delay is None and expires == self._refresh_timer_expires:
+                return
+
+            self._cancel_refresh_timer()
+            if not expires or not self.refresh_token or not self.background_refresh:
+                return
+
+            if delay is None:
+                now = datetime.utcnow().timestamp() * 1000
+                remaining = (expires - now) / 1000
+                delay = remaining - ACCESS_TOKEN_REFRESH_MARGIN * random.uniform(
+                    0.5, 1.0
+                )
+
+            timer = threading.Timer(max(delay, 0.0), self._background_refresh)
+            timer.daemon = True
+            self._refresh_timer = timer
+            self._refresh_timer_expires = expires
+            timer.start()
+
+    def _background_refresh(self) -> None:
+        try:
+            self._refresh_access_token_sync()
+        except Exception:
+            LOGGER.warning("Background access token refresh failed", exc_info=True)
+            # Try again later; requests will still refresh the token themselves
+            # if it expires in the meantime
+            self._schedule_refresh(ACCESS_TOKEN_REFRESH_MARGIN / 2)
+        else:
+            self._refresh_timer_expires = None
+            self._schedule_refresh()
+
     def _get_access_token(self, async_req: bool = False) -> Union[str, Awaitable[str]]:
         if async_req:
             return self._get_access_token_async()
@@ -810,6 +1468,8 @@ class Instance:
 
         session = self.initiate_auth(scope)
 
+        from lmk.jupyter.utils import is_jupyter, run_javascript
+
         if auth_mode is None and is_jupyter():
             auth_mode = "jupyter"
 
@@ -886,6 +1546,12 @@ class Instance:
         ] = None,
         notify: bool = True,
         async_req: bool = False,
+        deferred: bool = False,
+        durable: bool = False,
+        idempotency_key: Optional[str] = None,
+        dedupe: bool = True,
+        aggregate: bool = True,
+        job: Optional[str] = None,
     ) -> EventResponse:
         """
         Send a notification to one of your configured notification channels.
@@ -925,35 +1591,362 @@ class Instance:
         :param async_req: ``True`` if you want to send the request asynchronously, in which case this
         method will return a coroutine. Defaults to ``False``.
         :type async_req: bool, optional
+        :param deferred: ``True`` if you want to queue the notification and send it from a background
+        thread (see ``NotificationSender``), in which case this method returns immediately with a future
+        that resolves to the event object. If ``async_req`` is also ``True``, the future is awaitable.
+        Defaults to ``False``.
+        :type deferred: bool, optional
+        :param durable: ``True`` if you want the notification to be saved in the outbox (see ``Outbox``)
+        before it's sent. If it can't be delivered because of a connection error or server error, it will
+        be retried in the background by ``drain_outbox()`` and this method raises ``DeliveryDeferred``. This can't be
+        combined with ``deferred``. Defaults to ``False``.
+        :type durable: bool, optional
+        :param idempotency_key: A key sent in the ``Idempotency-Key`` header, so that retries of the same
+        request are only delivered once. Durable notifications use the outbox entry key. Defaults to ``None``,
+        in which case a new key is generated for each call
+        :type idempotency_key: str, optional
+        :param dedupe: If ``deduplicator`` is set (see ``Deduplicator``), ``False`` sends this notification
+        even if it's a duplicate. Suppressed duplicates return ``None`` rather than an event. Defaults to ``True``
+        :type dedupe: bool, optional
+        :param aggregate: If ``aggregator`` is set (see ``lmk.enable_aggregation()``), ``False`` sends this
+        notification directly rather than in the job's summary. Aggregated notifications return ``None``
+        rather than an event. Defaults to ``True``
+        :type aggregate: bool, optional
+        :param job: The job name the notification is recorded under in ``ledger`` (see ``EventLedger``).
+        Defaults to the name of the enclosing ``lmk.monitor()``, ``LMK_JOB_NAME`` or the script's name
+        :type job: str, optional
 
         :return: The event object corresponding to the sent notification
         :rtype: EventResponse
         """
-        api = EventApi(self.client)
-        kws = {}
+        if durable and deferred:
+            raise ValueError("durable and deferred can't both be True")
+
+        channel_ids = None
+        if notification_channels is not None:
+            channel_ids = [
+                channel.notification_channel_id
+                if isinstance(channel, NotificationChannelResponse)
+                else channel
+                for channel in notification_channels
+            ]
+
+        if job is None:
+            # Resolved here, since deferred notifications are sent from another thread
+            job = default_job_name()
+
+        # Durable notifications are saved in the outbox rather than aggregated, since the
+        # leader only holds aggregated ones in memory
+        if aggregate and self.aggregator is not None and not durable:
+            self.aggregator.submit(message, content_type, channel_ids, notify, job)
+            return self._suppressed_result(async_req, deferred)
+
+        if dedupe and self.deduplicator is not None:
+            if async_req:
+                # Checking waits on the deduplicator's database lock, so it's done off
+                # the event loop before sending the notification as usual
+                async def check_and_send() -> Any:
+                    sent = await asyncio.get_running_loop().run_in_executor(
+                        None,
+                        self._check_duplicate,
+                        message,
+                        content_type,
+                        channel_ids,
+                        notify,
+                    )
+                    if not sent:
+                        return await self._suppressed_result(True, deferred)
+                    return await cast(
+                        Awaitable[Any],
+                        self.notify(
+                            message,
+                            content_type=content_type,
+                            notification_channels=channel_ids,  # type: ignore
+                            notify=notify,
+                            async_req=True,
+                            deferred=deferred,
+                            durable=durable,
+                            idempotency_key=idempotency_key,
+                            dedupe=False,
+                            aggregate=False,
+                            job=job,
+                        ),
+                    )
+
+                return check_and_send()  # type: ignore
+
+            if not self._check_duplicate(message, content_type, channel_ids, notify):
+                return self._suppressed_result(async_req, deferred)
+
+        if durable:
+            return self._send_durable(
+                "event",
+                {
+                    "message": message,
+                    "content_type": content_type,
+                    "notification_channels": channel_ids,
+                    "notify": notify,
+                    "job": job,
+                },
+                async_req,
+            )
+
+        if deferred:
+            future = self.sender.submit(
+                self,
+                message=message,
+                content_type=content_type,
+                notification_channels=channel_ids,
+                notify=notify,
+                job=job,
+            )
+            if async_req:
+                return asyncio.wrap_future(future)  # type: ignore
+            return future  # type: ignore
+
+        if content_type not in EVENT_CONTENT_TYPES:
+            raise ValueError(
+                f"content_type must be one of {EVENT_CONTENT_TYPES}, got {content_type!r}"
+            )
+
+        # The body is built directly rather than through EventRequest, since
+        # validating and serializing models dominates the client-side cost of
+        # sending a notification (see scripts/bench_fast_path.py)
+        body: Dict[str, Any] = {"message": message, "contentType": content_type}
         if notify:
-            notify_kws = {}
-            if notification_channels is not None:
-                channels = []
-                for channel in notification_channels:
-                    if isinstance(channel, NotificationChannelResponse):
-                        channel = channel.notification_channel_id
-                    channels.append(channel)
-                notify_kws["channel_ids"] = channels
+            notification_config: Dict[str, Any] = {"notify": True}
+            if channel_ids is not None:
+                notification_config["channelIds"] = channel_ids
             elif self.default_channel:
-                notify_kws["channel_ids"] = [self.default_channel]
-            kws["notification_config"] = EventNotificationConfiguration(
-                notify=True, **notify_kws
+                notification_config["channelIds"] = [self.default_channel]
+            body["notificationConfig"] = notification_config
+
+        if idempotency_key is None:
+            # The request is retried after timeouts and server errors, which may happen
+            # after the event was created, so retries must not create it again
+            idempotency_key = uuid.uuid4().hex
+
+        start_time = time.time()
+        started = time.perf_counter()
+
+        def handle_success(response: EventResponse) -> Any:
+            return pipeline(async_req)(
+                lambda _: self._record_event(
+                    body,
+                    job,
+                    started,
+                    start_time,
+                    response=response,
+                    async_req=async_req,
+                ),
+                lambda _: response,
             )
 
-        return pipeline(async_req)(
-            lambda _: self._get_access_token(async_req),
-            lambda access_token: api.post_event(
-                EventRequest(message=message, contentType=content_type, **kws),  # type: ignore
-                async_req=async_req,
-                _headers={"Authorization": f"Bearer {access_token}"},
+        def reraise(error: Exception) -> Any:
+            raise error
+
+        def handle_error_value(error: Exception):
+            return pipeline(async_req)(
+                lambda _: self._record_event(
+                    body, job, started, start_time, error=error, async_req=async_req
+                ),
+                lambda _: reraise(error),
+            )
+
+        return handle_error(async_req)(
+            lambda: pipeline(async_req)(
+                lambda _: self._get_access_token(async_req),
+                lambda access_token: self.client.call_json(
+                    "POST",
+                    "/v1/event",
+                    body,
+                    self._auth_headers(access_token, idempotency_key),
+                    {"201": "EventResponse"},
+                    async_req=async_req,
+                ),
+                handle_success,
             ),
+            Exception,
+            handle_error_value,
+        )
+
+    def _check_duplicate(
+        self,
+        message: str,
+        content_type: str,
+        channel_ids: Optional[List[str]],
+        notify: bool,
+    ) -> bool:
+        deduplicator = self.deduplicator
+        if deduplicator is None:
+            return True
+        sent = deduplicator.check(
+            message,
+            {
+                "content_type": content_type,
+                "notification_channels": channel_ids,
+                "notify": notify,
+            },
+        )
+        if not sent or deduplicator.digest_due():
+            self._schedule_digest()
+        return sent
+
+    def _suppressed_result(self, async_req: bool, deferred: bool) -> Any:
+        if deferred:
+            future: concurrent.futures.Future = concurrent.futures.Future()
+            future.set_result(None)
+            return asyncio.wrap_future(future) if async_req else future
+        if async_req:
+
+            async def suppressed() -> None:
+                return None
+
+            return suppressed()
+        return None
+
+    def _schedule_digest(self) -> None:
+        deduplicator = self.deduplicator
+        if deduplicator is None:
+            return
+        with self._digest_lock:
+            if self._digest_timer is not None:
+                return
+            timer = threading.Timer(deduplicator.next_digest_in(), self._run_digest)
+            timer.daemon = True
+            timer.start()
+            self._digest_timer = timer
+
+    def _run_digest(self) -> None:
+        with self._digest_lock:
+            self._digest_timer = None
+        try:
+            self.send_digest()
+        except Exception:
+            LOGGER.exception("Error sending notification digest")
+
+    def send_digest(self, force: bool = False) -> int:
+        """
+        Send a digest of the notifications suppressed by ``deduplicator`` since the last
+        digest, one notification per content type and set of channels. This is called
+        in the background when a digest is due, so you only need to call it to send a
+        digest right away.
+
+        :param force: ``True`` to send a digest even if one isn't due yet. Defaults to ``False``
+        :type force: bool, optional
+
+        :return: The number of distinct suppressed notifications in the digest
+        :rtype: int
+        """
+        if self.deduplicator is None:
+            return 0
+
+        entries = self.deduplicator.take_digest(force)
+        groups: Dict[str, List[DigestEntry]] = {}
+        for entry in entries:
+            key = json.dumps(entry.target, sort_keys=True)
+            groups.setdefault(key, []).append(entry)
+
+        for group in groups.values():
+            target = group[0].target
+            try:
+                self.notify(
+                    format_digest(group, target["content_type"]),
+                    content_type=target["content_type"],
+                    notification_channels=target["notification_channels"],
+                    notify=target["notify"],
+                    dedupe=False,
+                )
+            except Exception:
+                LOGGER.warning(
+                    "Unable to send digest of %d suppressed notifications",
+                    sum(entry.count for entry in group),
+                    exc_info=True,
+                )
+
+        return len(entries)
+
+    def notify_many(
+        self,
+        items: Iterable[Union[str, Dict[str, Any]]],
+        concurrency: int = 8,
+        async_req: bool = False,
+    ) -> List[Union[EventResponse, Exception]]:
+        """
+        Send many notifications at once, with up to ``concurrency`` requests in flight. Rate
+        limiting and retries (including backing off for the ``Retry-After`` of 429 responses)
+        apply to each request as they do for ``notify()``. A failure only affects its own
+        item: rather than raising, the exception is returned in its place.
+
+        **Note:** This method requires you to be [logged in](#login) to LMK.
+
+        <details><summary>Usage Example</summary>
+        <p>
+
+        ```python
+        import lmk
+
+        results = lmk.notify_many(
+            [
+                {"message": f"Job {job.name} finished", "notification_channels": [job.channel_id]}
+                for job in jobs
+            ],
+            concurrency=10,
         )
+        failed = [result for result in results if isinstance(result, Exception)]
+        ```
+
+        </p>
+        </details>
+
+        :param items: The notifications to send. Each item is either a message, or a dictionary of
+        keyword arguments for ``notify()``
+        :type items: Iterable[str | Dict[str, Any]]
+        :param concurrency: The maximum number of requests in flight at once. Defaults to 8
+        :type concurrency: int, optional
+        :param async_req: ``True`` if you want to send the requests asynchronously, in which case this
+        method will return a coroutine. Defaults to ``False``.
+        :type async_req: bool, optional
+
+        :return: The event object or the exception for each item, in the same order as ``items``
+        :rtype: List[EventResponse | Exception]
+        """
+        kwargs_list = [
+            {"message": item} if isinstance(item, str) else dict(item) for item in items
+        ]
+        if concurrency < 1:
+            raise ValueError(f"concurrency must be at least 1, got {concurrency}")
+
+        if not async_req:
+            results: List[Union[EventResponse, Exception]] = []
+            if not kwargs_list:
+                return results
+
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(concurrency, len(kwargs_list)),
+                thread_name_prefix="lmk-notify-many",
+            ) as executor:
+                futures = [
+                    executor.submit(self.notify, **kwargs) for kwargs in kwargs_list
+                ]
+                for future in futures:
+                    error = future.exception()
+                    results.append(future.result() if error is None else error)  # type: ignore
+            return results
+
+        async def send_all() -> List[Union[EventResponse, Exception]]:
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def send(kwargs: Dict[str, Any]) -> Union[EventResponse, Exception]:
+                async with semaphore:
+                    try:
+                        return await self.notify(**kwargs, async_req=True)  # type: ignore
+                    except Exception as err:
+                        return err
+
+            return list(await asyncio.gather(*[send(kwargs) for kwargs in kwargs_list]))
+
+        return send_all()  # type: ignore
 
     def create_session(
         self,
@@ -962,6 +1955,7 @@ class Instance:
             Union[Dict[str, Any], ProcessSessionState, JupyterSessionState]
         ] = None,
         async_req: bool = False,
+        idempotency_key: Optional[str] = None,
     ) -> SessionResponse:
         """
         Create an interactive session, which you can use to remotely monitor a process
@@ -979,26 +1973,35 @@ class Instance:
         :param async_req: ``True`` if you want to send the request asynchronously, in which case this
         method will return a coroutine. Defaults to ``False``.
         :type async_req: bool, optional
+        :param idempotency_key: A key sent in the ``Idempotency-Key`` header, so that retries of the same
+        request only create one session. Defaults to ``None``, in which case a new key is generated for each call
+        :type idempotency_key: str, optional
 
         :return: The session object corresponding to the created session.
         :rtype: SessionResponse
         """
-        api = SessionApi(self.client)
-
-        if isinstance(state, dict):
-            typed_state = CreateSessionRequestState.from_dict(state)
+        if state is None:
+            state_dict: Dict[str, Any] = {}
+        elif isinstance(state, dict):
+            # Matches the models' to_dict(), which leaves out unset fields
+            state_dict = {
+                key: value for key, value in state.items() if value is not None
+            }
         else:
-            typed_state = CreateSessionRequestState(actual_instance=state)  # type: ignore
+            state_dict = state.to_dict()
+
+        if idempotency_key is None:
+            idempotency_key = uuid.uuid4().hex
 
         return pipeline(async_req)(
             lambda _: self._get_access_token(async_req),
-            lambda access_token: api.create_session(
-                CreateSessionRequest(
-                    name=name,
-                    state=typed_state,
-                ),
+            lambda access_token: self.client.call_json(
+                "POST",
+                "/v1/session",
+                {"name": name, "state": state_dict},
+                self._auth_headers(access_token, idempotency_key),
+                {"201": "SessionResponse"},
                 async_req=async_req,
-                _headers={"Authorization": f"Bearer {access_token}"},
             ),
         )
 
@@ -1006,6 +2009,8 @@ class Instance:
         self,
         session_id: str,
         async_req: bool = False,
+        durable: bool = False,
+        idempotency_key: Optional[str] = None,
     ) -> None:
         """
         End an interactive session. After the session has been ended, its state cannot
@@ -1017,65 +2022,90 @@ class Instance:
         :param async_req: ``True`` if you want to send the request asynchronously, in which case this
         method will return a coroutine. Defaults to ``False``.
         :type async_req: bool, optional
+        :param durable: ``True`` if you want the request to be saved in the outbox before it's sent,
+        so it's retried later if it can't be delivered. See ``notify()``. Defaults to ``False``.
+        :type durable: bool, optional
+        :param idempotency_key: A key sent in the ``Idempotency-Key`` header. Defaults to ``None``
+        :type idempotency_key: str, optional
 
         :return: This method does not return anything
         :rtype: None
         """
+        if durable:
+            return self._send_durable(
+                "end_session", {"session_id": session_id}, async_req
+            )
+
         api = SessionApi(self.client)
 
         return pipeline(async_req)(
             lambda _: self._get_access_token(async_req),
             lambda access_token: api.end_session(
-                session_id, _headers={"Authorization": f"Bearer {access_token}"}
+                session_id,
+                async_req=async_req,
+                _headers=self._auth_headers(access_token, idempotency_key),
             ),
         )
 
     @contextlib.asynccontextmanager
     async def session_connect(
-        self, session_id: str, read_only: bool = True
-    ) -> AsyncGenerator[WebSocket, None]:
+        self,
+        session_id: str,
+        read_only: bool = True,
+        reconnect_deadline: Optional[float] = 24 * 3600,
+    ) -> AsyncGenerator["WebSocket", None]:
         """
         Connect via a web socket to an interactive session. This allows you to send state
         updates to the session via a web socket, and receive remote state updates initiated
         through the LMK web app or API calls from other clients.
 
+        If the connection drops, it's re-established with a fresh access token and jittered
+        backoff. Messages that hadn't been written yet are sent after reconnecting; ones
+        that were written but lost aren't, so send the full state again on
+        ``ws_connected`` (``StateChannel`` does this) if the server needs it.
+
         :param session_id: the ID of a previously created session that has not been ended
         yet.
         :type session_id: str
         :param read_only: Indicate whether to connect in "read only" mode. This means that
         updates cannot be sent via the web socket, only received. Defaults to ``True``
         :type read_only: bool, optional
+        :param reconnect_deadline: How long in seconds to keep trying to reconnect
+        during an outage before giving up, or ``None`` to keep trying indefinitely.
+        Defaults to one day.
+        :type reconnect_deadline: float, optional
 
         :return: An asynchronous context manager yielding a ``WebSocket`` object
         :rtype: AsyncContextManager[WebSocket]
         """
-        access_token = await self._get_access_token_async()
-
-        url = self.client.configuration.host + f"/v1/session/ws?token={access_token}"
+        from lmk.utils.ws import WebSocket, is_permanent_ws_error
 
-        loop = asyncio.get_running_loop()
-
-        async def on_connect(ws: WebSocket):
-            LOGGER.debug("Session websocket connected for %s", session_id)
-            await ws.send(
-                {
-                    "event": "connect",
-                    "data": {"sessionId": session_id, "readOnly": read_only},
-                }
+        async def get_url() -> str:
+            access_token = await self._get_access_token_async()
+            return (
+                self.client.configuration.host + f"/v1/session/ws?token={access_token}"
             )
-            LOGGER.debug("Sent connected message for %s", session_id)
-
-        on_connect_cb = async_callback(on_connect, loop=loop)
 
-        async with aiohttp.ClientSession(conn_timeout=10) as session:
-            async with WebSocket(session, url, timeout=0.5, heartbeat=1) as ws:
-                await on_connect(ws)
-
-                ws_connected.connect(on_connect_cb, ws)
-                try:
-                    yield ws
-                finally:
-                    ws_connected.disconnect(on_connect_cb, ws)
+        def handshake() -> Dict[str, Any]:
+            LOGGER.debug("Session websocket connected for %s", session_id)
+            return {
+                "event": "connect",
+                "data": {"sessionId": session_id, "readOnly": read_only},
+            }
+
+        # Share the keep-alive session used by the API client's async transport
+        session = self.client.transport.session()
+        async with WebSocket(
+            session,
+            get_url,
+            retry_rule=deadline_retry_rule(
+                reconnect_deadline, is_permanent=is_permanent_ws_error
+            ),
+            handshake=handshake,
+            timeout=0.5,
+            heartbeat=1,
+        ) as ws:
+            yield ws
 
 
 DEFAULT_INSTANCE = None
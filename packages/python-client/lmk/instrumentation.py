@@ -0,0 +1,176 @@
+import bisect
+import contextvars
+import re
+import threading
+from array import array
+from typing import Any, Dict, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from blinker import signal
+
+
+api_request_recorded = signal("api-request-recorded")
+
+# Upper bounds of the latency histogram buckets, in seconds. There's an extra bucket
+# for anything slower than the last one.
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+OPERATIONS = [
+    (method, re.compile(pattern), name)
+    for method, pattern, name in [
+        ("GET", r"/v1/app/current$", "get_current_app"),
+        ("POST", r"/v1/event$", "post_event"),
+        ("POST", r"/v1/headlessAuth$", "create_headless_auth_session"),
+        ("POST", r"/v1/headlessAuth/refresh$", "refresh_headless_auth_token"),
+        (
+            "GET",
+            r"/v1/headlessAuth/[^/]+/token$",
+            "retrieve_headless_auth_session_token",
+        ),
+        ("GET", r"/v1/headlessAuth/[^/]+$", "get_headless_auth_session"),
+        ("GET", r"/v1/notificationChannel$", "list_notification_channels"),
+        ("POST", r"/v1/session$", "create_session"),
+        ("POST", r"/v1/session/[^/]+/end$", "end_session"),
+        ("POST", r"/v1/session/[^/]+/action$", "session_action"),
+        ("GET", r"/v1/session/[^/]+$", "get_session"),
+        ("PATCH", r"/v1/session/[^/]+$", "update_session"),
+    ]
+]
+
+# The operation of the request being sent in the current thread or task, so that
+# retries can be attributed to it
+current_operation: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar(
+    "lmk_current_operation", default=None
+)
+
+
+def operation_name(method: str, url: str) -> str:
+    """
+    The name of the API operation for a request, matching the method names of the
+    generated API classes (e.g. ``post_event``), or ``other`` for unknown endpoints
+    """
+    path = urlsplit(url).path
+    method = method.upper()
+    for operation_method, pattern, name in OPERATIONS:
+        if method == operation_method and pattern.search(path):
+            return name
+    return "other"
+
+
+class OperationStats:
+    """
+    Counters and a fixed-bucket latency histogram for one API operation
+    """
+
+    __slots__ = ("count", "errors", "retries", "total_time", "max_time", "buckets")
+
+    def __init__(self, num_buckets: int) -> None:
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.buckets = array("Q", [0]) * num_buckets
+
+    def to_dict(self, bounds: Sequence[float]) -> Dict[str, Any]:
+        labels = [str(bound) for bound in bounds] + ["+Inf"]
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "retries": self.retries,
+            "total_time": self.total_time,
+            "max_time": self.max_time,
+            "latency_buckets": dict(zip(labels, self.buckets)),
+        }
+
+
+class ClientStats:
+    """
+    Request statistics for an ``ApiClient``: for each API operation, the number of
+    requests, errors and retries, and a histogram of latencies. A request's latency
+    covers all of its attempts, including backoff and rate limiting delays.
+
+    Each recorded request is also sent with the ``api_request_recorded`` signal, so that
+    it can be exported to a metrics system.
+
+    <details><summary>Usage Example</summary>
+    <p>
+
+    ```python
+    import lmk
+    from lmk.instrumentation import api_request_recorded
+
+    @api_request_recorded.connect
+    def export(stats, operation, duration, error):
+        metrics.timing(f"lmk.{operation}", duration, tags={"ok": error is None})
+
+    lmk.notify("Hello, world!")
+    print(lmk.stats()["post_event"])
+    ```
+    </p>
+    </details>
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.bounds = tuple(buckets)
+        self._lock = threading.Lock()
+        self._operations: Dict[str, OperationStats] = {}
+
+    def _get(self, operation: str) -> OperationStats:
+        stats = self._operations.get(operation)
+        if stats is None:
+            stats = self._operations[operation] = OperationStats(len(self.bounds) + 1)
+        return stats
+
+    def record(
+        self, operation: str, duration: float, error: Optional[Exception] = None
+    ) -> None:
+        index = bisect.bisect_left(self.bounds, duration)
+        with self._lock:
+            stats = self._get(operation)
+            stats.count += 1
+            if error is not None:
+                stats.errors += 1
+            stats.total_time += duration
+            if duration > stats.max_time:
+                stats.max_time = duration
+            stats.buckets[index] += 1
+
+        if api_request_recorded.receivers:
+            api_request_recorded.send(
+                self, operation=operation, duration=duration, error=error
+            )
+
+    def record_retry(self, operation: Optional[str]) -> None:
+        with self._lock:
+            self._get(operation or "other").retries += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        The current statistics for each operation. ``latency_buckets`` maps the upper
+        bound of each bucket, in seconds, to the number of requests in it (buckets aren't
+        cumulative).
+
+        :rtype: Dict[str, Dict[str, Any]]
+        """
+        with self._lock:
+            return {
+                operation: stats.to_dict(self.bounds)
+                for operation, stats in self._operations.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._operations.clear()
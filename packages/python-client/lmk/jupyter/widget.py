@@ -48,7 +48,7 @@ from lmk.jupyter.utils import background_ctx
 from lmk.utils.asyncio import loop_ctx, asyncio_event, asyncio_lock, asyncio_queue
 from lmk.utils.blinker import wait_for_signal
 from lmk.utils.logging import setup_logging
-from lmk.utils.ws import WebSocket
+from lmk.utils.ws import StateChannel, WebSocket
 
 
 LOGGER = logging.getLogger(__name__)
@@ -572,9 +572,7 @@ class LMKWidgetThread(threading.Thread):
 
             self.widget.channels_state = instance.channels.fetch_state
             if instance.channels.fetch_state == ChannelsState.Loaded:
-                self.widget.channels = [
-                    channel.to_dict() for channel in instance.channels
-                ]
+                self.widget.channels = instance.channels.to_dicts()
             else:
                 self.widget.channels = []
 
@@ -642,7 +640,7 @@ class LMKWidgetThread(threading.Thread):
             with background_ctx(LOGGER, type(self).__name__):
                 self.widget.channels_state = new_value
                 if new_value == ChannelsState.Loaded:
-                    self.widget.channels = [channel.to_dict() for channel in sender]
+                    self.widget.channels = sender.to_dicts()
 
         def unbind():
             nonlocal disconnected
@@ -726,9 +724,15 @@ class LMKWidgetThread(threading.Thread):
         def end_session():
             if session is None:
                 return
-            instance.end_session(session.session_id)
+            try:
+                instance.end_session(session.session_id, durable=True)
+            except exc.DeliveryDeferred:
+                LOGGER.info("Session end saved in the outbox to be retried")
 
         async def sender(ws: WebSocket):
+            # Only changed fields are sent, so e.g. a large cell's text isn't resent
+            # every time the kernel state changes
+            channel = StateChannel(ws)
             while True:
                 await queue.get()
                 message_count = 1
@@ -760,9 +764,9 @@ class LMKWidgetThread(threading.Thread):
                     "notifyOn": self.widget.monitoring_state,
                     "notifyChannel": self.widget.selected_channel,
                 }
-                LOGGER.debug("Sending ws message: %s", message)
-                await ws.send(message)
-                LOGGER.debug("Sent ws message")
+                LOGGER.debug("Sending ws state: %s", message)
+                if await channel.update(message):
+                    LOGGER.debug("Sent ws message")
 
                 for _ in range(message_count):
                     queue.task_done()
@@ -819,6 +823,12 @@ class LMKWidgetThread(threading.Thread):
                             await queue.put(info)
                             return
 
+                        if instance.client.circuit_breaker.is_open:
+                            LOGGER.info(
+                                "Not creating session because the API is unavailable"
+                            )
+                            return
+
                         session = await instance.create_session(
                             self.widget.notebook_name,
                             state=JupyterSessionState(
@@ -0,0 +1,340 @@
+import contextvars
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple, cast
+
+
+LOGGER = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL NOT NULL,
+    status TEXT NOT NULL,
+    latency REAL NOT NULL,
+    job TEXT,
+    event_id TEXT,
+    content_type TEXT NOT NULL,
+    message TEXT NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS events_created ON events (created);
+CREATE INDEX IF NOT EXISTS events_job_created ON events (job, created);
+CREATE TABLE IF NOT EXISTS event_channels (
+    channel TEXT NOT NULL,
+    event INTEGER NOT NULL REFERENCES events (id) ON DELETE CASCADE,
+    PRIMARY KEY (channel, event)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS event_channels_event ON event_channels (event);
+"""
+
+# Channel recorded for notifications sent to the account's default channel when its ID
+# isn't known locally
+DEFAULT_CHANNEL = "default"
+
+# Only the start of each message is kept; the full event is in the web app
+MAX_MESSAGE_LENGTH = 1000
+
+# Job name for notifications sent while this is set, e.g. by lmk.monitor()
+current_job: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar(
+    "lmk_current_job", default=None
+)
+
+
+def default_job_name() -> Optional[str]:
+    """
+    Job name recorded for notifications sent without one: the name of the enclosing
+    ``lmk.monitor()``, ``LMK_JOB_NAME`` (set for commands started with ``lmk run``), or
+    the name of the script that's running
+    """
+    job = current_job.get()
+    if job is not None:
+        return job
+    job = os.getenv("LMK_JOB_NAME")
+    if job:
+        return job
+    if sys.argv and sys.argv[0] and sys.argv[0] != "-c":
+        return os.path.basename(sys.argv[0])
+    return None
+
+
+@dataclass
+class EventRecord:
+    """
+    A notification recorded in the ``EventLedger``. ``created`` is when the request was
+    started and ``latency`` is how long it took, in seconds; ``status`` is ``sent`` or
+    ``failed``.
+    """
+
+    id: int
+    created: float
+    status: str
+    latency: float
+    job: Optional[str]
+    channels: List[str]
+    event_id: Optional[str]
+    content_type: str
+    message: str
+    error: Optional[str]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "created": self.created,
+            "status": self.status,
+            "latency": self.latency,
+            "job": self.job,
+            "channels": self.channels,
+            "eventId": self.event_id,
+            "contentType": self.content_type,
+            "message": self.message,
+            "error": self.error,
+        }
+
+
+class EventLedger:
+    """
+    Local record of the notifications sent by ``Instance.notify()``, so that questions
+    like "did this job notify, and when?" can be answered without the web app, e.g. with
+    ``lmk events``. Each request to the API is recorded with its job, channels, latency
+    and whether it succeeded.
+
+    Records are kept in a SQLite database next to the config file
+    (``~/.lmk/events.db`` by default) and removed after ``max_age`` seconds.
+
+    <details><summary>Usage Example</summary>
+    <p>
+
+    ```python
+    import time
+    import lmk
+
+    lmk.notify("Training finished")
+
+    day_ago = time.time() - 24 * 3600
+    for record in lmk.get_instance().ledger.iter_events(since=day_ago, status="failed"):
+        print(record.created, record.job, record.error)
+    ```
+    </p>
+    </details>
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_age: float = 90 * 24 * 3600.0,
+    ) -> None:
+        if path is None:
+            path = os.path.expanduser("~/.lmk/events.db")
+        self.path = path
+        self.max_age = max_age
+        self._local = threading.local()
+        # Expired records are removed at most this often
+        self._prune_interval = 3600.0
+        self._next_prune = 0.0
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            dirname = os.path.dirname(self.path)
+            if dirname and not os.path.exists(dirname):
+                os.makedirs(dirname, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Losing the last few records on power loss is fine; an fsync per
+            # notification isn't
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def record(
+        self,
+        message: str,
+        content_type: str,
+        channels: List[str],
+        created: float,
+        latency: float,
+        event_id: Optional[str] = None,
+        job: Optional[str] = None,
+        error: Optional[BaseException] = None,
+    ) -> int:
+        """
+        Record a request to send a notification.
+
+        :param message: The notification message; only the first ``MAX_MESSAGE_LENGTH``
+        characters are kept
+        :type message: str
+        :param content_type: The content type of the message
+        :type content_type: str
+        :param channels: The IDs of the channels the notification was sent to, or
+        ``DEFAULT_CHANNEL``
+        :type channels: List[str]
+        :param created: When the request was started, as a UNIX timestamp
+        :type created: float
+        :param latency: How long the request took, in seconds
+        :type latency: float
+        :param event_id: The ID of the event, if it was sent
+        :type event_id: str, optional
+        :param job: The name of the job that sent the notification
+        :type job: str, optional
+        :param error: The error, if the request failed
+        :type error: BaseException, optional
+
+        :return: The ID of the record
+        :rtype: int
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(
+                "INSERT INTO events (created, status, latency, job, event_id, "
+                "content_type, message, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    created,
+                    "sent" if error is None else "failed",
+                    latency,
+                    job,
+                    event_id,
+                    content_type,
+                    message[:MAX_MESSAGE_LENGTH],
+                    None if error is None else f"{type(error).__name__}: {error}",
+                ),
+            )
+            record_id = cast(int, cursor.lastrowid)
+            conn.executemany(
+                "INSERT OR IGNORE INTO event_channels (channel, event) VALUES (?, ?)",
+                [(channel, record_id) for channel in channels],
+            )
+            if created >= self._next_prune:
+                conn.execute(
+                    "DELETE FROM events WHERE created < ?", (created - self.max_age,)
+                )
+                self._next_prune = created + self._prune_interval
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+        return record_id
+
+    def query(
+        self,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        job: Optional[str] = None,
+        channel: Optional[str] = None,
+        status: Optional[str] = None,
+        before: Optional[int] = None,
+        limit: int = 100,
+    ) -> List[EventRecord]:
+        """
+        Get a page of recorded notifications, most recently recorded first. To get the next page, pass
+        the ``id`` of the last record as ``before``.
+
+        :param since: Only include notifications sent at or after this UNIX timestamp
+        :type since: float, optional
+        :param until: Only include notifications sent before this UNIX timestamp
+        :type until: float, optional
+        :param job: Only include notifications sent by this job
+        :type job: str, optional
+        :param channel: Only include notifications sent to this channel ID
+        :type channel: str, optional
+        :param status: Only include notifications with this status, ``sent`` or ``failed``
+        :type status: str, optional
+        :param before: Only include records with an ID lower than this
+        :type before: int, optional
+        :param limit: The maximum number of records to return. Defaults to 100
+        :type limit: int, optional
+
+        :return: The matching records
+        :rtype: List[EventRecord]
+        """
+        conditions: List[str] = []
+        params: List[Any] = []
+        if channel is not None:
+            # Start from the (channel, event) index rather than scanning all events
+            table = "event_channels AS c CROSS JOIN events AS e ON e.id = c.event"
+            conditions.append("c.channel = ?")
+            params.append(channel)
+        else:
+            table = "events AS e"
+        for condition, value in [
+            ("e.created >= ?", since),
+            ("e.created < ?", until),
+            ("e.job = ?", job),
+            ("e.status = ?", status),
+            ("e.id < ?", before),
+        ]:
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT e.id, e.created, e.status, e.latency, e.job, e.event_id, "
+            f"e.content_type, e.message, e.error FROM {table} {where} "
+            "ORDER BY e.id DESC LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+        channels = self._channels([row[0] for row in rows])
+        return [
+            EventRecord(
+                id=row[0],
+                created=row[1],
+                status=row[2],
+                latency=row[3],
+                job=row[4],
+                channels=channels.get(row[0], []),
+                event_id=row[5],
+                content_type=row[6],
+                message=row[7],
+                error=row[8],
+            )
+            for row in rows
+        ]
+
+    def _channels(self, ids: List[int]) -> Dict[int, List[str]]:
+        if not ids:
+            return {}
+        placeholders = ", ".join("?" * len(ids))
+        result: Dict[int, List[str]] = {}
+        rows: List[Tuple[int, str]] = (
+            self._connection()
+            .execute(
+                f"SELECT event, channel FROM event_channels WHERE event IN ({placeholders}) "
+                "ORDER BY event, channel",
+                ids,
+            )
+            .fetchall()
+        )
+        for event, channel in rows:
+            result.setdefault(event, []).append(channel)
+        return result
+
+    def iter_events(
+        self, page_size: int = 100, **filters: Any
+    ) -> Iterator[EventRecord]:
+        """
+        Iterate through recorded notifications, most recently recorded first, fetching ``page_size`` at a
+        time. ``filters`` are the same as for ``query()``.
+        """
+        before = filters.pop("before", None)
+        while True:
+            page = self.query(before=before, limit=page_size, **filters)
+            yield from page
+            if len(page) < page_size:
+                return
+            before = page[-1].id
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,257 @@
+import collections
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from typing import Any, Deque, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from lmk.instance import Instance
+
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_FORMAT = "%(levelname)s %(name)s: %(message)s"
+
+MAX_MESSAGE_LENGTH = 4000
+
+# Returned by _BatchingListener.dequeue() when no record arrives before the current
+# batch is due, so that the listener thread can send it
+_TICK = object()
+
+# Put on the queue to stop the listener thread
+_STOP = object()
+
+GroupKey = Tuple[str, int, str]
+
+
+class _Batch:
+    def __init__(self, started_at: float) -> None:
+        self.started_at = started_at
+        self.count = 0
+        self.groups: Dict[GroupKey, List[Any]] = {}
+        self.first_exc_record: Optional[logging.LogRecord] = None
+        self.dropped_groups = 0
+
+
+class _BatchingListener:
+    def __init__(self, handler: "LoggingHandler") -> None:
+        self.handler = handler
+        self.queue: "queue.Queue[Any]" = handler.queue  # type: ignore
+        self.batch: Optional[_Batch] = None
+        self.sent_at: Deque[float] = collections.deque()
+        self.thread = threading.Thread(
+            target=self._run, name="lmk-log-handler", daemon=True
+        )
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self, timeout: float) -> bool:
+        """
+        Stop the thread once it has sent the records already queued
+
+        :return: ``True`` if the thread stopped within ``timeout`` seconds
+        :rtype: bool
+        """
+        deadline = time.monotonic() + timeout
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self.thread.join(max(0.0, deadline - time.monotonic()))
+        return not self.thread.is_alive()
+
+    def _due_at(self) -> Optional[float]:
+        if self.batch is None:
+            return None
+        due_at = self.batch.started_at + self.handler.batch_window
+        if len(self.sent_at) >= self.handler.max_per_minute:
+            due_at = max(due_at, self.sent_at[0] + 60.0)
+        return due_at
+
+    def dequeue(self) -> Any:
+        due_at = self._due_at()
+        if due_at is None:
+            return self.queue.get()
+        timeout = due_at - time.monotonic()
+        if timeout <= 0:
+            return _TICK
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return _TICK
+
+    def _run(self) -> None:
+        while True:
+            record = self.dequeue()
+            if record is _STOP:
+                break
+            try:
+                self.handle(record)
+            except Exception:
+                # Keep the thread alive so later records are still sent
+                LOGGER.warning("Unable to handle log record", exc_info=True)
+        # Send whatever is left when stopped
+        self.send()
+
+    def handle(self, record: Any) -> None:
+        now = time.monotonic()
+        while self.sent_at and now - self.sent_at[0] >= 60.0:
+            self.sent_at.popleft()
+
+        if record is not _TICK:
+            self._add(record, now)
+
+        due_at = self._due_at()
+        if due_at is not None and now >= due_at:
+            self.send()
+
+    def _add(self, record: logging.LogRecord, now: float) -> None:
+        if self.batch is None:
+            self.batch = _Batch(now)
+        batch = self.batch
+        batch.count += 1
+        if batch.first_exc_record is None and record.exc_info:
+            batch.first_exc_record = record
+
+        # Records are grouped by the unformatted message, so that e.g. "Shard %d
+        # failed" is counted once for every shard. msg can be any object, so it's
+        # converted to a string to be hashable
+        key = (record.name, record.levelno, str(record.msg))
+        group = batch.groups.get(key)
+        if group is not None:
+            group[0] += 1
+        elif len(batch.groups) < self.handler.max_groups:
+            batch.groups[key] = [1, record]
+        else:
+            batch.dropped_groups += 1
+
+    def send(self) -> None:
+        batch, self.batch = self.batch, None
+        if batch is None:
+            return
+        self.sent_at.append(time.monotonic())
+        try:
+            self.handler.send_batch(batch)
+        except Exception:
+            LOGGER.warning("Unable to send log notification", exc_info=True)
+
+
+class LoggingHandler(logging.handlers.QueueHandler):
+    """
+    ``logging`` handler that sends log records (``ERROR`` and above by default) as LMK
+    notifications. Records are put on a bounded queue and sent from a listener thread,
+    so logging calls never wait on the network. Records logged within ``batch_window``
+    seconds of one another are grouped into a single notification with a count per
+    message and the first traceback, and at most ``max_per_minute`` notifications are
+    sent per minute; records over the cap are rolled into the next notification. When
+    the handler is closed (e.g. by ``logging.shutdown()`` at exit), pending records are
+    sent within ``flush_timeout`` seconds.
+
+    <details><summary>Usage Example</summary>
+    <p>
+
+    ```python
+    import logging
+    import lmk
+
+    logging.getLogger().addHandler(lmk.LoggingHandler())
+
+    try:
+        run_pipeline()
+    except Exception:
+        logging.exception("Pipeline failed")
+    ```
+    </p>
+    </details>
+    """
+
+    def __init__(
+        self,
+        level: int = logging.ERROR,
+        instance: Optional["Instance"] = None,
+        batch_window: float = 5.0,
+        max_per_minute: int = 6,
+        max_queue_size: int = 1000,
+        max_groups: int = 20,
+        flush_timeout: float = 5.0,
+        notification_channels: Optional[List[str]] = None,
+    ) -> None:
+        super().__init__(queue.Queue(max_queue_size))
+        self.setLevel(level)
+        self.setFormatter(logging.Formatter(DEFAULT_FORMAT))
+        self.instance = instance
+        self.batch_window = batch_window
+        self.max_per_minute = max_per_minute
+        self.max_groups = max_groups
+        self.flush_timeout = flush_timeout
+        self.notification_channels = notification_channels
+        self.dropped = 0
+        self.listener = _BatchingListener(self)
+        self.listener.start()
+        self._listener_ident = self.listener.thread.ident
+        self._stopped = False
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting (including tracebacks) happens on the listener thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        # Don't notify about errors that happen while sending notifications
+        if record.thread == self._listener_ident:
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def send_batch(self, batch: _Batch) -> None:
+        formatter = self.formatter or logging.Formatter(DEFAULT_FORMAT)
+        noun = "record" if batch.count == 1 else "records"
+        lines = [f"**{batch.count} log {noun}**", ""]
+        for count, record in batch.groups.values():
+            # Only the first traceback is included, below the summary
+            summary = logging.makeLogRecord(
+                {**record.__dict__, "exc_info": None, "exc_text": None}
+            )
+            message = formatter.format(summary).splitlines()[0]
+            lines.append(f"- {count}x {message}" if count > 1 else f"- {message}")
+        if batch.dropped_groups:
+            lines.append(f"- ...and {batch.dropped_groups} more")
+        if self.dropped:
+            lines.append("")
+            lines.append(
+                f"{self.dropped} records were dropped because the queue was full"
+            )
+            self.dropped = 0
+
+        message = "\n".join(lines)[: MAX_MESSAGE_LENGTH // 2]
+        if batch.first_exc_record is not None:
+            exc_info = batch.first_exc_record.exc_info
+            traceback = formatter.formatException(exc_info)  # type: ignore
+            # Keep the end of long tracebacks, which has the exception itself
+            remaining = MAX_MESSAGE_LENGTH - len(message)
+            message += f"\n\n```\n{traceback[-remaining:]}\n```"
+
+        instance = self.instance
+        if instance is None:
+            from lmk.instance import get_instance
+
+            instance = get_instance()
+        instance.notify(
+            message,
+            content_type="text/markdown",
+            notification_channels=self.notification_channels,  # type: ignore
+        )
+
+    def close(self) -> None:
+        if not self._stopped:
+            self._stopped = True
+            if not self.listener.stop(self.flush_timeout):
+                LOGGER.warning(
+                    "Timed out after %.2fs sending log notifications",
+                    self.flush_timeout,
+                )
+        super().close()
@@ -0,0 +1,143 @@
+import logging
+import math
+import threading
+from array import array
+from typing import Any, Dict, List, Optional
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class MetricSeries:
+    """
+    Values of a single metric, kept in fixed-size ``array('d')`` ring buffers so that
+    memory use doesn't grow over long runs. Only the last ``capacity`` points are kept;
+    points that are overwritten before they're sent are counted in ``dropped``.
+    """
+
+    def __init__(self, capacity: int = 10_000) -> None:
+        self.capacity = capacity
+        self.steps = array("d", bytes(8 * capacity))
+        self.values = array("d", bytes(8 * capacity))
+        # Total number of points ever logged; the next point goes at total % capacity
+        self.total = 0
+        # Value of total when points were last taken to be sent
+        self.sent = 0
+        self.dropped = 0
+
+    def append(self, value: float, step: Optional[float] = None) -> None:
+        index = self.total % self.capacity
+        self.steps[index] = self.total if step is None else step
+        self.values[index] = value
+        self.total += 1
+
+    def take(self, max_points: int) -> Optional[Dict[str, Any]]:
+        """
+        Take the points logged since the last call, downsampled to at most ``max_points``
+        buckets. Each bucket has the step and value of its last point and the minimum and
+        maximum values in it, so that spikes survive downsampling.
+
+        :return: The columns ``step``, ``min``, ``max`` and ``last``, plus the number of
+        points that were overwritten before they could be sent, or ``None`` if nothing
+        was logged
+        :rtype: Dict[str, Any], optional
+        """
+        total = self.total
+        start = self.sent
+        if total == start:
+            return None
+        if total - start > self.capacity:
+            self.dropped += total - start - self.capacity
+            start = total - self.capacity
+        self.sent = total
+
+        count = total - start
+        size = -(-count // max_points)
+        steps: List[Any] = []
+        mins: List[Any] = []
+        maxs: List[Any] = []
+        lasts: List[Any] = []
+        capacity = self.capacity
+        for bucket_start in range(start, total, size):
+            low = math.inf
+            high = -math.inf
+            index = 0
+            for position in range(bucket_start, min(bucket_start + size, total)):
+                index = position % capacity
+                value = self.values[index]
+                # NaN comparisons are always false, so NaNs are left out of min/max
+                if value < low:
+                    low = value
+                if value > high:
+                    high = value
+            steps.append(_finite(self.steps[index]))
+            mins.append(_finite(low))
+            maxs.append(_finite(high))
+            lasts.append(_finite(self.values[index]))
+
+        result: Dict[str, Any] = {
+            "step": steps,
+            "min": mins,
+            "max": maxs,
+            "last": lasts,
+        }
+        if self.dropped:
+            result["dropped"] = self.dropped
+            self.dropped = 0
+        return result
+
+
+def _finite(value: float) -> Optional[float]:
+    # NaN and infinity can't be encoded as JSON
+    return value if math.isfinite(value) else None
+
+
+class MetricsBuffer:
+    """
+    Buffers metrics logged with ``lmk.log_metric()`` until they're sent to the session by
+    the ``ProgressReporter``. At most ``max_series`` metrics are kept, each in a
+    ``MetricSeries`` of ``capacity`` points.
+    """
+
+    def __init__(self, capacity: int = 10_000, max_series: int = 1000) -> None:
+        self.capacity = capacity
+        self.max_series = max_series
+        self.series: Dict[str, MetricSeries] = {}
+        self._lock = threading.Lock()
+        self._warned = False
+
+    def log(self, name: str, value: float, step: Optional[float] = None) -> None:
+        with self._lock:
+            series = self.series.get(name)
+            if series is None:
+                if len(self.series) >= self.max_series:
+                    if not self._warned:
+                        LOGGER.warning(
+                            "Not logging metric %r; at most %d metrics are kept",
+                            name,
+                            self.max_series,
+                        )
+                        self._warned = True
+                    return
+                series = self.series[name] = MetricSeries(self.capacity)
+            series.append(value, step)
+
+    def pending(self) -> bool:
+        """
+        Check whether any points were logged since the last ``take()``
+        """
+        with self._lock:
+            return any(series.total != series.sent for series in self.series.values())
+
+    def take(self, max_points: int = 100) -> Dict[str, Dict[str, Any]]:
+        """
+        Take the points logged for each metric since the last call, downsampled to at
+        most ``max_points`` per metric (see ``MetricSeries.take()``)
+        """
+        with self._lock:
+            deltas = {}
+            for name, series in self.series.items():
+                delta = series.take(max_points)
+                if delta is not None:
+                    deltas[name] = delta
+            return deltas
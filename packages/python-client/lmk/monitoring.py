@@ -0,0 +1,488 @@
+import asyncio
+import atexit
+import contextlib
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+import traceback
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Optional,
+    Set,
+    TYPE_CHECKING,
+    cast,
+)
+
+from lmk.instance import get_instance
+from lmk.ledger import current_job
+from lmk.utils.asyncio import asyncio_event
+
+if TYPE_CHECKING:
+    from lmk.generated.models.session_response import SessionResponse
+    from lmk.instance import Instance
+    from lmk.utils.ws import WebSocket
+
+
+LOGGER = logging.getLogger(__name__)
+
+NOTIFY_ON_VALUES = {"error", "stop", "none"}
+
+MAX_TRACEBACK_LENGTH = 4000
+
+
+class _Run:
+    """
+    A single execution of a monitored block
+    """
+
+    def __init__(self, monitor: "Monitor", instance: "Instance") -> None:
+        self.monitor = monitor
+        self.instance = instance
+        self.started_at = time.monotonic()
+        self.exit_code: Optional[int] = None
+        # Notifications sent in the block are recorded under the monitor's name
+        self.job_token = current_job.set(monitor.name)
+        # Set by the runner thread once it starts a session for this run
+        self.done: Optional[asyncio.Event] = None
+        # Restores the monitor's previous run when a ``with`` block exits
+        self.run_token: Optional[contextvars.Token] = None
+
+
+class MonitorRunner:
+    """
+    Background thread shared by all monitored blocks. It checks running blocks every
+    ``poll_interval`` seconds, and creates a session for each one that has run for longer
+    than its ``session_after`` threshold, sending its exit code when it finishes. Blocks
+    that finish before their threshold never touch the network (unless a notification
+    is due). The thread stops after ``idle_timeout`` seconds without running blocks.
+    """
+
+    def __init__(
+        self,
+        poll_interval: float = 1.0,
+        idle_timeout: float = 30.0,
+        exit_timeout: float = 5.0,
+    ) -> None:
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.exit_timeout = exit_timeout
+        self.runs: Dict[int, _Run] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._sessions: Set[asyncio.Task] = set()
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def add(self, run: _Run) -> None:
+        with self._lock:
+            self.runs[id(run)] = run
+            if self.thread is None:
+                self._start()
+
+    def remove(self, run: _Run) -> None:
+        with self._lock:
+            self.runs.pop(id(run), None)
+            done = run.done
+        if done is not None:
+            self._call_soon(done.set)
+
+    def _start(self) -> None:
+        loop = asyncio.new_event_loop()
+        self._wakeup = asyncio_event(loop=loop)
+        self.loop = loop
+        self.thread = threading.Thread(
+            target=self._run, args=(loop,), name="lmk-monitor", daemon=True
+        )
+        self.thread.start()
+        atexit.unregister(self.close)
+        atexit.register(self.close)
+
+    def _call_soon(self, callback: Callable[[], Any]) -> None:
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            with contextlib.suppress(RuntimeError):
+                loop.call_soon_threadsafe(callback)
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait up to ``timeout`` seconds (defaults to ``exit_timeout``) for the sessions of
+        finished blocks to be ended, then stop the background thread.
+
+        :return: ``True`` if the thread stopped before the timeout
+        :rtype: bool
+        """
+        if timeout is None:
+            timeout = self.exit_timeout
+        self._closed = True
+        atexit.unregister(self.close)
+        if self._wakeup is not None:
+            self._call_soon(self._wakeup.set)
+        thread = self.thread
+        if thread is None or thread is threading.current_thread():
+            return True
+        thread.join(timeout)
+        if thread.is_alive():
+            LOGGER.warning("Timed out after %.2fs ending monitor sessions", timeout)
+            return False
+        return True
+
+    def _run(self, loop: asyncio.AbstractEventLoop) -> None:
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self._main())
+        except Exception:
+            LOGGER.exception("Error in monitor runner")
+        finally:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+    async def _main(self) -> None:
+        wakeup = self._wakeup
+        assert wakeup is not None
+
+        idle_since: Optional[float] = None
+        while True:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(wakeup.wait(), self.poll_interval)
+            wakeup.clear()
+
+            now = time.monotonic()
+            with self._lock:
+                for run in self.runs.values():
+                    if (
+                        run.done is None
+                        and now - run.started_at >= run.monitor.session_after
+                    ):
+                        # Under the lock, so remove() either sees this or the run
+                        # is already gone
+                        run.done = asyncio_event(loop=self.loop)
+                        task = asyncio.create_task(self._session(run))
+                        self._sessions.add(task)
+                        task.add_done_callback(self._sessions.discard)
+                running = bool(self.runs)
+
+            if self._closed:
+                break
+            if running or self._sessions:
+                idle_since = None
+            elif idle_since is None:
+                idle_since = now
+            elif now - idle_since >= self.idle_timeout:
+                with self._lock:
+                    if not self.runs:
+                        self.thread = None
+                        break
+
+        if self._sessions:
+            # Runs that are still going when the process exits count as failed
+            for run in list(self.runs.values()):
+                if run.exit_code is None:
+                    run.exit_code = 1
+                if run.done is not None:
+                    run.done.set()
+            await asyncio.gather(*self._sessions, return_exceptions=True)
+
+    async def _session(self, run: _Run) -> None:
+        monitor = run.monitor
+        instance = run.instance
+        done = run.done
+        assert done is not None
+
+        aggregator = instance.aggregator
+        if aggregator is not None and not aggregator.is_leader:
+            # In distributed jobs, only the aggregation leader creates sessions
+            return
+
+        if not instance.logged_in():
+            LOGGER.debug("Not creating a session for %s; not logged in", monitor.name)
+            return
+
+        state = {
+            "type": "process",
+            "hostname": socket.gethostname(),
+            "command": " ".join(sys.argv) or "python",
+            "pid": os.getpid(),
+            "notifyOn": monitor.notify_on,
+            "notifyChannel": monitor.notification_channel,
+        }
+        try:
+            session = await cast(
+                Awaitable["SessionResponse"],
+                instance.create_session(monitor.name, state, async_req=True),
+            )
+        except Exception:
+            LOGGER.warning(
+                "Unable to create a session for %s", monitor.name, exc_info=True
+            )
+            return
+
+        LOGGER.debug("Created session %s for %s", session.session_id, monitor.name)
+        try:
+            async with instance.session_connect(session.session_id, False) as ws:
+
+                async def receive(ws: "WebSocket") -> None:
+                    # Read incoming messages so that heartbeats are answered
+                    async for message in ws:
+                        LOGGER.debug("Monitor session message: %s", message)
+
+                receive_task = asyncio.create_task(receive(ws))
+                try:
+                    await done.wait()
+                    await ws.send(
+                        {
+                            "notifyOn": monitor.notify_on,
+                            "notifyChannel": monitor.notification_channel,
+                            "exitCode": run.exit_code,
+                        }
+                    )
+                finally:
+                    receive_task.cancel()
+                    with contextlib.suppress(asyncio.CancelledError, Exception):
+                        await receive_task
+        except Exception:
+            LOGGER.warning("Error in the session for %s", monitor.name, exc_info=True)
+        finally:
+            await cast(
+                Awaitable[None],
+                instance.end_session(session.session_id, async_req=True, durable=True),
+            )
+
+
+_runner: Optional[MonitorRunner] = None
+
+_runner_lock = threading.Lock()
+
+
+def get_runner() -> MonitorRunner:
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = MonitorRunner()
+    return _runner
+
+
+class Monitor:
+    """
+    Tracks a block of code or function call, like ``lmk run`` does for a process, and
+    sends a notification when it finishes according to ``notify_on``: ``"error"`` if it
+    raised an exception, ``"stop"`` when it finishes either way, or ``"none"``. Blocks that
+    run longer than ``session_after`` seconds also get an LMK session, so you can see them
+    in the LMK app while they're running. Use ``lmk.monitor()`` to create one.
+    """
+
+    def __init__(
+        self,
+        name: Optional[str] = None,
+        notify_on: str = "error",
+        session_after: float = 10.0,
+        notification_channel: Optional[str] = None,
+        instance: Optional["Instance"] = None,
+    ) -> None:
+        if notify_on not in NOTIFY_ON_VALUES:
+            raise ValueError(
+                f"notify_on must be one of {sorted(NOTIFY_ON_VALUES)}, got {notify_on!r}"
+            )
+        self.name = name or "monitor"
+        self._default_name = name is None
+        self.notify_on = notify_on
+        self.session_after = session_after
+        self.notification_channel = notification_channel
+        self.instance = instance
+        # The run started by the innermost ``with`` block in the current context. Each
+        # thread and asyncio task has its own, so concurrent blocks using the same
+        # monitor finish their own runs
+        self._current_run: "contextvars.ContextVar[Optional[_Run]]" = (
+            contextvars.ContextVar("lmk_monitor_run", default=None)
+        )
+
+    def _copy(self, name: str) -> "Monitor":
+        return Monitor(
+            name=name,
+            notify_on=self.notify_on,
+            session_after=self.session_after,
+            notification_channel=self.notification_channel,
+            instance=self.instance,
+        )
+
+    def _start(self) -> _Run:
+        instance = self.instance if self.instance is not None else get_instance()
+        run = _Run(self, instance)
+        get_runner().add(run)
+        return run
+
+    def _finish(self, run: _Run, exc_value: Optional[BaseException]) -> None:
+        run.exit_code = 0 if exc_value is None else 1
+        get_runner().remove(run)
+        try:
+            current_job.reset(run.job_token)
+        except ValueError:
+            # Finished in a different context than it started in
+            pass
+
+        if self.notify_on == "none" or (
+            self.notify_on == "error" and not run.exit_code
+        ):
+            return
+
+        elapsed = time.monotonic() - run.started_at
+        if exc_value is None:
+            message = f"`{self.name}` finished after {elapsed:.1f}s"
+        else:
+            formatted = "".join(
+                traceback.format_exception(
+                    type(exc_value), exc_value, exc_value.__traceback__
+                )
+            )
+            message = (
+                f"`{self.name}` failed after {elapsed:.1f}s with "
+                f"`{type(exc_value).__name__}`\n\n"
+                f"```\n{formatted[-MAX_TRACEBACK_LENGTH:]}\n```"
+            )
+        message += f"\n\nRan on `{socket.gethostname()}` (pid {os.getpid()})"
+
+        channels = self.notification_channel
+        # Sent in the background, so the block's caller never waits on the API
+        future = run.instance.notify(
+            message,
+            content_type="text/markdown",
+            notification_channels=None if channels is None else [channels],
+            deferred=True,
+            job=self.name,
+        )
+        cast(Any, future).add_done_callback(_log_notify_error)
+
+    def __enter__(self) -> "Monitor":
+        run = self._start()
+        run.run_token = self._current_run.set(run)
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb) -> None:
+        run = self._current_run.get()
+        if run is None:
+            LOGGER.warning("Exited monitor %s without a matching enter", self.name)
+            return
+        try:
+            self._current_run.reset(cast(contextvars.Token, run.run_token))
+        except ValueError:
+            # Finished in a different context than it started in
+            self._current_run.set(None)
+        self._finish(run, exc_value)
+
+    async def __aenter__(self) -> "Monitor":
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc_value, tb) -> None:
+        self.__exit__(exc_type, exc_value, tb)
+
+    def __call__(self, func: Callable[..., Any]) -> Callable[..., Any]:
+        monitor = self._copy(func.__qualname__ if self._default_name else self.name)
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                # A run per call, so concurrent calls are tracked separately
+                run = monitor._start()
+                try:
+                    result = await func(*args, **kwargs)
+                except BaseException as err:
+                    monitor._finish(run, err)
+                    raise
+                monitor._finish(run, None)
+                return result
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            run = monitor._start()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as err:
+                monitor._finish(run, err)
+                raise
+            monitor._finish(run, None)
+            return result
+
+        return wrapper
+
+
+def _log_notify_error(future: Any) -> None:
+    error = future.exception()
+    if error is not None:
+        LOGGER.warning("Unable to send monitor notification: %r", error)
+
+
+def monitor(
+    name: Optional[Any] = None,
+    notify_on: str = "error",
+    session_after: float = 10.0,
+    notification_channel: Optional[str] = None,
+    instance: Optional["Instance"] = None,
+) -> Any:
+    """
+    Monitor a block of code or a function (sync or async), and get a notification when it
+    fails (or finishes, depending on ``notify_on``). If it runs for longer than
+    ``session_after`` seconds, a session is created so that you can also see it in the
+    LMK app; shorter runs don't make any API requests unless a notification is sent.
+
+    <details><summary>Usage Example</summary>
+    <p>
+
+    ```python
+    import lmk
+
+    with lmk.monitor("etl-step", notify_on="error"):
+        run_etl()
+
+    @lmk.monitor
+    def train():
+        ...
+
+    @lmk.monitor("nightly-sync", notify_on="stop")
+    async def sync():
+        ...
+    ```
+    </p>
+    </details>
+
+    :param name: The name of the block, used in notifications and as the session name.
+    Defaults to the function's name when used as a decorator
+    :type name: str, optional
+    :param notify_on: ``"error"`` to notify if an exception is raised, ``"stop"`` to
+    notify whenever the block finishes, or ``"none"``. Defaults to ``"error"``
+    :type notify_on: str, optional
+    :param session_after: Create a session once the block has run for this many seconds.
+    Defaults to 10
+    :type session_after: float, optional
+    :param notification_channel: The notification channel to notify. Defaults to the
+    default channel
+    :type notification_channel: str, optional
+    :param instance: The instance to use. Defaults to the default instance
+    :type instance: Instance, optional
+
+    :return: A ``Monitor``, which can be used as a (sync or async) context manager or a
+    decorator
+    :rtype: Monitor
+    """
+    if callable(name):
+        # Used as a bare decorator: @lmk.monitor
+        return Monitor()(name)
+    return Monitor(
+        name=name,
+        notify_on=notify_on,
+        session_after=session_after,
+        notification_channel=notification_channel,
+        instance=instance,
+    )
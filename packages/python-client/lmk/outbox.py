@@ -0,0 +1,246 @@
+import contextlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, Generator, List, Optional
+
+from lmk.generated.exceptions import ApiException
+
+
+LOGGER = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    claimed_until REAL,
+    last_error TEXT,
+    owner TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_next_attempt_at ON outbox (next_attempt_at);
+"""
+
+
+@dataclass
+class OutboxEntry:
+    """
+    A request saved in the outbox. ``key`` is sent as the ``Idempotency-Key`` header
+    on every delivery attempt.
+    """
+
+    key: str
+    kind: str
+    payload: Dict[str, Any]
+    attempts: int
+    created_at: float
+
+
+def is_permanent_error(error: Exception) -> bool:
+    """
+    Client errors will fail the same way every time, so there's no point retrying
+    them. Everything else (connection errors, timeouts, 5xx, 429) is retried.
+    """
+    if isinstance(error, ApiException) and error.status:
+        return 400 <= error.status < 500 and error.status not in {408, 429}
+    return False
+
+
+def outbox_backoff(
+    attempts: int, base: float = 5.0, max_backoff: float = 900.0
+) -> float:
+    return min(max_backoff, base * 2 ** (attempts - 1)) * random.uniform(0.5, 1.5)
+
+
+class Outbox:
+    """
+    Durable on-disk outbox for events and session updates, stored in a SQLite database
+    (``~/.lmk/outbox.db`` by default). Requests are written here before they're sent
+    and removed once they've been delivered, so if the API is unreachable they're kept
+    and retried with backoff by ``Instance.drain_outbox()`` rather than being lost.
+    Entries are discarded after ``max_attempts`` failed deliveries (about three hours
+    of retries with the default backoff) or once they're older than ``max_age``.
+
+    Every profile shares the same file, so entries are saved with ``owner`` (see
+    ``Instance.outbox``) and only entries with the same owner are claimed, counted or
+    delivered. This keeps a request queued for one account from being sent with
+    another's access token.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        lease: float = 60.0,
+        max_age: float = 7 * 24 * 3600,
+        max_attempts: int = 20,
+        owner: Optional[str] = None,
+    ) -> None:
+        if path is None:
+            path = os.path.expanduser("~/.lmk/outbox.db")
+        self.path = path
+        self.lease = lease
+        self.max_age = max_age
+        self.max_attempts = max_attempts
+        self.owner = owner
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            dirname = os.path.dirname(self.path)
+            if dirname and not os.path.exists(dirname):
+                os.makedirs(dirname, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(outbox)")}
+            if "owner" not in columns:
+                # Entries saved by earlier versions have no owner, so they're never
+                # claimed and expire after max_age
+                with contextlib.suppress(sqlite3.OperationalError):
+                    conn.execute("ALTER TABLE outbox ADD COLUMN owner TEXT")
+            self._local.conn = conn
+        return conn
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Generator[sqlite3.Connection, None, None]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    def put(self, kind: str, payload: Dict[str, Any]) -> OutboxEntry:
+        """
+        Save a request in the outbox. The new entry is leased to the caller, so a
+        concurrent ``claim()`` won't pick it up while the caller attempts the first
+        delivery.
+        """
+        now = time.time()
+        entry = OutboxEntry(
+            key=uuid.uuid4().hex,
+            kind=kind,
+            payload=payload,
+            attempts=0,
+            created_at=now,
+        )
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO outbox (key, kind, payload, created_at, next_attempt_at, "
+                "claimed_until, owner) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    entry.key,
+                    kind,
+                    json.dumps(payload),
+                    now,
+                    now,
+                    now + self.lease,
+                    self.owner,
+                ),
+            )
+        return entry
+
+    def claim(self, limit: int = 100) -> List[OutboxEntry]:
+        """
+        Lease up to ``limit`` of this owner's entries that are due for a delivery
+        attempt. Entries that are older than ``max_age`` are discarded, whatever their
+        owner.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            expired = conn.execute(
+                "DELETE FROM outbox WHERE created_at < ?", (now - self.max_age,)
+            ).rowcount
+            if expired:
+                LOGGER.warning("Discarded %d expired outbox entries", expired)
+
+            rows = conn.execute(
+                "SELECT key, kind, payload, attempts, created_at FROM outbox "
+                "WHERE owner IS ? AND next_attempt_at <= ? "
+                "AND (claimed_until IS NULL OR claimed_until < ?) ORDER BY id LIMIT ?",
+                (self.owner, now, now, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET claimed_until = ? WHERE key = ?",
+                [(now + self.lease, row[0]) for row in rows],
+            )
+
+        return [
+            OutboxEntry(
+                key=key,
+                kind=kind,
+                payload=json.loads(payload),
+                attempts=attempts,
+                created_at=created_at,
+            )
+            for key, kind, payload, attempts, created_at in rows
+        ]
+
+    def remove(self, key: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM outbox WHERE key = ?", (key,))
+
+    def record_failure(self, entry: OutboxEntry, error: Exception) -> bool:
+        """
+        Record a failed delivery attempt.
+
+        :return: ``True`` if the entry will be retried, ``False`` if it was discarded
+        because the error is not retryable or it has run out of attempts
+        :rtype: bool
+        """
+        if is_permanent_error(error):
+            LOGGER.error(
+                "Discarding outbox entry %s (%s) after permanent error: %s",
+                entry.key,
+                entry.kind,
+                error,
+            )
+            self.remove(entry.key)
+            return False
+
+        entry.attempts += 1
+        if entry.attempts >= self.max_attempts:
+            LOGGER.error(
+                "Discarding outbox entry %s (%s) after %d attempts: %s",
+                entry.key,
+                entry.kind,
+                entry.attempts,
+                error,
+            )
+            self.remove(entry.key)
+            return False
+
+        next_attempt_at = time.time() + outbox_backoff(entry.attempts)
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, claimed_until = NULL, "
+                "last_error = ? WHERE key = ?",
+                (
+                    entry.attempts,
+                    next_attempt_at,
+                    f"{type(error).__name__}: {error}",
+                    entry.key,
+                ),
+            )
+        return True
+
+    def __len__(self) -> int:
+        return (
+            self._connection()
+            .execute("SELECT COUNT(*) FROM outbox WHERE owner IS ?", (self.owner,))
+            .fetchone()[0]
+        )
@@ -0,0 +1,223 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from lmk.api_client import ApiClient, api_client
+from lmk.constants import API_URL
+from lmk.instance import Instance
+from lmk.sender import NotificationSender
+
+
+LOGGER = logging.getLogger(__name__)
+
+PoolKey = Tuple[str, str]
+
+
+def _pool_key(profile: Optional[str], access_token: Optional[str]) -> PoolKey:
+    if (profile is None) == (access_token is None):
+        raise ValueError("Exactly one of profile or access_token must be given")
+    if profile is not None:
+        return ("profile", profile)
+    return ("token", hashlib.sha256(str(access_token).encode()).hexdigest())
+
+
+class InstancePool:
+    """
+    Pool of ``Instance`` objects keyed by profile or access token, for services that send
+    notifications on behalf of many users. Instances for the same server share a single
+    ``ApiClient`` (and so its connection pools and thread pool executor) and a single
+    ``NotificationSender`` (and so its background thread, event loop and aiohttp
+    session), while each keeps its own token state. Pooled instances don't refresh their
+    access tokens in the background, since that takes a thread each; tokens are
+    refreshed when a request needs them instead. The least recently used instances are
+    closed once there are more than ``max_size`` of them, or once they've been idle for
+    ``idle_timeout`` seconds.
+
+    <details><summary>Usage Example</summary>
+    <p>
+
+    ```python
+    from lmk.pool import InstancePool
+
+    pool = InstancePool(max_size=1000, idle_timeout=3600)
+
+    for user in users:
+        instance = pool.get(access_token=user.lmk_access_token)
+        instance.notify(f"Hello, {user.name}!", deferred=True)
+    ```
+    </p>
+    </details>
+    """
+
+    def __init__(
+        self,
+        max_size: int = 100,
+        idle_timeout: Optional[float] = None,
+        server_url: Optional[str] = None,
+        config_path: Optional[str] = None,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.server_url = server_url or API_URL
+        self.config_path = config_path
+        self.logger = logger
+        self._instances: "OrderedDict[PoolKey, Tuple[Instance, float]]" = OrderedDict()
+        self._clients: Dict[str, ApiClient] = {}
+        self._senders: Dict[str, NotificationSender] = {}
+        self._lock = threading.Lock()
+
+    def client(self, server_url: Optional[str] = None) -> ApiClient:
+        """
+        Get the shared API client for a server
+        """
+        server_url = server_url or self.server_url
+        with self._lock:
+            client = self._clients.get(server_url)
+            if client is None:
+                client = self._clients[server_url] = api_client(
+                    server_url=server_url, logger=self.logger
+                )
+            return client
+
+    def sender(self, server_url: Optional[str] = None) -> NotificationSender:
+        """
+        Get the shared notification sender for a server
+        """
+        server_url = server_url or self.server_url
+        client = self.client(server_url)
+        with self._lock:
+            sender = self._senders.get(server_url)
+            if sender is None:
+                sender = self._senders[server_url] = NotificationSender(client=client)
+            return sender
+
+    def get(
+        self,
+        profile: Optional[str] = None,
+        access_token: Optional[str] = None,
+        refresh_token: Optional[str] = None,
+        server_url: Optional[str] = None,
+    ) -> Instance:
+        """
+        Get the instance for a profile or an access token, creating it if needed. Exactly
+        one of ``profile`` or ``access_token`` must be given. Instances for profiles read
+        and save their tokens in the config file; instances for access tokens don't.
+
+        :param profile: The config file profile to use
+        :type profile: str, optional
+        :param access_token: The access token to use
+        :type access_token: str, optional
+        :param refresh_token: A refresh token to use with ``access_token``
+        :type refresh_token: str, optional
+        :param server_url: The server to use. Defaults to the pool's ``server_url``
+        :type server_url: str, optional
+
+        :return: The instance for the given profile or access token
+        :rtype: Instance
+        """
+        key = _pool_key(profile, access_token)
+        server_url = server_url or self.server_url
+        now = time.monotonic()
+
+        with self._lock:
+            evicted = self._evict_idle(now)
+            entry = self._instances.get(key)
+            if entry is not None:
+                self._instances[key] = (entry[0], now)
+                self._instances.move_to_end(key)
+
+        self._close(evicted)
+        if entry is not None:
+            return entry[0]
+
+        instance = Instance(
+            # Instances for access tokens use a profile that isn't in the config
+            # file, so they don't pick up another profile's tokens
+            profile=profile if profile is not None else f"pool-{key[1][:16]}",
+            server_url=server_url,
+            config_path=self.config_path,
+            access_token=access_token,
+            refresh_token=refresh_token,
+            logger=self.logger,
+            sync_config=profile is not None,
+            client=self.client(server_url),
+            sender=self.sender(server_url),
+            background_refresh=False,
+        )
+
+        with self._lock:
+            existing = self._instances.get(key)
+            if existing is not None:
+                # Another thread created it first
+                evicted = [instance]
+                instance = existing[0]
+            else:
+                self._instances[key] = (instance, now)
+                evicted = self._evict_lru()
+
+        self._close(evicted)
+        return instance
+
+    def _evict_idle(self, now: float) -> List[Instance]:
+        if self.idle_timeout is None:
+            return []
+        evicted = []
+        # Entries are in order of last use, so stop at the first one that isn't idle
+        for key, (instance, last_used) in list(self._instances.items()):
+            if now - last_used < self.idle_timeout:
+                break
+            del self._instances[key]
+            evicted.append(instance)
+        return evicted
+
+    def _evict_lru(self) -> List[Instance]:
+        evicted = []
+        while len(self._instances) > self.max_size:
+            _, (instance, _) = self._instances.popitem(last=False)
+            evicted.append(instance)
+        return evicted
+
+    def _close(self, instances: List[Instance]) -> None:
+        for instance in instances:
+            LOGGER.debug("Closing pooled instance for profile %s", instance.profile)
+            try:
+                instance.close()
+            except Exception:
+                LOGGER.exception("Error closing pooled instance")
+
+    def evict(
+        self, profile: Optional[str] = None, access_token: Optional[str] = None
+    ) -> None:
+        """
+        Close and remove the instance for a profile or access token, if there is one
+        """
+        key = _pool_key(profile, access_token)
+        with self._lock:
+            entry = self._instances.pop(key, None)
+        if entry is not None:
+            self._close([entry[0]])
+
+    def close(self) -> None:
+        """
+        Close all instances in the pool and the shared senders and API clients
+        """
+        with self._lock:
+            instances = [instance for instance, _ in self._instances.values()]
+            senders = list(self._senders.values())
+            clients = list(self._clients.values())
+            self._instances.clear()
+            self._senders.clear()
+            self._clients.clear()
+
+        self._close(instances)
+        for sender in senders:
+            sender.close()
+        for client in clients:
+            client.close()
+
+    def __len__(self) -> int:
+        return len(self._instances)
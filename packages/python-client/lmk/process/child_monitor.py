@@ -2,7 +2,7 @@ import asyncio
 import logging
 import os
 import pty
-from typing import List
+from typing import Dict, List, Optional
 
 from lmk.process.monitor import ProcessMonitor, MonitoredProcess
 from lmk.utils import wait_for_fd, shlex_join
@@ -63,10 +63,11 @@ class MonitoredChildProcess(MonitoredProcess):
 class ChildMonitor(ProcessMonitor):
     """ """
 
-    def __init__(self, argv: List[str]) -> None:
+    def __init__(self, argv: List[str], env: Optional[Dict[str, str]] = None) -> None:
         if len(argv) < 1:
             raise ValueError("argv must have length >=1")
         self.argv = argv
+        self.env = env
 
     async def attach(
         self,
@@ -83,6 +84,7 @@ class ChildMonitor(ProcessMonitor):
             stderr=write_output,
             bufsize=0,
             start_new_session=True,
+            env=self.env,
         )
         LOGGER.debug(
             "Created child process: [%s], pid: %d", shlex_join(self.argv), proc.pid
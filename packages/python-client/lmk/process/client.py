@@ -2,12 +2,15 @@ from typing import Union, Any
 
 import aiohttp
 
+from lmk.utils.codec import get_codec
 from lmk.utils.ws import WebSocket
 
 
 async def send_signal(socket_path: str, signal: Union[str, int]) -> None:
     connector = aiohttp.UnixConnector(path=socket_path)
-    async with aiohttp.ClientSession(connector=connector) as session:
+    async with aiohttp.ClientSession(
+        connector=connector, json_serialize=get_codec().dumps
+    ) as session:
         async with session.post(
             "http://daemon/signal", json={"signal": signal}
         ) as response:
@@ -18,7 +21,9 @@ async def send_signal(socket_path: str, signal: Union[str, int]) -> None:
 
 async def update_job(socket_path: str) -> None:
     connector = aiohttp.UnixConnector(path=socket_path)
-    async with aiohttp.ClientSession(connector=connector) as session:
+    async with aiohttp.ClientSession(
+        connector=connector, json_serialize=get_codec().dumps
+    ) as session:
         async with session.post("http://daemon/update") as response:
             if response.status == 200:
                 return
@@ -27,7 +32,9 @@ async def update_job(socket_path: str) -> None:
 
 async def wait_for_job(socket_path: str, wait_for: str = "run") -> Any:
     connector = aiohttp.UnixConnector(path=socket_path)
-    async with aiohttp.ClientSession(connector=connector) as session:
+    async with aiohttp.ClientSession(
+        connector=connector, json_serialize=get_codec().dumps
+    ) as session:
         async with WebSocket(session, f"http://daemon/wait?wait_for={wait_for}") as ws:
             async for message in ws:
                 if not message["ok"]:
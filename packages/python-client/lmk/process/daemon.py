@@ -12,6 +12,8 @@ from typing import Optional, Callable, Any, cast, Awaitable, AsyncGenerator
 
 from aiohttp import web
 
+from lmk import exc as lmk_exc
+from lmk.api_client import RateLimiter
 from lmk.generated.models.event_response import EventResponse
 from lmk.generated.models.session_response import SessionResponse
 from lmk.generated.models.process_session_state import ProcessSessionState
@@ -27,11 +29,24 @@ from lmk.utils import (
     shlex_join,
     asyncio_event,
 )
-from lmk.utils.ws import WebSocket
+from lmk.utils.codec import get_codec
+from lmk.utils.ws import StateChannel, WebSocket
 
 
 LOGGER = logging.getLogger(__name__)
 
+# How long to wait for the exit notification before leaving it to be retried
+# from the outbox
+NOTIFY_TIMEOUT = 10.0
+
+OUTBOX_DRAIN_INTERVAL = 30.0
+
+
+def json_response(data: Any, status: int = 200) -> web.Response:
+    return web.Response(
+        body=get_codec().dumpb(data), status=status, content_type="application/json"
+    )
+
 
 def route_handler(func: Callable) -> Callable:
     """ """
@@ -42,7 +57,7 @@ def route_handler(func: Callable) -> Callable:
             return await func(*args, **kwargs)
         except Exception:
             LOGGER.exception("Error running route handler")
-            return web.json_response({"message": "Internal server error"}, status=500)
+            return json_response({"message": "Internal server error"}, status=500)
 
     return wrapper
 
@@ -108,13 +123,16 @@ class ProcessMonitorController:
                             "stage": "attach",
                             "error_type": job.error_type,
                             "error": job.error,
-                        }
+                        },
+                        dumps=get_codec().dumps,
                     )
                     await ws.close()
                     return ws
 
             if wait_for == "attach":
-                await ws.send_json({"ok": True, "stage": "attach"})
+                await ws.send_json(
+                    {"ok": True, "stage": "attach"}, dumps=get_codec().dumps
+                )
                 await ws.close()
                 return ws
 
@@ -131,12 +149,16 @@ class ProcessMonitorController:
                         "stage": "run",
                         "error_type": job.error_type,
                         "error": job.error,
-                    }
+                    },
+                    dumps=get_codec().dumps,
                 )
                 await ws.close()
                 return ws
 
-            await ws.send_json({"ok": True, "stage": "run", "exit_code": job.exit_code})
+            await ws.send_json(
+                {"ok": True, "stage": "run", "exit_code": job.exit_code},
+                dumps=get_codec().dumps,
+            )
             await ws.close()
             return ws
         except ConnectionResetError:
@@ -147,18 +169,18 @@ class ProcessMonitorController:
     async def _handle_update(self, request: web.Request) -> web.Response:
         self.update_event.set()
 
-        return web.json_response({"ok": True})
+        return json_response({"ok": True})
 
     @route_handler
     async def _send_signal(self, request: web.Request) -> web.Response:
-        body = await request.json()
+        body = await request.json(loads=get_codec().loads)
         signum = body["signal"]
         if isinstance(signum, str):
             signum = getattr(signal.Signals, signum).value
 
         await self.send_signal(signum)
 
-        return web.json_response({"ok": True})
+        return json_response({"ok": True})
 
     async def _handle_session_action(self, action: str, body: Optional[Any]) -> None:
         if action == "sendSignal" and body is not None:
@@ -173,24 +195,33 @@ class ProcessMonitorController:
         if job is None:
             raise exc.JobNotFound(self.job_name)
 
-        self.session = await cast(
-            Awaitable[SessionResponse],
-            instance.create_session(
-                self.job_name,
-                ProcessSessionState(
-                    type="process",
-                    hostname=self.hostname,
-                    command=shlex_join(json.loads(job.command))
-                    if job.command
-                    else "<unknown>",
-                    pid=cast(float, job.pid),
-                    notifyOn=job.notify_on,
-                    notifyChannel=job.channel_id,
-                    exitCode=None,
+        try:
+            self.session = await cast(
+                Awaitable[SessionResponse],
+                instance.create_session(
+                    self.job_name,
+                    ProcessSessionState(
+                        type="process",
+                        hostname=self.hostname,
+                        command=shlex_join(json.loads(job.command))
+                        if job.command
+                        else "<unknown>",
+                        pid=cast(float, job.pid),
+                        notifyOn=job.notify_on,
+                        notifyChannel=job.channel_id,
+                        exitCode=None,
+                    ),
+                    async_req=True,
                 ),
-                async_req=True,
-            ),
-        )
+            )
+        except Exception:
+            # Keep monitoring the process if the API is unavailable; the exit
+            # notification will be queued in the outbox
+            LOGGER.warning(
+                "Unable to create session; monitoring without one", exc_info=True
+            )
+            yield
+            return
 
         LOGGER.info("Created session: %s", self.session.session_id)
         await self.manager.update_job(self.job_name, session_id=self.session.session_id)
@@ -200,6 +231,7 @@ class ProcessMonitorController:
             LOGGER.debug("Connected to session: %s", self.session.session_id)
 
             async def handle_updates():
+                channel = StateChannel(ws)
                 while True:
                     update_task = asyncio.create_task(self.update_event.wait())
                     done_task = asyncio.create_task(self.done_event.wait())
@@ -211,7 +243,7 @@ class ProcessMonitorController:
 
                     if update_task.done():
                         self.update_event.clear()
-                        await ws.send(
+                        await channel.update(
                             {
                                 "notifyOn": job.notify_on,
                                 "notifyChannel": job.channel_id,
@@ -222,12 +254,15 @@ class ProcessMonitorController:
                         LOGGER.info(
                             "Sending session exit message; exit code %s", job.exit_code
                         )
-                        await ws.send(
+                        # The exit message always carries the full state, since
+                        # it decides whether a notification is sent
+                        await channel.update(
                             {
                                 "notifyOn": job.notify_on,
                                 "notifyChannel": job.channel_id,
                                 "exitCode": job.exit_code,
-                            }
+                            },
+                            full=True,
                         )
                         LOGGER.info("Sent message")
                         await ws.close()
@@ -273,7 +308,9 @@ class ProcessMonitorController:
                 if self.session is not None:
                     await cast(
                         Awaitable[None],
-                        instance.end_session(self.session.session_id, async_req=True),
+                        instance.end_session(
+                            self.session.session_id, async_req=True, durable=True
+                        ),
                     )
 
     async def _run_server(self) -> None:
@@ -394,17 +431,29 @@ class ProcessMonitorController:
                     if logs:
                         message += f"\n\nMost recent logs:\n```\n{logs}\n```"
 
-                    await cast(
-                        Awaitable[EventResponse],
-                        instance.notify(
-                            message,
-                            notification_channels=(
-                                None if job.channel_id is None else [job.channel_id]
+                    await asyncio.wait_for(
+                        cast(
+                            Awaitable[EventResponse],
+                            instance.notify(
+                                message,
+                                notification_channels=(
+                                    None if job.channel_id is None else [job.channel_id]
+                                ),
+                                async_req=True,
+                                durable=True,
                             ),
-                            async_req=True,
                         ),
+                        NOTIFY_TIMEOUT,
                     )
                     notify_status = "success"
+                except (lmk_exc.DeliveryDeferred, asyncio.TimeoutError):
+                    LOGGER.warning(
+                        "Could not send notification to channel %s; it has been "
+                        "saved in the outbox and will be retried.",
+                        job.channel_id,
+                        exc_info=True,
+                    )
+                    notify_status = "queued"
                 except Exception:
                     LOGGER.exception(
                         "Failed to send notification to channel %s.", job.channel_id
@@ -418,11 +467,31 @@ class ProcessMonitorController:
             raise exc.ProcessNotAttached
         await self.process.send_signal(signum)
 
+    async def _drain_outbox(self) -> None:
+        instance = get_instance()
+        while True:
+            try:
+                delivered = await cast(
+                    Awaitable[int], instance.drain_outbox(async_req=True)
+                )
+                if delivered:
+                    LOGGER.info("Delivered %d requests from the outbox", delivered)
+            except Exception:
+                LOGGER.exception("Error draining outbox")
+            await asyncio.sleep(OUTBOX_DRAIN_INTERVAL)
+
     async def run(self, log_path: str, log_level: str) -> None:
+        # Share rate limiting with the other job daemons, so that when the server
+        # responds with a 429 to one of them, the others hold back too
+        get_instance().client.rate_limiter = RateLimiter(
+            shared_dir=os.path.join(self.manager.base_path, "ratelimit")
+        )
+
         await self.manager.start_job(self.job_name)
 
         tasks = []
         tasks.append(asyncio.create_task(self._run_server()))
+        tasks.append(asyncio.create_task(self._drain_outbox()))
 
         LOGGER.info("Running main process")
         try:
@@ -0,0 +1,575 @@
+import asyncio
+import atexit
+import contextlib
+import itertools
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from typing import (
+    Any,
+    Awaitable,
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    TYPE_CHECKING,
+    cast,
+)
+
+from lmk.instance import get_instance
+from lmk.metrics import MetricsBuffer
+from lmk.utils.asyncio import asyncio_event
+
+if TYPE_CHECKING:
+    from lmk.aggregation import Aggregator
+    from lmk.generated.models.session_response import SessionResponse
+    from lmk.instance import Instance
+    from lmk.utils.ws import WebSocket
+
+
+LOGGER = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Weight of the latest interval in the exponential moving average of the rate
+RATE_SMOOTHING = 0.3
+
+
+class ProgressBar(Generic[T]):
+    """
+    Progress of a loop or other long-running task, reported to an LMK session by a
+    ``ProgressReporter``. Iterating over the bar (or calling ``update()``) only increments
+    a counter; the reporter's background thread samples it every ``interval`` seconds to
+    compute the rate and ETA. Use ``lmk.progress()`` to create one.
+    """
+
+    def __init__(
+        self,
+        reporter: "ProgressReporter",
+        iterable: Optional[Iterable[T]] = None,
+        total: Optional[int] = None,
+        desc: Optional[str] = None,
+    ) -> None:
+        if total is None and iterable is not None:
+            try:
+                total = len(iterable)  # type: ignore
+            except (TypeError, AttributeError):
+                total = None
+        self.reporter = reporter
+        self.iterable = iterable
+        self.total = total
+        self.desc = desc
+        self.n = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.id: Optional[int] = None
+
+        # Only used by the reporter thread
+        self.sampled = False
+        self._sampled_n = 0
+        self._sampled_at = 0.0
+        self._rate: Optional[float] = None
+
+    def __iter__(self) -> Iterator[T]:
+        if self.iterable is None:
+            raise TypeError("ProgressBar was created without an iterable")
+        self.start()
+        try:
+            for item in self.iterable:
+                self.n += 1
+                yield item
+        finally:
+            self.close()
+
+    def __enter__(self) -> "ProgressBar[T]":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb) -> None:
+        self.close()
+
+    def start(self) -> None:
+        if self.started_at is not None:
+            return
+        self.started_at = time.monotonic()
+        self._sampled_at = self.started_at
+        self.reporter.add(self)
+
+    def update(self, n: int = 1) -> None:
+        """
+        Record ``n`` more completed units of work
+        """
+        self.n += n
+
+    def close(self) -> None:
+        """
+        Mark the bar as finished. Its final state is sent on the reporter's next update.
+        """
+        if self.finished_at is not None or self.started_at is None:
+            return
+        self.finished_at = time.monotonic()
+        self.reporter.wakeup()
+
+    def sample(self, now: float) -> Dict[str, Any]:
+        """
+        Compute the current state of the bar. This is called from the reporter thread.
+        """
+        assert self.started_at is not None
+        n = self.n
+        end = self.finished_at if self.finished_at is not None else now
+        elapsed = max(end - self.started_at, 0.0)
+
+        interval = now - self._sampled_at
+        if interval > 0 and self.finished_at is None:
+            rate = (n - self._sampled_n) / interval
+            self._rate = (
+                rate
+                if self._rate is None
+                else RATE_SMOOTHING * rate + (1 - RATE_SMOOTHING) * self._rate
+            )
+        elif self.finished_at is not None:
+            self._rate = n / elapsed if elapsed > 0 else None
+        self.sampled = True
+        self._sampled_n = n
+        self._sampled_at = now
+
+        eta: Optional[float] = None
+        if self.finished_at is not None:
+            eta = 0.0
+        elif self.total is not None and self._rate:
+            eta = max(self.total - n, 0) / self._rate
+
+        return {
+            "id": self.id,
+            "desc": self.desc,
+            "n": n,
+            "total": self.total,
+            "elapsed": round(elapsed, 3),
+            "rate": None if self._rate is None else round(self._rate, 3),
+            "eta": None if eta is None else round(eta, 3),
+            "done": self.finished_at is not None,
+        }
+
+
+class ProgressReporter:
+    """
+    Sends the state of running progress bars and logged metrics to an LMK session from a
+    background thread with its own event loop. The session is created the first time
+    there's something to report, so loops that finish within ``interval`` seconds never
+    create one. Updates are sent over the session web socket at most every ``interval``
+    seconds, and only when something changed; metrics logged since the last update are
+    downsampled to at most ``max_points`` per metric. The session is ended after nothing
+    has been reported for ``idle_timeout`` seconds, or at exit (waiting at most
+    ``exit_timeout`` seconds).
+
+    Each instance has one (``Instance.progress_reporter``), which is shared by all bars
+    and metrics created through ``lmk.progress()`` and ``lmk.log_metric()``.
+    """
+
+    def __init__(
+        self,
+        instance: Optional["Instance"] = None,
+        interval: float = 1.0,
+        idle_timeout: float = 30.0,
+        exit_timeout: float = 5.0,
+        notify_on: str = "none",
+        name: Optional[str] = None,
+        max_points: int = 100,
+        metrics: Optional[MetricsBuffer] = None,
+    ) -> None:
+        self.instance = instance
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.exit_timeout = exit_timeout
+        self.notify_on = notify_on
+        self.name = name
+        self.max_points = max_points
+        self.metrics = MetricsBuffer() if metrics is None else metrics
+        self.session_id: Optional[str] = None
+
+        self.bars: List[ProgressBar] = []
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._closed = False
+        self._disabled = False
+        # Set when the web socket reconnects, so every bar is sent again
+        self._resync = False
+        # Set when aggregating a distributed job (see lmk.aggregation); updates are
+        # tagged with the rank, and the leader also reports updates from other ranks
+        self.rank: Optional[int] = None
+        self._remote: List[Tuple[int, Dict[str, Any]]] = []
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def add(self, bar: ProgressBar) -> None:
+        with self._lock:
+            bar.id = next(self._ids)
+            self.bars.append(bar)
+            if self.thread is None or not self.thread.is_alive():
+                self._start()
+
+    def log_metric(self, name: str, value: float, step: Optional[float] = None) -> None:
+        self.metrics.log(name, value, step)
+        if self.thread is None:
+            with self._lock:
+                if self.thread is None:
+                    self._start()
+
+    def add_remote(self, rank: int, message: Dict[str, Any]) -> None:
+        """
+        Report an update from another rank of a distributed job with this reporter's
+        next update
+        """
+        with self._lock:
+            self._remote.append((rank, message))
+            if self.thread is None or not self.thread.is_alive():
+                self._start()
+
+    def _take_update(
+        self, own: Dict[str, Any], remote: List[Tuple[int, Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        if self.rank is None and not remote:
+            return own
+        message: Dict[str, Any] = {}
+        for rank, update in [(self.rank, own)] + remote:
+            for bar in update.get("progress", []):
+                message.setdefault("progress", []).append({**bar, "rank": rank})
+            for name, delta in update.get("metrics", {}).items():
+                metrics = message.setdefault("metrics", {})
+                key = f"rank{rank}/{name}"
+                if key not in metrics:
+                    metrics[key] = dict(delta)
+                    continue
+                # Several updates from the same rank in one interval
+                merged = metrics[key]
+                for column in ("step", "min", "max", "last"):
+                    merged[column] = merged[column] + delta[column]
+                if "dropped" in delta:
+                    merged["dropped"] = merged.get("dropped", 0) + delta["dropped"]
+        return message
+
+    def _start(self) -> None:
+        loop = asyncio.new_event_loop()
+        self._wakeup = asyncio_event(loop=loop)
+        self.loop = loop
+        self.thread = threading.Thread(
+            target=self._run, args=(loop,), name="lmk-progress", daemon=True
+        )
+        self.thread.start()
+        if not self._closed:
+            atexit.unregister(self.close)
+            atexit.register(self.close)
+
+    def wakeup(self) -> None:
+        """
+        Send an update now rather than at the next interval
+        """
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            with contextlib.suppress(RuntimeError):
+                loop.call_soon_threadsafe(self._wakeup.set)  # type: ignore
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """
+        Send the final state of all bars, end the session and stop the background
+        thread, waiting at most ``timeout`` seconds (defaults to ``exit_timeout``).
+
+        :return: ``True`` if the thread stopped before the timeout
+        :rtype: bool
+        """
+        if timeout is None:
+            timeout = self.exit_timeout
+        self._closed = True
+        atexit.unregister(self.close)
+        self.wakeup()
+        thread = self.thread
+        if thread is None or thread is threading.current_thread():
+            return True
+        thread.join(timeout)
+        if thread.is_alive():
+            LOGGER.warning("Timed out after %.2fs sending progress updates", timeout)
+            return False
+        return True
+
+    def _run(self, loop: asyncio.AbstractEventLoop) -> None:
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self._main())
+        except Exception:
+            LOGGER.exception("Error in progress reporter")
+        finally:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+    def _sample(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            bars = list(self.bars)
+            # Finished bars are included one last time
+            self.bars = [bar for bar in bars if bar.finished_at is None]
+        # Bars are only reported once they've run for an interval, so that short loops
+        # don't create a session
+        return [
+            bar.sample(now)
+            for bar in bars
+            if bar.sampled or now - bar.started_at >= self.interval  # type: ignore
+        ]
+
+    def _session_state(self) -> Dict[str, Any]:
+        return {
+            "type": "process",
+            "hostname": socket.gethostname(),
+            "command": " ".join(sys.argv) or "python",
+            "pid": os.getpid(),
+            "notifyOn": self.notify_on,
+        }
+
+    async def _connect(self, stack: contextlib.AsyncExitStack, name: str) -> Any:
+        instance = self.instance
+        if instance is None:
+            instance = get_instance()
+
+        aggregator = instance.aggregator
+        if aggregator is not None and not aggregator.is_leader:
+            # Other ranks send updates to the leader, which reports them in its session
+            return _Forwarder(aggregator)
+
+        if not instance.logged_in():
+            LOGGER.debug("Not reporting progress because you are not logged in")
+            self._disabled = True
+            return None
+
+        try:
+            session = await cast(
+                Awaitable["SessionResponse"],
+                instance.create_session(name, self._session_state(), async_req=True),
+            )
+            self.session_id = session.session_id
+            ws = await stack.enter_async_context(
+                instance.session_connect(session.session_id, False)
+            )
+        except Exception:
+            LOGGER.warning("Unable to report progress to LMK", exc_info=True)
+            self._disabled = True
+            return None
+
+        async def end_session() -> None:
+            await cast(
+                Awaitable[None],
+                instance.end_session(session.session_id, async_req=True, durable=True),
+            )
+
+        stack.push_async_callback(end_session)
+
+        async def receive(ws: "WebSocket") -> None:
+            # Read incoming messages so that heartbeats are answered
+            async for message in ws:
+                LOGGER.debug("Progress session message: %s", message)
+
+        receive_task = asyncio.create_task(receive(ws))
+
+        async def stop_receiving() -> None:
+            receive_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await receive_task
+
+        stack.push_async_callback(stop_receiving)
+
+        from lmk.utils.ws import ws_connected
+
+        def on_connected(sender: Any) -> None:
+            self._resync = True
+
+        ws_connected.connect(on_connected, ws, weak=False)
+        stack.callback(ws_connected.disconnect, on_connected, ws)
+        return ws
+
+    async def _main(self) -> None:
+        wakeup = self._wakeup
+        assert wakeup is not None
+
+        stack = contextlib.AsyncExitStack()
+        ws: Any = None
+        last: Optional[List[Any]] = None
+        idle_since: Optional[float] = None
+        try:
+            while True:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(wakeup.wait(), self.interval)
+                wakeup.clear()
+
+                snapshot = self._sample()
+                metrics = self.metrics.take(self.max_points)
+                message: Dict[str, Any] = {}
+                # Only send bars if one progressed, finished or started
+                key = [(bar["id"], bar["n"], bar["done"]) for bar in snapshot]
+                if self._resync:
+                    self._resync = False
+                    last = None
+                if snapshot and key != last:
+                    last = key
+                    message["progress"] = snapshot
+                if metrics:
+                    message["metrics"] = metrics
+                with self._lock:
+                    remote, self._remote = self._remote, []
+                message = self._take_update(message, remote)
+
+                if message and not self._disabled:
+                    if ws is None:
+                        name = self.name or (snapshot and snapshot[0]["desc"])
+                        ws = await self._connect(stack, name or "progress")
+                    if ws is not None:
+                        try:
+                            await ws.send(message)
+                        except Exception:
+                            LOGGER.warning(
+                                "Unable to send progress update", exc_info=True
+                            )
+
+                if self._closed:
+                    break
+                now = time.monotonic()
+                with self._lock:
+                    running = bool(self.bars)
+                if running or metrics or remote:
+                    idle_since = None
+                    continue
+                if idle_since is None:
+                    idle_since = now
+                elif now - idle_since >= self.idle_timeout:
+                    with self._lock:
+                        # Checked again under the lock so that a new bar or metric
+                        # starts a new thread
+                        if (
+                            not self.bars
+                            and not self._remote
+                            and not self.metrics.pending()
+                        ):
+                            self.thread = None
+                            break
+        finally:
+            await stack.aclose()
+            self.session_id = None
+
+        # A metric logged while stopping may have seen the old thread
+        if self.metrics.pending():
+            with self._lock:
+                if self.thread is None:
+                    self._start()
+
+
+class _Forwarder:
+    """
+    Stands in for the session web socket on ranks that aren't the aggregation leader
+    """
+
+    def __init__(self, aggregator: "Aggregator") -> None:
+        self.aggregator = aggregator
+
+    async def send(self, data: Dict[str, Any]) -> None:
+        self.aggregator.forward_update(data)
+
+
+def get_reporter(instance: Optional["Instance"] = None) -> ProgressReporter:
+    """
+    Get the shared progress reporter for an instance (the default instance if not given)
+    """
+    if instance is None:
+        instance = get_instance()
+    return instance.progress_reporter
+
+
+def progress(
+    iterable: Optional[Iterable[T]] = None,
+    total: Optional[int] = None,
+    desc: Optional[str] = None,
+    instance: Optional["Instance"] = None,
+) -> ProgressBar[T]:
+    """
+    Wrap an iterable to see its progress (count, rate and ETA) in the LMK app, like
+    ``tqdm``. Each iteration only increments a counter; updates are sent over a session
+    web socket by a shared background thread at most once a second, and a session is
+    only created for loops that run longer than that.
+
+    <details><summary>Usage Example</summary>
+    <p>
+
+    ```python
+    import lmk
+
+    for batch in lmk.progress(loader, desc="epoch 1"):
+        train(batch)
+
+    # Or update it manually
+    with lmk.progress(total=len(files)) as bar:
+        for chunk in upload(files):
+            bar.update(len(chunk))
+    ```
+    </p>
+    </details>
+
+    :param iterable: The iterable to wrap. Leave it out to call ``update()`` manually
+    :type iterable: Iterable, optional
+    :param total: The expected number of iterations. Defaults to ``len(iterable)`` if
+    available
+    :type total: int, optional
+    :param desc: A description of the task, shown in the LMK app
+    :type desc: str, optional
+    :param instance: The instance to report progress with. Defaults to the default instance
+    :type instance: Instance, optional
+
+    :return: A progress bar, which can be iterated over or used as a context manager
+    :rtype: ProgressBar
+    """
+    return ProgressBar(get_reporter(instance), iterable, total=total, desc=desc)
+
+
+def log_metric(
+    name: str,
+    value: float,
+    step: Optional[float] = None,
+    instance: Optional["Instance"] = None,
+) -> None:
+    """
+    Log a value of a metric, such as the loss or throughput of a training run, to see it
+    in the LMK app next to the progress of your loops. Values are stored in fixed-size
+    buffers, so memory use stays constant however long the process runs, and they're
+    sent over the same session as ``lmk.progress()`` at most once a second, downsampled
+    to the minimum, maximum and last value of up to 100 buckets per metric.
+
+    <details><summary>Usage Example</summary>
+    <p>
+
+    ```python
+    import lmk
+
+    for step, batch in enumerate(lmk.progress(loader)):
+        loss = train(batch)
+        lmk.log_metric("loss", loss, step=step)
+    ```
+    </p>
+    </details>
+
+    :param name: The name of the metric
+    :type name: str
+    :param value: The value to log
+    :type value: float
+    :param step: The step (e.g. iteration or epoch) the value is for. Defaults to the
+    number of values logged for this metric so far
+    :type step: float, optional
+    :param instance: The instance to report metrics with. Defaults to the default instance
+    :type instance: Instance, optional
+
+    :return: This method does not return anything
+    :rtype: None
+    """
+    get_reporter(instance).log_metric(name, value, step)
@@ -0,0 +1,376 @@
+import asyncio
+import atexit
+import concurrent.futures
+import contextlib
+import logging
+import queue
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from lmk import exc
+from lmk.utils.asyncio import asyncio_event
+
+if TYPE_CHECKING:
+    from lmk.api_client import ApiClient
+    from lmk.instance import Instance
+
+
+LOGGER = logging.getLogger(__name__)
+
+QueueItem = Tuple["Instance", Dict[str, Any], concurrent.futures.Future]
+
+MESSAGE_SEPARATORS = {
+    "text/markdown": "\n\n---\n\n",
+    "text/plain": "\n\n",
+}
+
+
+def _coalesce_key(instance: "Instance", kwargs: Dict[str, Any]) -> Tuple[Any, ...]:
+    channels = kwargs.get("notification_channels")
+    return (
+        # Notifications for different instances are never combined, since they may
+        # be for different accounts
+        id(instance),
+        kwargs.get("content_type"),
+        kwargs.get("notify"),
+        None if channels is None else tuple(channels),
+        kwargs.get("job"),
+    )
+
+
+class NotificationSender:
+    """
+    Background sender for notifications sent with ``notify(..., deferred=True)``. Events
+    are put on a bounded in-memory queue and sent from a background thread, so the
+    caller's overhead is constant no matter how slow the API is. Each call returns a
+    future that resolves to the ``EventResponse``.
+
+    At most ``max_concurrency`` requests are in flight at once. With ``coalesce=True``,
+    events queued within ``batch_window`` seconds of one another that have the same
+    content type and notification channels are combined into a single event (up to
+    ``max_batch_size`` messages each), so each one doesn't get its own event.
+
+    A sender can be shared by several instances that use the same ``client`` (see
+    ``InstancePool``), so that they share one background thread and event loop; each
+    notification is sent with the instance that queued it.
+
+    <details><summary>Usage Example</summary>
+    <p>
+
+    ```python
+    import lmk
+
+    futures = [lmk.notify(f"Shard {i} failed", deferred=True) for i in range(100)]
+
+    # Wait for all queued notifications to be sent
+    lmk.flush(timeout=10)
+    ```
+    </p>
+    </details>
+    """
+
+    def __init__(
+        self,
+        instance: Optional["Instance"] = None,
+        max_queue_size: int = 1000,
+        batch_window: float = 0.25,
+        max_batch_size: int = 20,
+        max_concurrency: int = 4,
+        coalesce: bool = False,
+        flush_timeout: float = 5.0,
+        drain_interval: float = 30.0,
+        client: Optional["ApiClient"] = None,
+    ) -> None:
+        if client is None:
+            if instance is None:
+                raise ValueError("Either instance or client must be given")
+            client = instance.client
+        self.instance = instance
+        self.client = client
+        self.max_queue_size = max_queue_size
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self.coalesce = coalesce
+        self.flush_timeout = flush_timeout
+        self.drain_interval = drain_interval
+
+        self.queue: "queue.Queue[QueueItem]" = queue.Queue(max_queue_size)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._closed = False
+        self._idle = threading.Condition()
+        self._in_flight = 0
+        self._start_lock = threading.Lock()
+        # Instances whose outboxes should be drained
+        self._drain_requested: Set["Instance"] = set()
+        self._drain_task: Optional[asyncio.Task] = None
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        if self.loop is not None:
+            return self.loop
+
+        with self._start_lock:
+            if self.loop is not None:
+                return self.loop
+
+            loop = asyncio.new_event_loop()
+            self._wakeup = asyncio_event(loop=loop)
+            self.thread = threading.Thread(
+                target=self._run,
+                args=(loop,),
+                name="lmk-notification-sender",
+                daemon=True,
+            )
+            self.thread.start()
+            self.loop = loop
+            atexit.register(self.close)
+            return loop
+
+    def _instance(self, instance: Optional["Instance"]) -> "Instance":
+        if instance is None:
+            instance = self.instance
+        if instance is None:
+            raise ValueError("instance must be given for a shared sender")
+        return instance
+
+    def submit(
+        self, instance: Optional["Instance"] = None, **kwargs
+    ) -> concurrent.futures.Future:
+        """
+        Queue a notification to be sent in the background. ``kwargs`` are passed
+        through to ``Instance.notify()``.
+
+        :param instance: The instance to send the notification with. Defaults to the
+        sender's instance
+        :type instance: Instance, optional
+
+        :return: A future that resolves to the ``EventResponse`` for the sent event
+        :rtype: concurrent.futures.Future
+        """
+        instance = self._instance(instance)
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        if self._closed:
+            future.set_exception(exc.NotificationSenderClosed())
+            return future
+
+        with self._idle:
+            try:
+                self.queue.put_nowait((instance, kwargs, future))
+            except queue.Full:
+                LOGGER.warning(
+                    "Notification queue is full (%d items); dropping notification",
+                    self.max_queue_size,
+                )
+                future.set_exception(exc.NotificationQueueFull(self.max_queue_size))
+                return future
+            self._in_flight += 1
+
+        loop = self._ensure_started()
+        loop.call_soon_threadsafe(self._wakeup.set)  # type: ignore
+        return future
+
+    def drain_outbox(self, instance: Optional["Instance"] = None) -> None:
+        """
+        Deliver entries in an instance's outbox (defaulting to the sender's instance)
+        from the background thread (see ``Instance.drain_outbox()``), every
+        ``drain_interval`` seconds until it's empty
+        """
+        instance = self._instance(instance)
+        if self._closed:
+            return
+        loop = self._ensure_started()
+        loop.call_soon_threadsafe(self._request_drain, instance)
+
+    def _request_drain(self, instance: "Instance") -> None:
+        self._drain_requested.add(instance)
+        self._wakeup.set()  # type: ignore
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for all queued notifications to be sent.
+
+        :param timeout: The maximum time to wait, in seconds. If ``None``, wait indefinitely.
+        :type timeout: float, optional
+
+        :return: ``True`` if all queued notifications were sent (or failed) before the timeout
+        :rtype: bool
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self._in_flight == 0, timeout)
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """
+        Stop accepting new notifications and wait up to ``timeout`` seconds (defaults
+        to ``flush_timeout``) for queued ones to be sent.
+
+        :return: ``True`` if all queued notifications were sent before the timeout
+        :rtype: bool
+        """
+        if timeout is None:
+            timeout = self.flush_timeout
+        self._closed = True
+        flushed = self.flush(timeout)
+        if not flushed:
+            LOGGER.warning(
+                "Timed out after %.2fs with %d notifications unsent",
+                timeout,
+                self._in_flight,
+            )
+
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wakeup.set)  # type: ignore
+            if (
+                self.thread is not None
+                and self.thread is not threading.current_thread()
+            ):
+                self.thread.join(0 if not flushed else timeout)
+
+        atexit.unregister(self.close)
+
+        return flushed
+
+    def _done(self, count: int) -> None:
+        with self._idle:
+            self._in_flight -= count
+            if self._in_flight == 0:
+                self._idle.notify_all()
+
+    def _run(self, loop: asyncio.AbstractEventLoop) -> None:
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self._main())
+        except Exception:
+            LOGGER.exception("Error in notification sender")
+        finally:
+            loop.run_until_complete(self.client.transport.aclose())
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+    def _take_batch(self) -> List[List[QueueItem]]:
+        items: List[QueueItem] = []
+        while True:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+
+        if not self.coalesce:
+            return [[item] for item in items]
+
+        groups: Dict[Tuple[Any, ...], List[List[QueueItem]]] = {}
+        batches: List[List[QueueItem]] = []
+        for item in items:
+            group = groups.setdefault(_coalesce_key(item[0], item[1]), [])
+            if not group or len(group[-1]) >= self.max_batch_size:
+                group.append([])
+                batches.append(group[-1])
+            group[-1].append(item)
+
+        return batches
+
+    async def _send(self, batch: List[QueueItem]) -> None:
+        instance = batch[0][0]
+        kwargs = dict(batch[0][1])
+        if len(batch) > 1:
+            separator = MESSAGE_SEPARATORS.get(kwargs.get("content_type") or "", "\n\n")
+            kwargs["message"] = separator.join(item[1]["message"] for item in batch)
+
+        try:
+            # Deduplication and aggregation were already applied when the notification
+            # was queued
+            response = await instance.notify(  # type: ignore
+                **kwargs, async_req=True, dedupe=False, aggregate=False
+            )
+        except Exception as err:
+            LOGGER.debug("Failed to send deferred notification", exc_info=True)
+            for _, _, future in batch:
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(err)
+        else:
+            for _, _, future in batch:
+                if future.set_running_or_notify_cancel():
+                    future.set_result(response)
+        finally:
+            self._done(len(batch))
+
+    async def _drain(self) -> None:
+        loop = asyncio.get_running_loop()
+        # Instances whose outboxes still have entries
+        draining: Set["Instance"] = set()
+        try:
+            while not self._closed:
+                draining |= self._drain_requested
+                self._drain_requested.clear()
+                for instance in list(draining):
+                    try:
+                        delivered = await instance.drain_outbox(async_req=True)  # type: ignore
+                        if delivered:
+                            LOGGER.info(
+                                "Delivered %d requests from the outbox", delivered
+                            )
+                        remaining = await loop.run_in_executor(
+                            None, len, instance.outbox
+                        )
+                    except Exception:
+                        LOGGER.warning("Error draining outbox", exc_info=True)
+                        remaining = 1
+                    if not remaining:
+                        draining.discard(instance)
+                if not draining and not self._drain_requested:
+                    break
+                await asyncio.sleep(self.drain_interval)
+        finally:
+            self._drain_task = None
+
+    async def _main(self) -> None:
+        wakeup = self._wakeup
+        assert wakeup is not None
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        tasks = set()
+
+        async def send(batch: List[QueueItem]) -> None:
+            try:
+                await self._send(batch)
+            finally:
+                semaphore.release()
+
+        while True:
+            await wakeup.wait()
+            wakeup.clear()
+
+            if self._drain_requested and self._drain_task is None and not self._closed:
+                self._drain_task = asyncio.create_task(self._drain())
+
+            if self.queue.empty():
+                if self._closed:
+                    break
+                continue
+
+            # Give bursts of notifications a chance to accumulate so they
+            # can be coalesced
+            if self.coalesce and self.batch_window > 0 and not self._closed:
+                await asyncio.sleep(self.batch_window)
+
+            for batch in self._take_batch():
+                await semaphore.acquire()
+                task = asyncio.create_task(send(batch))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            if self._closed and self.queue.empty():
+                break
+
+        if tasks:
+            await asyncio.wait(tasks)
+
+        drain_task = self._drain_task
+        if drain_task is not None:
+            # Entries being delivered stay leased in the outbox, and are retried
+            # by the next drain once the lease expires
+            drain_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await drain_task
@@ -2,13 +2,20 @@ import asyncio
 import contextlib
 import inspect
 import logging
+import os
+import random
 import signal
 import sys
 import time
 from functools import partial, wraps
 from typing import Optional, Awaitable, Any, AsyncGenerator, List, Callable, Dict
 
-from lmk.utils.os import socket_exists
+from lmk.utils.os import (
+    socket_exists,
+    _open_lock_file,
+    try_lock_file,
+    unlock_file,
+)
 
 
 LOGGER = logging.getLogger(__name__)
@@ -146,6 +153,26 @@ async def wait_for_socket(
         raise TimeoutError
 
 
+@contextlib.asynccontextmanager
+async def async_file_lock(
+    path: str, poll_interval: float = 0.05
+) -> AsyncGenerator[None, None]:
+    """
+    Async version of ``file_lock()``. This polls for the lock rather than blocking
+    in a thread, so it can be cancelled while waiting without leaking the lock.
+    """
+    fd = _open_lock_file(path)
+    try:
+        while not try_lock_file(fd):
+            await asyncio.sleep(poll_interval)
+        try:
+            yield
+        finally:
+            unlock_file(fd)
+    finally:
+        os.close(fd)
+
+
 async def wait_for_fd(fd: int) -> None:
     loop = asyncio.get_running_loop()
     future: asyncio.Future = asyncio.Future()
@@ -216,6 +243,39 @@ def simple_retry_rule(
     return rule
 
 
+def jittered_backoff(failures: int, base: float = 0.5, cap: float = 30.0) -> float:
+    # "Full jitter": a random delay up to the exponential backoff, so that many
+    # clients disconnected at once don't all reconnect at the same moment
+    return random.uniform(0, min(cap, base * 2 ** min(failures, 30)))
+
+
+def deadline_retry_rule(
+    deadline: Optional[float] = 24 * 3600,
+    backoff: Callable[[int], float] = jittered_backoff,
+    is_permanent: Optional[Callable[[Exception], bool]] = None,
+):
+    """
+    Retry without a limit on attempts until ``deadline`` seconds have passed since
+    the first failure in a row, or forever if ``deadline`` is None. Errors that
+    ``is_permanent`` returns ``True`` for fail the same way every time, so they're
+    never retried.
+    """
+    first_failure = 0.0
+
+    def rule(failures: int, error: Exception):
+        nonlocal first_failure
+        if is_permanent is not None and is_permanent(error):
+            return None
+        now = time.monotonic()
+        if failures == 1:
+            first_failure = now
+        elif deadline is not None and now - first_failure >= deadline:
+            return None
+        return backoff(failures)
+
+    return rule
+
+
 RetryRule = Callable[[int, Exception], Optional[float]]
 
 
@@ -0,0 +1,149 @@
+"""
+JSON encoding for web socket and daemon traffic. The fastest available library is
+used: ``orjson``, then ``msgspec``, falling back to the standard library. Set
+``LMK_JSON_CODEC`` to ``orjson``, ``msgspec`` or ``json`` to choose one explicitly.
+
+Values the fast libraries can't encode (e.g. integers over 64 bits or unusual types)
+are encoded with the standard library instead, so the output is the same JSON
+regardless of the codec, except that ``NaN`` and infinity are encoded as ``null`` (and
+``orjson`` decodes integers over 64 bits as floats).
+"""
+
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, Optional, Union
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class JSONCodec:
+    """
+    Encodes and decodes JSON with the standard library. Subclasses use faster libraries.
+    """
+
+    name = "json"
+
+    def dumps(self, obj: Any) -> str:
+        """
+        Encode ``obj`` as a JSON string
+        """
+        return json.dumps(obj)
+
+    def dumpb(self, obj: Any) -> bytes:
+        """
+        Encode ``obj`` as UTF-8 encoded JSON
+        """
+        return json.dumps(obj).encode()
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        """
+        Decode JSON from a string or bytes
+
+        :raises ValueError: If ``data`` isn't valid JSON
+        """
+        return json.loads(data)
+
+
+class OrjsonCodec(JSONCodec):
+    name = "orjson"
+
+    def __init__(self) -> None:
+        import orjson  # type: ignore
+
+        self._dumps = orjson.dumps
+        self._loads = orjson.loads
+        self._option = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj: Any) -> str:
+        return self.dumpb(obj).decode()
+
+    def dumpb(self, obj: Any) -> bytes:
+        try:
+            return self._dumps(obj, option=self._option)
+        except TypeError:
+            return super().dumpb(obj)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        # orjson.JSONDecodeError is a ValueError
+        return self._loads(data)
+
+
+class MsgspecCodec(JSONCodec):
+    name = "msgspec"
+
+    def __init__(self) -> None:
+        import msgspec  # type: ignore
+
+        self._encode = msgspec.json.Encoder().encode
+        self._decode = msgspec.json.Decoder().decode
+        self._encode_errors = (TypeError, OverflowError, msgspec.EncodeError)
+        self._decode_error = msgspec.DecodeError
+
+    def dumps(self, obj: Any) -> str:
+        return self.dumpb(obj).decode()
+
+    def dumpb(self, obj: Any) -> bytes:
+        try:
+            return self._encode(obj)
+        except self._encode_errors:
+            return super().dumpb(obj)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        try:
+            return self._decode(data)
+        except self._decode_error as err:
+            raise ValueError(str(err)) from err
+
+
+CODECS: Dict[str, Callable[[], JSONCodec]] = {
+    "orjson": OrjsonCodec,
+    "msgspec": MsgspecCodec,
+    "json": JSONCodec,
+}
+
+_codec: Optional[JSONCodec] = None
+
+
+def _load_codec() -> JSONCodec:
+    name = os.getenv("LMK_JSON_CODEC")
+    if name:
+        if name not in CODECS:
+            LOGGER.warning(
+                "Unknown LMK_JSON_CODEC %r; expected one of %s", name, list(CODECS)
+            )
+        else:
+            try:
+                return CODECS[name]()
+            except ImportError:
+                LOGGER.warning("LMK_JSON_CODEC is %r, but it isn't installed", name)
+
+    for factory in CODECS.values():
+        try:
+            return factory()
+        except ImportError:
+            continue
+    return JSONCodec()
+
+
+def get_codec() -> JSONCodec:
+    """
+    Get the JSON codec used for web socket and daemon traffic
+    """
+    global _codec
+    if _codec is None:
+        _codec = _load_codec()
+        LOGGER.debug("Using %s for JSON", _codec.name)
+    return _codec
+
+
+def set_codec(codec: Union[str, JSONCodec]) -> None:
+    """
+    Set the JSON codec used for web socket and daemon traffic, either by name
+    (``orjson``, ``msgspec`` or ``json``) or as a ``JSONCodec`` instance
+
+    :raises ImportError: If the named library isn't installed
+    """
+    global _codec
+    _codec = CODECS[codec]() if isinstance(codec, str) else codec
@@ -5,6 +5,11 @@ import signal
 import stat
 from typing import Callable, Generator, List, Optional
 
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
 
 LOGGER = logging.getLogger(__name__)
 
@@ -52,3 +57,48 @@ def read_last_lines(
                 lines.pop(0)
 
         return lines
+
+
+def _open_lock_file(path: str) -> int:
+    dirname = os.path.dirname(path)
+    if dirname and not os.path.exists(dirname):
+        os.makedirs(dirname, exist_ok=True)
+    return os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+
+
+def try_lock_file(fd: int) -> bool:
+    """
+    Attempt to take an exclusive lock on an open file without blocking. Always
+    succeeds on platforms without ``fcntl``.
+    """
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+def unlock_file(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+@contextlib.contextmanager
+def file_lock(path: str) -> Generator[None, None, None]:
+    """
+    Hold an exclusive advisory lock on ``path`` (created if it doesn't exist) for the
+    duration of the context, blocking until it's available. This serializes access
+    across processes as well as threads, since each call opens its own file descriptor.
+    """
+    fd = _open_lock_file(path)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            unlock_file(fd)
+    finally:
+        os.close(fd)
@@ -1,19 +1,33 @@
 import asyncio
+import collections
 import contextlib
-import json
+import copy
 import logging
-from typing import Any, Optional, AsyncGenerator
+import time
+from typing import (
+    Any,
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Union,
+    cast,
+)
 
 import aiohttp
 from blinker import signal
 
-from lmk.utils.blinker import wait_for_signal
+from lmk import exc
+from lmk.utils.codec import get_codec
 from lmk.utils.asyncio import (
     async_retry,
     RetryRule,
-    asyncio_queue,
     asyncio_event,
     asyncio_future,
+    asyncio_lock,
 )
 
 
@@ -27,31 +41,107 @@ ws_disconnected = signal("ws-disconnected")
 ws_closed = signal("ws-closed")
 
 
+OVERFLOW_POLICIES = ("block", "drop-oldest", "coalesce")
+
+# Handshake responses that mean reconnecting won't help: the access token was
+# rejected or the endpoint doesn't exist
+PERMANENT_HANDSHAKE_STATUSES = {401, 403, 404}
+
+
+class _Pending:
+    """
+    A message waiting to be sent, and the futures of the ``send()`` calls waiting on it
+    """
+
+    __slots__ = ("data", "key", "futures")
+
+    def __init__(self, data: Any, key: Any, futures: List[asyncio.Future]) -> None:
+        self.data = data
+        self.key = key
+        self.futures = futures
+
+
 class WebSocket:
     """
-    Wrapper for aiohttp's web socket interface that supports reconnecting on failures
+    Wrapper for aiohttp's web socket interface that supports reconnecting on failures.
+
+    Messages are sent from a background task through a queue of at most
+    ``max_queue_size`` messages. Everything queued when the task wakes up is written in
+    one batch. ``overflow`` sets what happens when the queue is full:
+
+    - ``block``: ``send()`` waits for space and ``send_nowait()`` raises ``WSQueueFull``
+    - ``drop-oldest``: the oldest queued message is dropped; ``send()`` calls waiting
+      on it raise ``WSMessageDropped``
+    - ``coalesce``: a message sent with a ``key`` replaces a queued message with the
+      same key, e.g. the previous state of a progress bar, so only the latest is sent.
+      Otherwise the same as ``block``.
+
+    If the connection fails, it's reconnected according to ``retry_rule``; pass a
+    function as ``url`` to get a new URL for each connection, e.g. with a fresh access
+    token. Messages are always written in order; ones that weren't written before the
+    connection failed are written after reconnecting. Messages that were written may
+    still not have reached the server, and aren't sent again: the session protocol has
+    no acknowledgements, so there's no way to tell which ones did. Senders that need
+    the server to have everything should send their full state again on
+    ``ws_connected``, as ``StateChannel`` and progress reporters do. ``handshake``
+    returns a message that's written before anything else on each connection.
+
+    When the context exits, queued messages are written for up to ``close_timeout``
+    seconds; any still queued after that (e.g. because the server is unreachable) are
+    dropped. Closing the web socket also stops any reconnect attempts in progress.
     """
 
     def __init__(
         self,
         session: aiohttp.ClientSession,
-        url: str,
+        url: Union[str, Callable[[], Awaitable[str]]],
         retry_rule: Optional[RetryRule] = None,
         loop: Optional[asyncio.AbstractEventLoop] = None,
+        max_queue_size: int = 1000,
+        overflow: str = "block",
+        handshake: Optional[Callable[[], Any]] = None,
+        close_timeout: float = 10.0,
         **kwargs,
     ) -> None:
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"overflow must be one of {OVERFLOW_POLICIES}, got {overflow!r}"
+            )
         self.session = session
         self.url = url
         self.kwargs = kwargs
         self.retry_rule = retry_rule
         self.loop = loop
+        self.max_queue_size = max_queue_size
+        self.overflow = overflow
+        self.handshake = handshake
+        self.close_timeout = close_timeout
+        # Number of messages dropped because the queue was full
+        self.dropped = 0
+        # Number of times the connection was re-established
+        self.reconnects = 0
 
-        self.queue = asyncio_queue(loop=loop)
         self.ws: Optional[aiohttp.ClientWebSocketResponse] = None
         self.ws_ctx = None
         self.send_task: Optional[asyncio.Task] = None
         self.close_event = asyncio_event(loop=loop)
 
+        self._pending: Deque[_Pending] = collections.deque()
+        # Incremented on each connection, so that a failure seen by both the sender and
+        # the receiver only causes one reconnect
+        self._generation = 0
+        self._reconnect_lock = asyncio_lock(loop=loop)
+        self._reconnect_error: Optional[BaseException] = None
+        # Queued messages by key, for the coalesce policy
+        self._keyed: Dict[Any, _Pending] = {}
+        # Set when there are messages to send, the web socket connects or it's closed
+        self._wakeup = asyncio_event(loop=loop)
+        # Set when the queue has space, and when nothing is queued or being written
+        self._space = asyncio_event(loop=loop)
+        self._space.set()
+        self._idle = asyncio_event(loop=loop)
+        self._idle.set()
+
     def _check_state(self, initialized: bool) -> None:
         if self.ws is None and initialized:
             raise RuntimeError("Context not initialized")
@@ -60,6 +150,7 @@ class WebSocket:
 
     async def close(self) -> None:
         self.close_event.set()
+        self._wakeup.set()
         if self.send_task is not None:
             await self.send_task
         if self.ws is not None:
@@ -71,19 +162,65 @@ class WebSocket:
         @async_retry(rule=self.retry_rule)
         async def init():
             try:
-                self.ws_ctx = self.session.ws_connect(self.url, **self.kwargs)
+                url = self.url if isinstance(self.url, str) else await self.url()
+                self.ws_ctx = self.session.ws_connect(url, **self.kwargs)
                 self.ws = await self.ws_ctx.__aenter__()
+                if self.handshake is not None:
+                    await self.ws.send_str(get_codec().dumps(self.handshake()))
                 LOGGER.debug("Initialized web socket")
             except:
-                LOGGER.exception("Web socket error")
+                LOGGER.warning("Web socket error", exc_info=True)
+                if self.ws_ctx is not None:
+                    with contextlib.suppress(Exception):
+                        await self.ws_ctx.__aexit__(None, None, None)
                 self.ws_ctx = None
                 self.ws = None
                 raise
             else:
+                self._generation += 1
+                self._wakeup.set()
                 ws_connected.send(self)
 
         await init()
 
+    async def _reconnect(self, generation: int) -> None:
+        async with self._reconnect_lock:
+            if self._reconnect_error is not None:
+                raise self._reconnect_error
+            if self._generation != generation or self.close_event.is_set():
+                # Already reconnected after the failure that was seen, or closing
+                return
+            await self._teardown()
+            try:
+                connected = await self._until_closed(self._setup())
+            except Exception as err:
+                self._reconnect_error = err
+                raise
+            if connected:
+                self.reconnects += 1
+
+    async def _until_closed(self, coro: Awaitable[Any]) -> bool:
+        """
+        Run ``coro`` until it finishes or the web socket is closed, whichever is first
+
+        :return: ``True`` if ``coro`` finished, ``False`` if it was cancelled
+        :rtype: bool
+        """
+        task = asyncio.ensure_future(coro)
+        closed = asyncio.ensure_future(self.close_event.wait())
+        try:
+            await asyncio.wait([task, closed], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            closed.cancel()
+            if not task.done():
+                task.cancel()
+                # Let a connection attempt clean up before the web socket is torn down
+                await asyncio.wait([task])
+        if task.cancelled():
+            return False
+        await task
+        return True
+
     async def _teardown(self) -> None:
         if self.ws_ctx is None:
             return
@@ -98,35 +235,112 @@ class WebSocket:
         return self
 
     async def __aexit__(self, exc_type, exc_value, tb):
-        await self.queue.join()
+        try:
+            await asyncio.wait_for(self.flush(), self.close_timeout)
+        except asyncio.TimeoutError:
+            LOGGER.warning(
+                "Timed out after %.2fs writing to web socket; dropping %d messages",
+                self.close_timeout,
+                len(self._pending),
+            )
+        self.close_event.set()
 
         self.send_task.cancel()
         with contextlib.suppress(asyncio.CancelledError):
             await self.send_task
+        self._fail_pending(WSDisconnected())
 
-        await self._teardown()
+        # Waits for a reconnect in progress to stop
+        async with self._reconnect_lock:
+            await self._teardown()
         ws_closed.send(self)
 
-    async def send(self, data: Any) -> None:
+    def _enqueue(self, data: Any, key: Any, future: Optional[asyncio.Future]) -> bool:
+        if key is not None and self.overflow == "coalesce":
+            pending = self._keyed.get(key)
+            if pending is not None:
+                pending.data = data
+                if future is not None:
+                    pending.futures.append(future)
+                return True
+
+        if len(self._pending) >= self.max_queue_size:
+            if self.overflow != "drop-oldest":
+                return False
+            dropped = self._pending.popleft()
+            if self._keyed.get(dropped.key) is dropped:
+                del self._keyed[dropped.key]
+            _fail_futures(dropped.futures, WSMessageDropped())
+            self.dropped += 1
+            LOGGER.debug("Web socket queue is full; dropped a message")
+
+        pending = _Pending(data, key, [] if future is None else [future])
+        self._pending.append(pending)
+        if key is not None and self.overflow == "coalesce":
+            self._keyed[key] = pending
+        if len(self._pending) >= self.max_queue_size:
+            self._space.clear()
+        self._idle.clear()
+        self._wakeup.set()
+        return True
+
+    async def send(self, data: Any, key: Any = None) -> None:
         """
-        Send a message to the web socket
+        Send a message to the web socket, waiting until it has been written
 
         :param data: The data to send to the web socket. This must be JSON serializable.
         :type data: Any
+        :param key: With the ``coalesce`` overflow policy, a queued message with the same
+        key is replaced by this one. Defaults to ``None``
+        :type key: Any, optional
 
         :return: This method does not return anything
         :rtype: None
         """
         future = asyncio_future(loop=self.loop)
-        await self.queue.put((data, future))
+        while not self._enqueue(data, key, future):
+            await self._space.wait()
         await future
 
+    def send_nowait(self, data: Any, key: Any = None) -> None:
+        """
+        Queue a message to be sent to the web socket without waiting for it to be
+        written. Errors writing it are only logged.
+
+        :param data: The data to send to the web socket. This must be JSON serializable.
+        :type data: Any
+        :param key: With the ``coalesce`` overflow policy, a queued message with the same
+        key is replaced by this one. Defaults to ``None``
+        :type key: Any, optional
+
+        :return: This method does not return anything
+        :rtype: None
+        """
+        if not self._enqueue(data, key, None):
+            raise WSQueueFull(self.max_queue_size)
+
+    async def flush(self) -> None:
+        """
+        Wait until all queued messages have been written, or the sender has stopped
+        """
+        if self._idle.is_set() or self.send_task is None or self.send_task.done():
+            return
+        idle_task = asyncio.create_task(self._idle.wait())
+        try:
+            await asyncio.wait(
+                [idle_task, self.send_task], return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            idle_task.cancel()
+
     async def _iterate(self) -> AsyncGenerator[Any, None]:
         self._check_state(True)
 
+        ws = cast(aiohttp.ClientWebSocketResponse, self.ws)
+        loads = get_codec().loads
         close_message: Optional[aiohttp.WSMessage] = None
         while True:
-            message = await self.ws.receive()  # type: ignore
+            message = await ws.receive()
             LOGGER.debug("Received message %s", message)
             if message.type == aiohttp.WSMsgType.CLOSED:
                 if close_message is None and not self.close_event.is_set():
@@ -139,8 +353,8 @@ class WebSocket:
                 raise WSConnectionError(message.data)
             if message.type == aiohttp.WSMsgType.TEXT:
                 try:
-                    decoded = json.loads(message.data)
-                except json.JSONDecodeError as err:
+                    decoded = loads(message.data)
+                except ValueError as err:
                     raise InvalidWSMessage(message.data) from err
                 yield decoded
                 continue
@@ -154,14 +368,16 @@ class WebSocket:
 
     async def _iterate_with_retry(self):
         while True:
+            generation = self._generation
             try:
                 async for item in self._iterate():
                     yield item
                 break
             except (WSDisconnected, WSCloseError, WSConnectionError) as error:
                 LOGGER.error("WS Disconnected. Reconnecting (%r)", error)
-                await self._teardown()
-                await self._setup()
+                await self._reconnect(generation)
+                if self.close_event.is_set():
+                    break
             except GeneratorExit:
                 break
             except asyncio.CancelledError:
@@ -171,54 +387,74 @@ class WebSocket:
                 raise
 
     async def _sender(self):
-        buffer = []
-
-        if self.ws is None:
-            connect_task = wait_for_signal(ws_connected, self)
-        else:
-            connect_task = asyncio_future(loop=self.loop)
-            connect_task.set_result(None)
-
-        async def queue_get():
-            try:
-                return await self.queue.get()
-            except RuntimeError as error:
-                if str(error) == "Event loop is closed":
-                    return None
-                raise
-
-        queue_task = asyncio.create_task(queue_get())
-
-        close_task = asyncio.create_task(self.close_event.wait())
+        wakeup = self._wakeup
+        pending = self._pending
+        dumpb = get_codec().dumpb
+        text = aiohttp.WSMsgType.TEXT
 
         while True:
-            LOGGER.debug("Before loop")
-            await asyncio.wait(
-                [connect_task, queue_task, close_task],
-                return_when=asyncio.FIRST_COMPLETED,
-            )
-            LOGGER.debug(
-                "Loop; connected: %s, queue: %s", connect_task.done(), queue_task.done()
-            )
-
-            if queue_task.done():
-                result = queue_task.result()
-                if result is not None:
-                    buffer.append(queue_task.result())
-                queue_task = asyncio.create_task(queue_get())
-
-            while buffer and self.ws is not None:
-                item, future = buffer.pop(0)
-                await self.ws.send_json(item)
-                future.set_result(None)
-                self.queue.task_done()
-
-            if connect_task.done():
-                connect_task = wait_for_signal(ws_connected, self)
-
-            if close_task.done():
+            await wakeup.wait()
+            wakeup.clear()
+
+            ws = self.ws
+            if pending and ws is not None:
+                generation = self._generation
+                # Everything queued since the last wakeup is written in one go
+                batch = list(pending)
+                pending.clear()
+                self._keyed.clear()
+                self._space.set()
+
+                # Encoded messages are written as text frames directly, rather than
+                # being decoded to a str for send_str() only to be encoded again
+                send_frame = getattr(ws, "send_frame", None)
+                written = 0
+                try:
+                    for item in batch:
+                        if ws.closed:
+                            raise WSDisconnected
+                        data = dumpb(item.data)
+                        if send_frame is None:
+                            await ws.send_str(data.decode())
+                        else:
+                            await send_frame(data, text)
+                        written += 1
+                except (WSDisconnected, ConnectionError, aiohttp.ClientError) as err:
+                    LOGGER.warning("Web socket write failed. Reconnecting (%r)", err)
+                    # Unwritten messages keep their place ahead of anything queued
+                    # since, and are written after reconnecting
+                    pending.extendleft(reversed(batch[written:]))
+                    try:
+                        await self._reconnect(generation)
+                    except BaseException as reconnect_err:
+                        self._fail_pending(reconnect_err)
+                        raise
+                    wakeup.set()
+                except BaseException as err:
+                    for item in batch[written:]:
+                        _fail_futures(item.futures, err)
+                    self._fail_pending(err)
+                    raise
+                finally:
+                    for item in batch[:written]:
+                        for future in item.futures:
+                            if not future.done():
+                                future.set_result(None)
+                        item.futures = []
+
+            if not pending:
+                self._idle.set()
+
+            if self.close_event.is_set():
                 break
 
+    def _fail_pending(self, error: BaseException) -> None:
+        # Nothing more will be sent, so don't leave senders waiting
+        while self._pending:
+            _fail_futures(self._pending.popleft().futures, error)
+        self._keyed.clear()
+        self._space.set()
+
     async def __aiter__(self):
         """
         Iterate asynchronously through messages received by the web socket.
@@ -234,10 +470,152 @@ class WebSocket:
                 self.send_task.result()
 
 
+def is_permanent_ws_error(error: Exception) -> bool:
+    """
+    Check whether an error connecting to or reading from a web socket will happen the
+    same way every time, so reconnecting won't help. Everything else (connection
+    errors, timeouts, unexpected disconnects) is retried.
+    """
+    if isinstance(error, aiohttp.WSServerHandshakeError):
+        return error.status in PERMANENT_HANDSHAKE_STATUSES
+    return isinstance(error, (exc.NotLoggedIn, InvalidWSMessage))
+
+
+def _fail_futures(futures: List[asyncio.Future], error: BaseException) -> None:
+    for future in futures:
+        if future.done():
+            continue
+        if isinstance(error, asyncio.CancelledError):
+            future.cancel()
+        else:
+            future.set_exception(error)
+
+
+class StateChannel:
+    """
+    Sends a keyed state dictionary over a ``WebSocket``, sending only the keys whose
+    values changed since the last update rather than the full state each time; keys
+    that were removed are sent as ``None``. Session state is merged on the server, so
+    e.g. a notebook's cell text is only sent when it changes rather than with every
+    kernel state change.
+
+    The full state is sent with the first update, after the web socket reconnects, and
+    at least every ``resync_interval`` seconds, so that the server's copy can't drift
+    from the client's indefinitely.
+
+    <details><summary>Usage Example</summary>
+    <p>
+
+    ```python
+    async with instance.session_connect(session_id, False) as ws:
+        channel = StateChannel(ws)
+        await channel.update({"shellState": "busy", "cellText": text})
+        # Only sends {"shellState": "idle"}
+        await channel.update({"shellState": "idle", "cellText": text})
+    ```
+    </p>
+    </details>
+    """
+
+    def __init__(self, ws: WebSocket, resync_interval: float = 60.0) -> None:
+        self.ws = ws
+        self.resync_interval = resync_interval
+        self.last: Optional[Dict[str, Any]] = None
+        self.last_resync = 0.0
+        self._resyncs = 0
+        # Messages sent on a previous connection may not have arrived
+        ws_connected.connect(self._handle_connected, sender=ws)
+
+    def _handle_connected(self, sender: Any) -> None:
+        self.resync()
+
+    def resync(self) -> None:
+        """
+        Send the full state with the next update
+        """
+        self.last = None
+        self._resyncs += 1
+
+    def diff(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Get the keys of ``state`` that changed since the last update. Values are compared
+        with ``==``.
+        """
+        last = self.last
+        if last is None:
+            return dict(state)
+        delta = {
+            key: value
+            for key, value in state.items()
+            if key not in last or last[key] != value
+        }
+        for key in last:
+            if key not in state:
+                delta[key] = None
+        return delta
+
+    async def update(self, state: Dict[str, Any], full: bool = False) -> bool:
+        """
+        Send the changes in ``state`` since the last update.
+
+        :param state: The full current state; it must be JSON serializable
+        :type state: Dict[str, Any]
+        :param full: ``True`` to send the full state even if it didn't change.
+        Defaults to ``False``
+        :type full: bool, optional
+
+        :return: ``True`` if a message was sent, ``False`` if nothing changed
+        :rtype: bool
+        """
+        now = time.monotonic()
+        if full or now - self.last_resync >= self.resync_interval:
+            self.resync()
+
+        if self.last is None:
+            message = dict(state)
+            self.last_resync = now
+        else:
+            message = self.diff(state)
+            if not message:
+                return False
+
+        # Copied so that later changes to mutable values in the caller's state are
+        # detected
+        sent_state = copy.deepcopy(state)
+        resyncs = self._resyncs
+        try:
+            await self.ws.send(message)
+        except BaseException:
+            # The changes may not have been sent, so they're sent again with the
+            # full state next time
+            self.resync()
+            raise
+        # Unless the web socket reconnected in the meantime, which means the full state
+        # has to be sent again anyway
+        if self._resyncs == resyncs:
+            self.last = sent_state
+        return True
+
+
 class WSError(Exception):
     """ """
 
 
+class WSQueueFull(WSError):
+    """ """
+
+    def __init__(self, max_queue_size: int) -> None:
+        self.max_queue_size = max_queue_size
+        super().__init__(f"Web socket queue is full ({max_queue_size} messages)")
+
+
+class WSMessageDropped(WSError):
+    """ """
+
+    def __init__(self) -> None:
+        super().__init__("Message was dropped because the web socket queue was full")
+
+
 class WSDisconnected(WSError):
     """ """
 
@@ -0,0 +1,125 @@
+"""
+Compare the native aiohttp transport against the thread pool executor path
+for ``async_req=True`` API calls, using a local server that mimics ``POST /v1/event``.
+
+Usage: python scripts/bench_async_transport.py [--requests 1000] [--concurrency 50]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import tempfile
+import time
+from typing import List
+
+from aiohttp import web
+
+from lmk.instance import Instance
+
+
+EVENT_RESPONSE = {
+    "eventId": "evt_123",
+    "userId": "usr_123",
+    "actor": {"type": "APP", "actorId": "app_123", "name": "bench"},
+    "message": "hello",
+    "contentType": "text/plain",
+    "channels": [],
+    "createdAt": "2023-10-01T00:00:00Z",
+}
+
+
+def find_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("", 0))
+        return s.getsockname()[1]
+
+
+async def start_server(port: int, latency: float) -> web.AppRunner:
+    async def post_event(request: web.Request) -> web.Response:
+        await request.read()
+        if latency:
+            await asyncio.sleep(latency)
+        return web.json_response(EVENT_RESPONSE, status=201)
+
+    app = web.Application()
+    app.add_routes([web.post("/v1/event", post_event)])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_mode(
+    server_url: str, config_path: str, native: bool, requests: int, concurrency: int
+) -> None:
+    instance = Instance(
+        server_url=server_url,
+        config_path=config_path,
+        access_token="bench",
+        sync_config=False,
+    )
+    instance.client.native_async = native
+    instance.client.rate_limiter = None
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await instance.notify("hello", notify=False, async_req=True)
+            latencies.append(time.perf_counter() - start)
+
+    # Warm up connections/threads
+    await asyncio.gather(*[one() for _ in range(concurrency)])
+    latencies.clear()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(requests)])
+    elapsed = time.perf_counter() - start
+
+    if native:
+        await instance.client.transport.aclose()
+    instance.close()
+
+    print(
+        f"{'native' if native else 'executor':<10}"
+        f"{requests / elapsed:>10.1f} req/s"
+        f"{percentile(latencies, 50) * 1000:>10.2f} ms p50"
+        f"{percentile(latencies, 99) * 1000:>10.2f} ms p99"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.005)
+    args = parser.parse_args()
+
+    port = find_free_port()
+    runner = await start_server(port, args.latency)
+    server_url = f"http://127.0.0.1:{port}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config_path = os.path.join(tmp, "config")
+        with open(config_path, "w+"):
+            pass
+
+        try:
+            for native in [False, True]:
+                await run_mode(
+                    server_url, config_path, native, args.requests, args.concurrency
+                )
+        finally:
+            await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
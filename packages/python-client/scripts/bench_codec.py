@@ -0,0 +1,134 @@
+"""
+Measure messages per second encoded and decoded by each available JSON codec (see
+``lmk.utils.codec``) for typical session web socket payloads: a ``lmk run`` state
+update, a notebook state update with a large cell, a progress update with metrics, and
+an update echoed back by the server.
+
+Usage: python scripts/bench_codec.py [--seconds 0.5]
+"""
+
+import argparse
+import time
+from typing import Any, Callable, Dict, List
+
+from lmk.utils.codec import CODECS, JSONCodec
+
+
+PROCESS_STATE = {"notifyOn": "error", "notifyChannel": "ch_123", "exitCode": None}
+
+JUPYTER_STATE = {
+    "url": "http://localhost:8888/lab/tree/train.ipynb",
+    "notebookName": "train.ipynb",
+    "shellState": "busy",
+    "cellState": "running",
+    "cellText": "\n".join(
+        f"loss_{i} = model(batch[{i}]).mean()  # step {i}" for i in range(250)
+    ),
+    "cellError": None,
+    "executionNum": 42,
+    "cellStartedAt": "2024-01-31T12:00:00.123456",
+    "cellFinishedAt": None,
+    "notifyOn": "stop",
+    "notifyChannel": "ch_123",
+}
+
+PROGRESS = {
+    "progress": [
+        {
+            "id": i,
+            "desc": f"epoch {i}",
+            "n": 1234 * i,
+            "total": 50000,
+            "elapsed": 123.456,
+            "rate": 98.765,
+            "eta": 432.1,
+            "done": False,
+        }
+        for i in range(4)
+    ],
+    "metrics": {
+        name: {
+            "step": [float(step) for step in range(100)],
+            "min": [0.5 / (step + 1) for step in range(100)],
+            "max": [1.5 / (step + 1) for step in range(100)],
+            "last": [1.0 / (step + 1) for step in range(100)],
+        }
+        for name in ["loss", "val_loss", "lr"]
+    },
+}
+
+SERVER_UPDATE = {
+    "ok": True,
+    "message": {
+        "type": "update",
+        "session": {
+            "sessionId": "ses_123",
+            "name": "train.ipynb",
+            "state": {**JUPYTER_STATE, "type": "jupyter"},
+            "createdAt": "2024-01-31T12:00:00Z",
+            "lastUpdatedAt": "2024-01-31T12:05:00Z",
+        },
+    },
+}
+
+PAYLOADS: Dict[str, Any] = {
+    "process state": PROCESS_STATE,
+    "notebook state (10KB)": JUPYTER_STATE,
+    "progress + metrics": PROGRESS,
+    "server update": SERVER_UPDATE,
+}
+
+
+def rate(seconds: float, func: Callable[[], Any]) -> float:
+    # Calibrate a batch size so timing overhead doesn't dominate small payloads
+    count = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(count):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds / 10:
+            break
+        count *= 2
+
+    best = 0.0
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(count):
+            func()
+        best = max(best, count / (time.perf_counter() - start))
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=0.5)
+    args = parser.parse_args()
+
+    codecs: List[JSONCodec] = []
+    for name, factory in CODECS.items():
+        try:
+            codecs.append(factory())
+        except ImportError:
+            print(f"{name} is not installed")
+
+    header = "".join(f"{codec.name:>14}" for codec in codecs)
+    for payload_name, payload in PAYLOADS.items():
+        encoded = codecs[-1].dumpb(payload)
+        print(f"\n{payload_name} ({len(encoded)} bytes), messages/s")
+        print(f"{'':<10}{header}")
+        for operation in ["dumpb", "dumps", "loads"]:
+            row = f"{operation:<10}"
+            for codec in codecs:
+                if operation == "loads":
+                    data = codec.dumpb(payload)
+                    func: Callable[[], Any] = lambda: codec.loads(data)  # noqa: E731
+                else:
+                    method = getattr(codec, operation)
+                    func = lambda: method(payload)  # noqa: E731
+                row += f"{rate(args.seconds, func):>14,.0f}"
+            print(row)
+
+
+if __name__ == "__main__":
+    main()
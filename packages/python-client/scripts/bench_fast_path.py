@@ -0,0 +1,192 @@
+"""
+Measure the client-side CPU cost of ``notify()``, ``create_session()`` and widget channel
+syncs, comparing the generated model path (validated request models, ``to_dict()`` of
+every channel) against the direct dict encoding used now. Requests are answered with a
+canned response rather than going over the network, so only client overhead is measured.
+
+Usage: python scripts/bench_fast_path.py [--calls 5000] [--channels 20]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Callable
+
+import urllib3  # type: ignore
+
+from lmk.channel_cache import ChannelIndex
+from lmk.generated.api.event_api import EventApi
+from lmk.generated.api.session_api import SessionApi
+from lmk.generated.models.create_session_request import CreateSessionRequest
+from lmk.generated.models.create_session_request_state import (
+    CreateSessionRequestState,
+)
+from lmk.generated.models.event_request import (
+    EventNotificationConfiguration,
+    EventRequest,
+)
+from lmk.generated.models.notification_channel_response import (
+    NotificationChannelResponse,
+)
+from lmk.generated.models.process_session_state import ProcessSessionState
+from lmk.generated.rest import RESTResponse
+from lmk.instance import Instance
+
+
+ACTOR = {"type": "APP", "actorId": "app_123", "name": "bench"}
+
+EVENT_RESPONSE = {
+    "eventId": "evt_123",
+    "userId": "usr_123",
+    "actor": ACTOR,
+    "message": "hello",
+    "contentType": "text/plain",
+    "channels": [],
+    "createdAt": "2023-10-01T00:00:00Z",
+}
+
+STATE = {
+    "type": "process",
+    "hostname": "bench",
+    "command": "python train.py",
+    "pid": 1234,
+    "notifyOn": "stop",
+}
+
+SESSION_RESPONSE = {
+    "state": STATE,
+    "sessionId": "ses_123",
+    "name": "bench",
+    "type": "process",
+    "createdAt": "2023-10-01T00:00:00Z",
+    "createdByActor": ACTOR,
+    "lastUpdatedAt": "2023-10-01T00:00:00Z",
+    "lastUpdatedByActor": ACTOR,
+    "endedAt": None,
+    "endedByActor": None,
+}
+
+
+def make_channel(index: int) -> NotificationChannelResponse:
+    return NotificationChannelResponse.from_dict(
+        {
+            "payload": {"type": "email", "emailAddress": f"{index}@lmkapp.dev"},
+            "notificationChannelId": f"ch_{index}",
+            "name": f"Channel {index}",
+            "order": index,
+            "isDefault": index == 0,
+            "isManaged": False,
+            "isVerified": True,
+            "verificationRequired": False,
+            "createdAt": "2023-10-01T00:00:00Z",
+            "createdByActor": ACTOR,
+            "lastUpdatedAt": "2023-10-01T00:00:00Z",
+            "lastUpdatedByActor": ACTOR,
+        }
+    )
+
+
+def canned_request(method, url, **kwargs):
+    body = SESSION_RESPONSE if url.endswith("/v1/session") else EVENT_RESPONSE
+    return RESTResponse(
+        urllib3.HTTPResponse(
+            body=json.dumps(body).encode(),
+            status=201,
+            headers={"content-type": "application/json"},
+            preload_content=True,
+        )
+    )
+
+
+def measure(name: str, calls: int, func: Callable[[], None]) -> float:
+    for _ in range(min(100, calls)):
+        func()
+    start = time.process_time()
+    for _ in range(calls):
+        func()
+    per_call = (time.process_time() - start) / calls
+    print(f"{name:<28}{per_call * 1e6:>10.1f} us/call")
+    return per_call
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--channels", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config_path = os.path.join(tmp, "config")
+        with open(config_path, "w+"):
+            pass
+
+        instance = Instance(
+            config_path=config_path, access_token="bench", sync_config=False
+        )
+        instance.client.rate_limiter = None
+        instance.client.rest_client.request = canned_request
+        # Recording in the event ledger is measured separately below
+        ledger = instance.ledger
+        instance.ledger = None
+        headers = {"Authorization": "Bearer bench"}
+
+        def notify_models() -> None:
+            EventApi(instance.client).post_event(
+                EventRequest(
+                    message="hello",
+                    contentType="text/plain",
+                    notificationConfig=EventNotificationConfiguration(
+                        notify=True, channelIds=["ch_0"]
+                    ),
+                ),
+                _headers=headers,
+            )
+
+        def notify_fast() -> None:
+            instance.notify(
+                "hello", content_type="text/plain", notification_channels=["ch_0"]
+            )
+
+        def session_models() -> None:
+            SessionApi(instance.client).create_session(
+                CreateSessionRequest(
+                    name="bench",
+                    state=CreateSessionRequestState(
+                        actual_instance=ProcessSessionState(**STATE)
+                    ),
+                ),
+                _headers=headers,
+            )
+
+        def session_fast() -> None:
+            instance.create_session("bench", STATE)
+
+        print(f"{args.calls} calls, {args.channels} channels")
+        before = measure("notify (models)", args.calls, notify_models)
+        after = measure("notify (fast path)", args.calls, notify_fast)
+        print(f"{'':<28}{(1 - after / before) * 100:>9.1f}% less CPU")
+        instance.ledger = ledger
+        measure("notify (fast path + ledger)", args.calls, notify_fast)
+        instance.ledger = None
+
+        before = measure("create_session (models)", args.calls, session_models)
+        after = measure("create_session (fast path)", args.calls, session_fast)
+        print(f"{'':<28}{(1 - after / before) * 100:>9.1f}% less CPU")
+
+        channels = [make_channel(i) for i in range(args.channels)]
+        index = ChannelIndex(channels)
+        before = measure(
+            "channel sync (to_dict)",
+            args.calls,
+            lambda: [channel.to_dict() for channel in channels],
+        )
+        after = measure("channel sync (cached)", args.calls, index.dicts)
+        print(f"{'':<28}{(1 - after / before) * 100:>9.1f}% less CPU")
+
+        instance.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Measure the per-iteration overhead of ``lmk.progress()`` and ``lmk.log_metric()``
+compared to a bare loop. The reporter's background thread runs as usual, but with an
+instance that isn't logged in, so no session is created and only the cost on the
+iterating thread is measured.
+
+Usage: python scripts/bench_progress.py [--iterations 5000000] [--repeat 5]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from typing import Callable
+
+from lmk.instance import Instance
+from lmk.progress_bar import ProgressBar, ProgressReporter
+
+
+def best_of(repeat: int, func: Callable[[], None]) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=5_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    iterations = args.iterations
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config_path = os.path.join(tmp, "config")
+        with open(config_path, "w+"):
+            pass
+
+        instance = Instance(config_path=config_path, sync_config=False)
+        reporter = ProgressReporter(instance, interval=0.1)
+
+        def bare() -> None:
+            for _ in range(iterations):
+                pass
+
+        def wrapped() -> None:
+            for _ in ProgressBar(reporter, range(iterations)):
+                pass
+
+        def manual() -> None:
+            with ProgressBar(reporter, total=iterations) as bar:
+                for _ in range(iterations):
+                    bar.update()
+
+        def metric() -> None:
+            for step in range(iterations):
+                reporter.log_metric("loss", 0.5, step)
+
+        baseline = best_of(args.repeat, bare)
+        print(f"{iterations} iterations, best of {args.repeat}")
+        print(f"{'bare loop':<24}{baseline / iterations * 1e9:>8.1f} ns/iter")
+        for name, func in [
+            ("lmk.progress()", wrapped),
+            ("bar.update()", manual),
+            ("log_metric()", metric),
+        ]:
+            elapsed = best_of(args.repeat, func)
+            overhead = (elapsed - baseline) / iterations * 1e9
+            print(
+                f"{name:<24}{elapsed / iterations * 1e9:>8.1f} ns/iter"
+                f"  (+{overhead:.1f} ns)"
+            )
+
+        try:
+            from tqdm import tqdm  # type: ignore
+        except ImportError:
+            pass
+        else:
+
+            def with_tqdm() -> None:
+                for _ in tqdm(range(iterations), disable=False, mininterval=0.1):
+                    pass
+
+            elapsed = best_of(args.repeat, with_tqdm)
+            overhead = (elapsed - baseline) / iterations * 1e9
+            print(
+                f"{'tqdm':<24}{elapsed / iterations * 1e9:>8.1f} ns/iter"
+                f"  (+{overhead:.1f} ns)"
+            )
+
+        reporter.close()
+        instance.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Measure the throughput of ``WebSocket`` sends against a local aiohttp echo server.
+Each mode sends ``--messages`` state-sized messages and is timed until the server has
+echoed back every frame that was written, so the numbers include the sender's queueing,
+batching and write path. Raw ``aiohttp`` ``send_str()`` calls are included as a ceiling.
+
+Usage: python scripts/bench_ws.py [--messages 20000] [--size 200]
+"""
+
+import argparse
+import asyncio
+import json
+import socket
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+import aiohttp
+from aiohttp import web
+
+from lmk.utils.ws import WebSocket
+
+
+def find_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("", 0))
+        return s.getsockname()[1]
+
+
+async def start_server(port: int) -> web.AppRunner:
+    async def echo(request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for message in ws:
+            if message.type == aiohttp.WSMsgType.TEXT:
+                await ws.send_str(message.data)
+        return ws
+
+    app = web.Application()
+    app.add_routes([web.get("/ws", echo)])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+def make_message(i: int, size: int) -> Dict[str, Any]:
+    return {"seq": i, "key": i % 10, "shellState": "busy", "text": "x" * size}
+
+
+async def run_mode(
+    url: str,
+    name: str,
+    messages: int,
+    size: int,
+    send_all: Callable[[WebSocket], Awaitable[None]],
+    **kwargs: Any,
+) -> None:
+    async with aiohttp.ClientSession() as session:
+        async with WebSocket(session, url, **kwargs) as ws:
+            received = 0
+            last_seq = -1
+
+            async def receive() -> None:
+                nonlocal received, last_seq
+                async for message in ws:
+                    received += 1
+                    last_seq = message["seq"]
+                    if last_seq == messages - 1:
+                        return
+
+            receive_task = asyncio.create_task(receive())
+            start = time.perf_counter()
+            await send_all(ws)
+            await ws.flush()
+            await receive_task
+            elapsed = time.perf_counter() - start
+            await ws.close()
+
+    print(
+        f"{name:<28}{messages / elapsed:>12,.0f} msg/s"
+        f"{elapsed / messages * 1e6:>10.1f} us/msg"
+        f"{received:>10} frames"
+    )
+
+
+async def run_raw(url: str, messages: int, size: int) -> None:
+    async with aiohttp.ClientSession() as session:
+        async with session.ws_connect(url) as ws:
+            start = time.perf_counter()
+
+            async def receive() -> None:
+                async for message in ws:
+                    if json.loads(message.data)["seq"] == messages - 1:
+                        return
+
+            receive_task = asyncio.create_task(receive())
+            for i in range(messages):
+                await ws.send_str(json.dumps(make_message(i, size)))
+            await receive_task
+            elapsed = time.perf_counter() - start
+
+    print(
+        f"{'aiohttp send_str()':<28}{messages / elapsed:>12,.0f} msg/s"
+        f"{elapsed / messages * 1e6:>10.1f} us/msg"
+        f"{messages:>10} frames"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--size", type=int, default=200)
+    args = parser.parse_args()
+    messages, size = args.messages, args.size
+
+    port = find_free_port()
+    runner = await start_server(port)
+    url = f"http://127.0.0.1:{port}/ws"
+
+    async def sequential(ws: WebSocket) -> None:
+        for i in range(messages):
+            await ws.send(make_message(i, size))
+
+    async def concurrent(ws: WebSocket) -> None:
+        await asyncio.gather(*(ws.send(make_message(i, size)) for i in range(messages)))
+
+    async def nowait(ws: WebSocket) -> None:
+        for i in range(messages):
+            ws.send_nowait(make_message(i, size))
+            if i % 100 == 0:
+                # Yield to the sender as a producer in a real event loop would
+                await asyncio.sleep(0)
+
+    async def coalesced(ws: WebSocket) -> None:
+        for i in range(messages):
+            message = make_message(i, size)
+            # The last message isn't coalesced so the receiver knows when to stop
+            ws.send_nowait(message, key=None if i == messages - 1 else message["key"])
+            if i % 100 == 0:
+                await asyncio.sleep(0)
+
+    print(f"{messages} messages of ~{size} bytes")
+    try:
+        await run_raw(url, messages, size)
+        await run_mode(url, "send() sequential", messages, size, sequential)
+        await run_mode(url, "send() concurrent", messages, size, concurrent)
+        await run_mode(
+            url,
+            "send_nowait()",
+            messages,
+            size,
+            nowait,
+            max_queue_size=messages,
+        )
+        await run_mode(
+            url,
+            "send_nowait() coalesce",
+            messages,
+            size,
+            coalesced,
+            overflow="coalesce",
+        )
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,137 @@
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+from lmk.aggregation import Aggregator, RankInfo, detect_rank, format_summary
+from lmk.instance import Instance
+
+
+class FakeInstance:
+    aggregator = None
+
+    def __init__(self) -> None:
+        self.notifications = []
+
+    async def notify(self, message, **kwargs):
+        self.notifications.append((message, kwargs))
+
+
+def test_detect_rank(monkeypatch):
+    for name in ["RANK", "WORLD_SIZE", "LOCAL_RANK", "SLURM_PROCID", "SLURM_NTASKS"]:
+        monkeypatch.delenv(name, raising=False)
+    assert detect_rank() is None
+
+    monkeypatch.setenv("SLURM_PROCID", "5")
+    monkeypatch.setenv("SLURM_NTASKS", "8")
+    assert detect_rank() == RankInfo(5, 8, 5)
+
+    monkeypatch.setenv("RANK", "3")
+    monkeypatch.setenv("WORLD_SIZE", "4")
+    monkeypatch.setenv("LOCAL_RANK", "1")
+    assert detect_rank() == RankInfo(3, 4, 1)
+
+
+def test_format_summary():
+    events = [
+        {"rank": rank, "message": f"Shard failed at 2023-10-01 12:00:0{rank}"}
+        for rank in [0, 1, 2, 5]
+    ] + [{"rank": 7, "message": "Out of memory"}]
+    summary = format_summary(events, 8)
+    assert "**Notifications from 5 of 8 workers**" in summary
+    assert "- ranks 0-2, 5: Shard failed at 2023-10-01 12:00:00" in summary
+    assert "- rank 7: Out of memory" in summary
+
+
+def test_aggregation_over_socket():
+    instance = FakeInstance()
+    socket_path = os.path.join(tempfile.mkdtemp(), "agg.sock")
+
+    leader = Aggregator(
+        RankInfo(0, 4, 0),
+        instance,
+        socket_path=socket_path,
+        window=0.3,  # type: ignore
+    )
+    leader.start()
+    workers = [
+        Aggregator(RankInfo(rank, 4, rank), instance, socket_path=socket_path)  # type: ignore
+        for rank in range(1, 4)
+    ]
+    try:
+        for aggregator in [leader] + workers:
+            aggregator.submit(
+                f"Rank {aggregator.rank.rank} failed", "text/plain", None, True
+            )
+
+        deadline = time.monotonic() + 5
+        while not instance.notifications and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        for aggregator in workers + [leader]:
+            aggregator.close()
+
+    ((message, kwargs),) = instance.notifications
+    assert "**Notifications from 4 of 4 workers**" in message
+    assert "- ranks 0-3: Rank 0 failed" in message
+    assert kwargs["aggregate"] is False
+
+
+def test_aggregation_worker_retries_and_leader_exit():
+    instance = FakeInstance()
+    socket_path = os.path.join(tempfile.mkdtemp(), "agg.sock")
+
+    # The worker starts before the leader is listening, and reconnects on its own
+    worker = Aggregator(RankInfo(1, 2, 1), instance, socket_path=socket_path)  # type: ignore
+    worker.submit("Rank 1 failed", "text/plain", None, True, "nightly")
+    leader = Aggregator(
+        RankInfo(0, 2, 0),
+        instance,
+        socket_path=socket_path,
+        window=60,  # type: ignore
+    )
+    leader.start()
+    try:
+        deadline = time.monotonic() + 5
+        while not leader.events and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert leader.events
+
+        # The worker's connection is still open, but the leader sends its summary
+        # on exit without waiting for it
+        start = time.monotonic()
+        leader.close(timeout=5)
+        assert time.monotonic() - start < 2
+    finally:
+        worker.close()
+
+    ((message, kwargs),) = instance.notifications
+    assert message == "Rank 1 failed"
+    assert kwargs["job"] == "nightly"
+
+
+def test_durable_notifications_not_aggregated(tmp_path):
+    config_path = os.path.join(tmp_path, "config")
+    open(config_path, "w").close()
+    instance = Instance(
+        config_path=config_path, access_token="token", sync_config=False
+    )
+    instance.ledger = None
+    aggregator = Aggregator(
+        RankInfo(1, 2, 1), instance, socket_path=os.path.join(tmp_path, "agg.sock")
+    )
+    instance.aggregator = aggregator
+    sent = []
+
+    def call_json(method, path, body, headers, response_types, async_req=False):
+        sent.append(body["message"])
+        return SimpleNamespace(event_id="evt_1")
+
+    instance.client.call_json = call_json  # type: ignore
+    try:
+        instance.notify("saved first", durable=True)
+        assert sent == ["saved first"]
+        assert len(instance.outbox) == 0
+    finally:
+        aggregator.close(timeout=0)
+        instance.close()
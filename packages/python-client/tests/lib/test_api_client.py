@@ -0,0 +1,34 @@
+import asyncio
+
+from lmk.api_client import api_client
+from lmk.generated.api.session_api import SessionApi
+
+
+def test_prepared_request_matches_sync_request():
+    client = api_client("http://lmk.test", rate_limiter=None)
+    client.configuration.access_token = "token"
+    sent = []
+
+    def request(method, url, headers=None, body=None, **kwargs):
+        sent.append((method, url, headers, body))
+        raise ConnectionAbortedError
+
+    async def request_async(prepared):
+        sent.append((prepared.method, prepared.url, prepared.headers, prepared.body))
+        raise ConnectionAbortedError
+
+    client.request = request  # type: ignore
+    client._request_async = request_async  # type: ignore
+    api = SessionApi(client)
+
+    for async_req in [False, True]:
+        try:
+            result = api.end_session("ses/1", async_req=async_req)
+            if async_req:
+                asyncio.run(result)
+        except ConnectionAbortedError:
+            pass
+
+    assert len(sent) == 2
+    assert sent[0] == sent[1]
+    assert sent[0][1] == "http://lmk.test/v1/session/ses%2F1/end"
@@ -0,0 +1,75 @@
+import os
+from unittest.mock import patch
+
+from lmk.api_client import ApiClient
+from lmk.channel_cache import ChannelCache
+from lmk.generated.models.notification_channel_response import (
+    NotificationChannelResponse,
+)
+from lmk.instance import Instance
+
+
+def make_channel(channel_id: str, name: str) -> NotificationChannelResponse:
+    actor = {"type": "USER", "actorId": "usr_123", "name": "me"}
+    return NotificationChannelResponse.from_dict(
+        {
+            "payload": {"type": "email", "emailAddress": f"{channel_id}@lmkapp.dev"},
+            "notificationChannelId": channel_id,
+            "name": name,
+            "order": 0,
+            "isDefault": False,
+            "isManaged": False,
+            "isVerified": True,
+            "verificationRequired": False,
+            "createdAt": "2023-10-01T00:00:00Z",
+            "createdByActor": actor,
+            "lastUpdatedAt": "2023-10-01T00:00:00Z",
+            "lastUpdatedByActor": actor,
+        }
+    )
+
+
+def test_channels_loaded_from_cache(tmp_path):
+    config_path = os.path.join(tmp_path, "config")
+    with open(config_path, "w+"):
+        pass
+
+    instance = Instance(
+        config_path=config_path, access_token="token", sync_config=False
+    )
+    channels = [make_channel("a", "Work Email"), make_channel("b", "Personal")]
+    instance.channels.cache.save(instance.channels._cache_key(), channels)
+
+    with patch.object(ApiClient, "call_api") as p:
+        assert instance.channels.get(name="work") == channels[0]
+        assert instance.channels.get(name="Personal", name_exact=True) == channels[1]
+        assert instance.channels.get(channel_id="b") == channels[1]
+        assert instance.channels.list(type="email") == channels
+
+    p.assert_not_called()
+    assert instance.default_channel == "a"
+
+
+def test_channel_cache_expiry(tmp_path):
+    cache = ChannelCache(str(tmp_path), ttl=0, max_stale=0)
+    cache.save("key", [make_channel("a", "Work Email")], fetched_at=0)
+    assert cache.load("key") is None
+
+
+def test_channels_to_dicts_cached(tmp_path):
+    config_path = os.path.join(tmp_path, "config")
+    with open(config_path, "w+"):
+        pass
+
+    instance = Instance(
+        config_path=config_path, access_token="token", sync_config=False
+    )
+    assert instance.channels.to_dicts() == []
+
+    channels = [make_channel("a", "Work Email"), make_channel("b", "Personal")]
+    instance.channels.data = channels
+    dicts = instance.channels.to_dicts()
+    assert dicts == [channel.to_dict() for channel in channels]
+    with patch.object(NotificationChannelResponse, "to_dict") as to_dict:
+        assert instance.channels.to_dicts() == dicts
+        to_dict.assert_not_called()
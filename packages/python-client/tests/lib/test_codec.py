@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+from lmk.utils import codec
+from lmk.utils.codec import CODECS
+
+
+@pytest.mark.parametrize("name", list(CODECS))
+def test_codec_round_trip(name):
+    try:
+        json_codec = CODECS[name]()
+    except ImportError:
+        pytest.skip(f"{name} is not installed")
+
+    value = {"a": [1, 2.5, None, True], "b": "héllo\n", "c": {"d": (1, 2)}}
+    expected = {"a": [1, 2.5, None, True], "b": "héllo\n", "c": {"d": [1, 2]}}
+    assert json_codec.loads(json_codec.dumpb(value)) == expected
+    assert json_codec.loads(json_codec.dumps(value)) == expected
+    # Values the fast libraries can't encode go through the standard library
+    assert json.loads(json_codec.dumps({"big": 2**70})) == {"big": 2**70}
+    with pytest.raises(ValueError):
+        json_codec.loads("{invalid")
+
+
+def test_get_codec_env(monkeypatch):
+    monkeypatch.setattr(codec, "_codec", None)
+    monkeypatch.setenv("LMK_JSON_CODEC", "json")
+    assert codec.get_codec().name == "json"
+
+    monkeypatch.setattr(codec, "_codec", None)
+    monkeypatch.setenv("LMK_JSON_CODEC", "unknown")
+    assert codec.get_codec().name in CODECS
@@ -0,0 +1,32 @@
+import configparser
+import os
+
+from lmk.config import ConfigStore
+
+
+def test_config_store_merges_profiles(tmp_path):
+    path = os.path.join(tmp_path, "config")
+    with open(path, "w+") as f:
+        f.write("[other]\naccess_token = abc\n")
+
+    store = ConfigStore(path, write_delay=60)
+    store.set_profile("python", {"access_token": "1"})
+    store.set_profile("python", {"access_token": "2"})
+    # Debounced, but visible to readers
+    assert store.get_profile("python") == {"access_token": "2"}
+    assert "python" not in open(path).read()
+
+    store.flush()
+    parser = configparser.ConfigParser()
+    parser.read([path])
+    assert dict(parser["other"]) == {"access_token": "abc"}
+    assert dict(parser["python"]) == {"access_token": "2"}
+
+
+def test_config_store_rereads_on_change(tmp_path):
+    path = os.path.join(tmp_path, "config")
+    store = ConfigStore(path, write_delay=0)
+    assert store.get_profile("python") is None
+
+    ConfigStore(path, write_delay=0).set_profile("python", {"server_url": "x"})
+    assert store.get_profile("python") == {"server_url": "x"}
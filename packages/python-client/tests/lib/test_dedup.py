@@ -0,0 +1,110 @@
+import asyncio
+import os
+import threading
+
+from lmk.dedup import Deduplicator, format_digest, normalize_message
+from lmk.instance import Instance
+
+
+def test_normalize_message():
+    a = "Job failed at 2023-10-10T12:00:01Z (pid 1234) after 3.2s, run 1f3a9c0d"
+    b = "Job failed at 2023-10-11T08:15:44Z (pid 99) after 10 seconds, run 77ab31e2"
+    assert normalize_message(a) == normalize_message(b)
+    # Bare numbers such as exit codes are meaningful
+    assert normalize_message("exit code 1") != normalize_message("exit code 0")
+    assert normalize_message("Processed 12345678 rows") != normalize_message(
+        "Processed 98765432 rows"
+    )
+    assert normalize_message("commit 3f9a2c1b") == "commit <hex>"
+
+
+def test_deduplicator(tmp_path):
+    path = os.path.join(tmp_path, "dedup.db")
+    target = {"content_type": "text/plain", "notification_channels": None}
+    dedup = Deduplicator(window=60, digest_interval=60, path=path)
+
+    assert dedup.take_digest() == []
+    assert dedup.check("failed at 12:00:01", target)
+    # Other processes share the same state
+    other = Deduplicator(window=60, digest_interval=60, path=path)
+    assert not other.check("failed at 12:05:00", target)
+    assert not dedup.check("failed at 12:10:00", target)
+    assert dedup.check("failed at 12:10:00", {**target, "content_type": "text/md"})
+
+    assert dedup.take_digest() == []
+    (entry,) = dedup.take_digest(force=True)
+    assert entry.count == 2
+    assert entry.message == "failed at 12:10:00"
+    assert "2 duplicate notifications" in format_digest([entry], "text/plain")
+    assert dedup.take_digest(force=True) == []
+
+
+def make_instance(tmp_path):
+    config_path = os.path.join(tmp_path, "config")
+    open(config_path, "w").close()
+    instance = Instance(
+        config_path=config_path, access_token="token", sync_config=False
+    )
+    instance.ledger = None
+    instance.deduplicator = Deduplicator(path=os.path.join(tmp_path, "dedup.db"))
+    sent = []
+
+    def call_json(method, path, body, headers, response_types, async_req=False):
+        sent.append(body["message"])
+        if not async_req:
+            return body
+
+        async def send():
+            return body
+
+        return send()
+
+    instance.client.call_json = call_json  # type: ignore
+    return instance, sent
+
+
+def test_deferred_notification_with_dedupe(tmp_path):
+    instance, sent = make_instance(tmp_path)
+    try:
+        first = instance.notify("failed", deferred=True)
+        assert first.result(timeout=5) is not None
+        assert instance.notify("failed", deferred=True).result(timeout=5) is None
+    finally:
+        instance.close()
+    assert sent == ["failed"]
+
+
+def test_durable_notification_with_dedupe(tmp_path):
+    instance, sent = make_instance(tmp_path)
+    try:
+        assert instance.notify("failed", durable=True) is not None
+        assert instance.notify("failed", durable=True) is None
+        assert len(instance.outbox) == 0
+    finally:
+        instance.close()
+    assert sent == ["failed"]
+
+
+def test_async_notification_with_dedupe(tmp_path):
+    instance, sent = make_instance(tmp_path)
+    deduplicator = instance.deduplicator
+    threads = []
+    check = deduplicator.check
+
+    def check_thread(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return check(*args, **kwargs)
+
+    deduplicator.check = check_thread  # type: ignore
+
+    async def main():
+        assert await instance.notify("failed", async_req=True) is not None
+        assert await instance.notify("failed", async_req=True) is None
+
+    try:
+        asyncio.run(main())
+    finally:
+        instance.close()
+
+    assert sent == ["failed"]
+    assert threading.current_thread() not in threads
@@ -0,0 +1,65 @@
+import asyncio
+import sys
+import threading
+import time
+
+from lmk.excepthook import ExceptHook
+
+
+class FakeInstance:
+    def __init__(self, delay: float = 0.0) -> None:
+        self.messages = []
+        self.delay = delay
+
+    def notify(self, message, **kwargs):
+        time.sleep(self.delay)
+        self.messages.append(message)
+
+
+def test_excepthook_thread_and_asyncio():
+    instance = FakeInstance()
+    hook = ExceptHook(instance=instance)  # type: ignore
+    loop = asyncio.new_event_loop()
+    hook.install(loop)
+    try:
+
+        def fail():
+            raise ValueError("thread boom")
+
+        thread = threading.Thread(target=fail, name="worker")
+        thread.start()
+        thread.join()
+
+        async def fail_async():
+            raise RuntimeError("task boom")
+
+        # Warnings without an exception aren't sent
+        loop.call_exception_handler({"message": "Unclosed client session"})
+        try:
+            loop.run_until_complete(fail_async())
+        except RuntimeError as exc:
+            loop.call_exception_handler(
+                {"message": "Task exception was never retrieved", "exception": exc}
+            )
+
+        assert hook.flush(5)
+    finally:
+        hook.uninstall()
+        loop.close()
+
+    assert sys.excepthook is not hook._excepthook
+    assert len(instance.messages) == 2
+    assert "Uncaught `ValueError` in thread `worker`" in instance.messages[0]
+    assert "ValueError: thread boom" in instance.messages[0]
+    assert "Task exception was never retrieved" in instance.messages[1]
+    assert "RuntimeError: task boom" in instance.messages[1]
+
+
+def test_excepthook_exit_deadline():
+    instance = FakeInstance(delay=10)
+    hook = ExceptHook(instance=instance, on="stop", exit_timeout=0.2)  # type: ignore
+
+    start = time.monotonic()
+    hook._at_exit()
+    assert time.monotonic() - start < 2
+    assert instance.messages == []
@@ -0,0 +1,52 @@
+import re
+import subprocess
+import sys
+
+# Generous enough for slow CI machines; importing the API client takes ~200ms+
+IMPORT_TIME_BUDGET_US = 50_000
+
+HEAVY_MODULES = [
+    "aiohttp",
+    "blinker",
+    "dateutil",
+    "ipywidgets",
+    "lmk.generated",
+    "lmk.instance",
+    "lmk.jupyter",
+    "pydantic",
+]
+
+
+def test_import_time_budget():
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import lmk"],
+        stderr=subprocess.PIPE,
+        encoding="utf-8",
+        check=True,
+    )
+    cumulative = None
+    for line in process.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| lmk$", line)
+        if match:
+            cumulative = int(match.group(1))
+
+    assert cumulative is not None, process.stderr
+    assert cumulative < IMPORT_TIME_BUDGET_US
+
+
+def test_import_is_lazy():
+    code = "\n".join(
+        [
+            "import sys, lmk",
+            f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])",
+            "lmk.notify",
+            "print('lmk.instance' in sys.modules)",
+        ]
+    )
+    process = subprocess.run(
+        [sys.executable, "-c", code],
+        stdout=subprocess.PIPE,
+        encoding="utf-8",
+        check=True,
+    )
+    assert process.stdout.splitlines() == ["[]", "True"]
@@ -0,0 +1,75 @@
+import json
+import os
+
+import urllib3  # type: ignore
+
+from lmk.api_client import RetryPolicy
+from lmk.generated.exceptions import ApiException
+from lmk.generated.rest import RESTResponse
+from lmk.instance import Instance
+from lmk.instrumentation import ClientStats, api_request_recorded, operation_name
+
+
+def test_operation_name():
+    assert operation_name("POST", "https://api.lmkapp.dev/v1/event") == "post_event"
+    assert operation_name("POST", "http://x/v1/session/ses_1/end") == "end_session"
+    assert operation_name("PATCH", "http://x/v1/session/ses_1") == "update_session"
+    assert operation_name("DELETE", "http://x/v1/session/ses_1") == "other"
+
+
+def test_client_stats_histogram():
+    stats = ClientStats(buckets=[0.1, 1.0])
+    stats.record("post_event", 0.05)
+    stats.record("post_event", 0.5, ValueError())
+    stats.record("post_event", 5.0)
+
+    snapshot = stats.snapshot()["post_event"]
+    assert snapshot["count"] == 3
+    assert snapshot["errors"] == 1
+    assert snapshot["max_time"] == 5.0
+    assert snapshot["latency_buckets"] == {"0.1": 1, "1.0": 1, "+Inf": 1}
+
+
+def test_instance_stats_counts_retries(tmp_path):
+    config_path = os.path.join(tmp_path, "config")
+    with open(config_path, "w+"):
+        pass
+
+    instance = Instance(
+        config_path=config_path, access_token="token", sync_config=False
+    )
+    instance.client.rate_limiter = None
+    instance.client.retry_policy = RetryPolicy(base=0.001)
+    calls = []
+
+    def request(method, url, **kwargs):
+        calls.append(url)
+        if len(calls) == 1:
+            raise ApiException(status=503)
+        body = {"channels": []}
+        return RESTResponse(
+            urllib3.HTTPResponse(
+                body=json.dumps(body).encode(),
+                status=200,
+                headers={"content-type": "application/json"},
+                preload_content=True,
+            )
+        )
+
+    instance.client.rest_client.request = request
+    recorded = []
+
+    def on_recorded(sender, operation, duration, error):
+        recorded.append((operation, error))
+
+    api_request_recorded.connect(on_recorded)
+    try:
+        assert instance.list_notification_channels() == []
+    finally:
+        api_request_recorded.disconnect(on_recorded)
+
+    stats = instance.stats()["list_notification_channels"]
+    assert stats["count"] == 1
+    assert stats["retries"] == 1
+    assert stats["errors"] == 0
+    assert recorded == [("list_notification_channels", None)]
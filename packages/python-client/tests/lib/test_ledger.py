@@ -0,0 +1,182 @@
+import asyncio
+import json
+import os
+import threading
+from types import SimpleNamespace
+
+import pytest
+import urllib3  # type: ignore
+
+from lmk.api_client import RetryPolicy
+from lmk.generated.exceptions import ApiException
+from lmk.generated.rest import RESTResponse
+from lmk.instance import Instance
+from lmk.ledger import DEFAULT_CHANNEL, EventLedger, current_job
+
+
+def test_ledger_query_filters_and_pages(tmp_path):
+    ledger = EventLedger(os.path.join(tmp_path, "events.db"))
+    for i in range(25):
+        ledger.record(
+            f"message {i}",
+            "text/plain",
+            ["ch_a"] if i % 2 else ["ch_a", "ch_b"],
+            created=1000.0 + i,
+            latency=0.1,
+            event_id=f"evt_{i}",
+            job="train" if i < 10 else "eval",
+            error=ValueError("boom") if i == 3 else None,
+        )
+
+    records = list(ledger.iter_events(page_size=7))
+    assert [record.event_id for record in records] == [
+        f"evt_{i}" for i in reversed(range(25))
+    ]
+
+    train = ledger.query(job="train", since=1005.0, limit=100)
+    assert [record.created for record in train] == [
+        1009.0,
+        1008.0,
+        1007.0,
+        1006.0,
+        1005.0,
+    ]
+
+    both = ledger.query(channel="ch_b", until=1006.0)
+    assert [record.event_id for record in both] == ["evt_4", "evt_2", "evt_0"]
+    assert both[0].channels == ["ch_a", "ch_b"]
+
+    (failed,) = ledger.query(status="failed")
+    assert failed.event_id == "evt_3"
+    assert failed.error == "ValueError: boom"
+
+    page = ledger.query(limit=3)
+    assert [
+        record.event_id for record in ledger.query(before=page[-1].id, limit=2)
+    ] == [
+        "evt_21",
+        "evt_20",
+    ]
+
+
+def test_ledger_prunes_old_records(tmp_path):
+    ledger = EventLedger(os.path.join(tmp_path, "events.db"), max_age=100.0)
+    ledger.record("old", "text/plain", ["ch"], created=1000.0, latency=0.1)
+    ledger._next_prune = 0.0
+    ledger.record("new", "text/plain", ["ch"], created=1200.0, latency=0.1)
+
+    assert [record.message for record in ledger.query()] == ["new"]
+    assert ledger.query(channel="ch")[0].message == "new"
+
+
+def test_notify_records_events(tmp_path):
+    config_path = os.path.join(tmp_path, "config")
+    with open(config_path, "w+"):
+        pass
+
+    instance = Instance(
+        config_path=config_path, access_token="token", sync_config=False
+    )
+    instance.client.rate_limiter = None
+    instance.client.retry_policy = RetryPolicy(base=0.001)
+    statuses = [201, 400]
+
+    def request(method, url, **kwargs):
+        status = statuses.pop(0)
+        if status != 201:
+            raise ApiException(status=status)
+        body = {
+            "eventId": "evt_1",
+            "userId": "user",
+            "actor": {"type": "APP", "actorId": "app", "name": "App"},
+            "message": "hi",
+            "contentType": "text/plain",
+            "channels": [],
+            "createdAt": "2024-01-01T00:00:00Z",
+        }
+        return RESTResponse(
+            urllib3.HTTPResponse(
+                body=json.dumps(body).encode(),
+                status=201,
+                headers={"content-type": "application/json"},
+                preload_content=True,
+            )
+        )
+
+    instance.client.rest_client.request = request
+
+    token = current_job.set("nightly")
+    try:
+        instance.notify("hi", content_type="text/plain")
+    finally:
+        current_job.reset(token)
+    with pytest.raises(ApiException):
+        instance.notify("bye", notification_channels=["ch_1"], job="backup")
+
+    failed, sent = instance.ledger.query()
+    assert (sent.status, sent.job, sent.event_id) == ("sent", "nightly", "evt_1")
+    assert sent.channels == [DEFAULT_CHANNEL]
+    assert sent.latency >= 0
+    assert (failed.status, failed.job, failed.channels) == (
+        "failed",
+        "backup",
+        ["ch_1"],
+    )
+    assert os.path.dirname(instance.ledger.path) == str(tmp_path)
+
+    instance.ledger = None
+    assert instance.ledger is None
+
+
+def test_notify_with_unwritable_ledger(tmp_path):
+    config_path = os.path.join(tmp_path, "config")
+    open(config_path, "w").close()
+    instance = Instance(
+        config_path=config_path, access_token="token", sync_config=False
+    )
+    # The ledger's directory can't be created because a file is in the way
+    instance.ledger = EventLedger(os.path.join(config_path, "lmk", "events.db"))
+    response = SimpleNamespace(event_id="evt_1")
+
+    def call_json(method, path, body, headers, response_types, async_req=False):
+        if not async_req:
+            return response
+
+        async def send():
+            return response
+
+        return send()
+
+    instance.client.call_json = call_json  # type: ignore
+
+    assert instance.notify("hi") is response
+    assert asyncio.run(instance.notify("hi", async_req=True)) is response
+
+
+def test_notify_async_records_off_loop(tmp_path):
+    config_path = os.path.join(tmp_path, "config")
+    open(config_path, "w").close()
+    instance = Instance(
+        config_path=config_path, access_token="token", sync_config=False
+    )
+    ledger = instance.ledger
+    threads = []
+    record = ledger.record
+
+    def record_thread(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return record(*args, **kwargs)
+
+    ledger.record = record_thread  # type: ignore
+
+    async def send():
+        raise ConnectionError("offline")
+
+    instance.client.call_json = lambda *args, **kwargs: send()  # type: ignore
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(instance.notify("hi", async_req=True))
+
+    assert threads and threads[0] is not threading.current_thread()
+    (failed,) = ledger.query()
+    assert failed.status == "failed"
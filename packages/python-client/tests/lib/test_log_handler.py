@@ -0,0 +1,78 @@
+import logging
+import threading
+
+from lmk.log_handler import LoggingHandler
+
+
+class FakeInstance:
+    def __init__(self) -> None:
+        self.messages = []
+        self.sent = threading.Event()
+
+    def notify(self, message, **kwargs):
+        self.messages.append(message)
+        self.sent.set()
+
+
+def make_logger(handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(f"test_log_handler.{id(handler)}")
+    logger.propagate = False
+    logger.addHandler(handler)
+    return logger
+
+
+def test_logging_handler_groups_burst():
+    instance = FakeInstance()
+    handler = LoggingHandler(instance=instance, batch_window=0.2)  # type: ignore
+    logger = make_logger(handler)
+
+    logger.info("not sent")
+    for i in range(3):
+        logger.error("Shard %d failed", i)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.exception("Pipeline failed")
+
+    assert instance.sent.wait(5)
+    handler.close()
+
+    (message,) = instance.messages
+    assert "**4 log records**" in message
+    assert "3x ERROR" in message
+    assert "ValueError: boom" in message
+
+
+def test_logging_handler_cap_and_flush():
+    instance = FakeInstance()
+    handler = LoggingHandler(  # type: ignore
+        instance=instance, batch_window=0, max_per_minute=1, flush_timeout=5
+    )
+    logger = make_logger(handler)
+
+    logger.error("first")
+    assert instance.sent.wait(5)
+    logger.error("second")
+    logger.error("third")
+    # Over the cap, so these are only sent when the handler is closed
+    handler.close()
+
+    assert len(instance.messages) == 2
+    assert "second" in instance.messages[1] and "third" in instance.messages[1]
+
+
+def test_logging_handler_unhashable_message():
+    instance = FakeInstance()
+    handler = LoggingHandler(instance=instance, batch_window=0)  # type: ignore
+    logger = make_logger(handler)
+
+    logger.error({"shard": 1, "status": "failed"})
+    assert instance.sent.wait(5)
+    instance.sent.clear()
+    # The listener thread is still running
+    logger.error("after")
+    assert instance.sent.wait(5)
+    handler.close()
+
+    assert "'shard': 1" in instance.messages[0]
+    assert "after" in instance.messages[1]
@@ -0,0 +1,41 @@
+import math
+
+from lmk.metrics import MetricSeries, MetricsBuffer
+
+
+def test_metric_series_downsamples_min_max_last():
+    series = MetricSeries(capacity=1000)
+    for i in range(100):
+        series.append(100.0 if i == 42 else float(i % 10))
+    series.append(math.nan)
+
+    delta = series.take(max_points=10)
+    assert delta is not None
+    assert len(delta["step"]) == 10
+    # The spike survives downsampling
+    assert max(delta["max"]) == 100.0
+    assert delta["step"][-1] == 100
+    assert delta["last"][-1] is None
+    assert series.take(max_points=10) is None
+
+
+def test_metric_series_ring_buffer():
+    series = MetricSeries(capacity=8)
+    for i in range(20):
+        series.append(float(i), step=i * 10)
+
+    delta = series.take(max_points=100)
+    assert delta is not None
+    assert delta["step"] == [120.0 + 10 * i for i in range(8)]
+    assert delta["last"] == [float(i) for i in range(12, 20)]
+    assert delta["dropped"] == 12
+    assert len(series.values) == 8
+
+
+def test_metrics_buffer_max_series():
+    buffer = MetricsBuffer(capacity=4, max_series=2)
+    for name in ["a", "b", "c"]:
+        buffer.log(name, 1.0)
+    assert buffer.pending()
+    assert sorted(buffer.take()) == ["a", "b"]
+    assert not buffer.pending()
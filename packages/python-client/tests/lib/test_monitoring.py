@@ -0,0 +1,131 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import re
+
+import pytest
+
+from lmk import monitoring
+from lmk.monitoring import MonitorRunner, monitor
+
+
+class FakeSession:
+    session_id = "ses_123"
+
+
+class FakeWebSocket:
+    def __init__(self) -> None:
+        self.messages = []
+
+    async def send(self, data):
+        self.messages.append(data)
+
+    async def __aiter__(self):
+        await asyncio.Event().wait()
+        yield
+
+
+class FakeInstance:
+    aggregator = None
+
+    def __init__(self) -> None:
+        self.ws = FakeWebSocket()
+        self.sessions = []
+        self.ended = []
+        self.notifications = []
+
+    def logged_in(self):
+        return True
+
+    def notify(self, message, deferred=False, **kwargs):
+        self.notifications.append(message)
+        future = concurrent.futures.Future()
+        future.set_result(None)
+        return future
+
+    async def create_session(self, name, state, async_req=False):
+        self.sessions.append((name, state))
+        return FakeSession()
+
+    @contextlib.asynccontextmanager
+    async def session_connect(self, session_id, read_only=True):
+        yield self.ws
+
+    async def end_session(self, session_id, async_req=False, durable=False):
+        self.ended.append(session_id)
+
+
+@pytest.fixture
+def runner(monkeypatch):
+    runner = MonitorRunner(poll_interval=0.02)
+    monkeypatch.setattr(monitoring, "_runner", runner)
+    yield runner
+    runner.close()
+
+
+def test_monitor_short_block(runner):
+    instance = FakeInstance()
+
+    with monitor("quick", instance=instance):  # type: ignore
+        pass
+    with pytest.raises(ValueError):
+        with monitor("etl-step", instance=instance):  # type: ignore
+            raise ValueError("bad row")
+
+    assert runner.close(5)
+    assert instance.sessions == []
+    (message,) = instance.notifications
+    assert "`etl-step` failed" in message
+    assert "ValueError: bad row" in message
+
+
+def test_monitor_decorator_creates_session(runner):
+    instance = FakeInstance()
+
+    @monitor(notify_on="stop", session_after=0.05, instance=instance)  # type: ignore
+    async def sync_data():
+        await asyncio.sleep(0.3)
+        return 42
+
+    assert asyncio.run(sync_data()) == 42
+    assert runner.close(5)
+
+    assert [name for name, _ in instance.sessions] == [
+        "test_monitor_decorator_creates_session.<locals>.sync_data"
+    ]
+    assert instance.sessions[0][1]["notifyOn"] == "stop"
+    assert instance.ws.messages[-1]["exitCode"] == 0
+    assert instance.ended == ["ses_123"]
+    assert "finished after" in instance.notifications[0]
+
+
+def test_monitor_concurrent_blocks(runner):
+    instance = FakeInstance()
+    m = monitor("shared", notify_on="stop", instance=instance)  # type: ignore
+
+    async def fail():
+        async with m:
+            await asyncio.sleep(1.0)
+            raise ValueError("bad row")
+
+    async def succeed():
+        await asyncio.sleep(0.5)
+        # Exits after the first block, which started earlier
+        async with m:
+            await asyncio.sleep(1.0)
+
+    async def main():
+        return await asyncio.gather(fail(), succeed(), return_exceptions=True)
+
+    error, result = asyncio.run(main())
+    assert isinstance(error, ValueError)
+    assert result is None
+    assert runner.close(5)
+
+    failed, finished = instance.notifications
+    # Each block finishes its own run
+    for message in [failed, finished]:
+        elapsed = float(re.search(r"after ([\d.]+)s", message).group(1))
+        assert 0.9 <= elapsed < 1.4
+    assert failed.startswith("`shared` failed")
+    assert finished.startswith("`shared` finished")
@@ -0,0 +1,71 @@
+import asyncio
+import os
+import threading
+import time
+
+from lmk.instance import Instance
+
+
+def make_instance(tmp_path):
+    open(os.path.join(tmp_path, "config"), "w").close()
+    instance = Instance(
+        config_path=os.path.join(tmp_path, "config"),
+        access_token="token",
+        sync_config=False,
+    )
+    state = {"active": 0, "max_active": 0}
+    lock = threading.Lock()
+
+    def result(message):
+        if message == "bad":
+            raise ValueError(message)
+        return {"message": message}
+
+    def notify(message, async_req=False, **kwargs):
+        if async_req:
+
+            async def send():
+                state["active"] += 1
+                state["max_active"] = max(state["max_active"], state["active"])
+                await asyncio.sleep(0.01)
+                state["active"] -= 1
+                return result(message)
+
+            return send()
+
+        with lock:
+            state["active"] += 1
+            state["max_active"] = max(state["max_active"], state["active"])
+        time.sleep(0.01)
+        with lock:
+            state["active"] -= 1
+        return result(message)
+
+    instance.notify = notify  # type: ignore
+    return instance, state
+
+
+def test_notify_many(tmp_path):
+    instance, state = make_instance(tmp_path)
+    items = ["a", {"message": "bad"}, "c", "d", "e"]
+
+    results = instance.notify_many(items, concurrency=2)
+    assert results[0] == {"message": "a"}
+    assert isinstance(results[1], ValueError)
+    assert results[4] == {"message": "e"}
+    assert state["max_active"] == 2
+
+
+def test_notify_many_async(tmp_path):
+    instance, state = make_instance(tmp_path)
+    items = ["a", {"message": "bad"}, "c", "d", "e"]
+
+    results = asyncio.run(instance.notify_many(items, concurrency=3, async_req=True))
+    assert [r if isinstance(r, dict) else None for r in results] == [
+        {"message": "a"},
+        None,
+        {"message": "c"},
+        {"message": "d"},
+        {"message": "e"},
+    ]
+    assert state["max_active"] == 3
@@ -0,0 +1,123 @@
+import os
+import time
+
+from lmk.generated.exceptions import ApiException
+from lmk.instance import Instance
+from lmk.outbox import Outbox
+
+
+def test_outbox_retry_and_remove(tmp_path):
+    outbox = Outbox(os.path.join(tmp_path, "outbox.db"))
+
+    entry = outbox.put("event", {"message": "hello"})
+    # Leased to the caller that put it
+    assert outbox.claim() == []
+
+    assert outbox.record_failure(entry, ConnectionError("offline"))
+    assert entry.attempts == 1
+    assert len(outbox) == 1
+
+    # Not due yet because of the backoff
+    assert outbox.claim() == []
+
+    outbox.remove(entry.key)
+    assert len(outbox) == 0
+
+
+def test_outbox_discards_permanent_errors(tmp_path):
+    outbox = Outbox(os.path.join(tmp_path, "outbox.db"))
+
+    entry = outbox.put("event", {"message": "hello"})
+    assert not outbox.record_failure(entry, ApiException(status=400))
+    assert len(outbox) == 0
+
+
+def test_outbox_claims_due_entries(tmp_path):
+    outbox = Outbox(os.path.join(tmp_path, "outbox.db"), lease=0)
+
+    entry = outbox.put("end_session", {"session_id": "abc"})
+    (claimed,) = outbox.claim()
+    assert claimed.key == entry.key
+    assert claimed.payload == {"session_id": "abc"}
+
+
+def test_outbox_discards_after_max_attempts(tmp_path):
+    outbox = Outbox(os.path.join(tmp_path, "outbox.db"), max_attempts=2)
+
+    entry = outbox.put("event", {"message": "hello"})
+    assert outbox.record_failure(entry, ConnectionError("offline"))
+    assert not outbox.record_failure(entry, RuntimeError("unexpected"))
+    assert len(outbox) == 0
+
+
+def test_instance_drains_outbox_on_startup(tmp_path, monkeypatch):
+    config_path = os.path.join(tmp_path, "config")
+    open(config_path, "w").close()
+    # Left behind by an earlier process with the same token
+    earlier = Instance(config_path=config_path, access_token="token", sync_config=False)
+    Outbox(
+        os.path.join(tmp_path, "outbox.db"), lease=0, owner=earlier._outbox_owner()
+    ).put("event", {"message": "left behind", "notify": True})
+    earlier.close()
+    sent = []
+
+    def notify(self, message, async_req=False, **kwargs):
+        async def send():
+            sent.append((message, kwargs["idempotency_key"]))
+            return {"message": message}
+
+        return send()
+
+    monkeypatch.setattr(Instance, "notify", notify)
+    instance = Instance(
+        config_path=config_path, access_token="token", sync_config=False
+    )
+    try:
+        deadline = time.monotonic() + 5
+        while len(instance.outbox) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(instance.outbox) == 0
+        assert [message for message, _ in sent] == ["left behind"]
+    finally:
+        instance.close()
+
+
+def test_outbox_only_claims_own_entries(tmp_path):
+    path = os.path.join(tmp_path, "outbox.db")
+    Outbox(path, lease=0, owner="a").put("event", {"message": "secret for A"})
+    outbox = Outbox(path, lease=0, owner="b")
+
+    assert outbox.claim() == []
+    assert len(outbox) == 0
+    (entry,) = Outbox(path, lease=0, owner="a").claim()
+    assert entry.payload == {"message": "secret for A"}
+
+
+def test_instance_does_not_drain_other_profiles(tmp_path, monkeypatch):
+    config_path = os.path.join(tmp_path, "config")
+    open(config_path, "w").close()
+    sent = []
+
+    def notify(self, message, async_req=False, **kwargs):
+        sent.append((self.access_token, message))
+        return {"message": message}
+
+    monkeypatch.setattr(Instance, "notify", notify)
+    owner_a = Instance(
+        config_path=config_path, access_token="token-a", sync_config=False
+    )
+    owner_a.outbox.lease = 0
+    owner_a.outbox.put("event", {"message": "secret for A", "notify": True})
+
+    instance = Instance(
+        config_path=config_path, access_token="token-b", sync_config=False
+    )
+    try:
+        assert instance.drain_outbox() == 0
+        assert len(instance.outbox) == 0
+        assert len(owner_a.outbox) == 1
+        assert owner_a.drain_outbox() == 1
+        assert sent == [("token-a", "secret for A")]
+    finally:
+        instance.close()
+        owner_a.close()
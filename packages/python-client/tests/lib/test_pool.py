@@ -0,0 +1,67 @@
+import os
+import time
+from types import SimpleNamespace
+
+from lmk.pool import InstancePool
+
+
+def test_instance_pool_lru(tmp_path):
+    path = os.path.join(tmp_path, "config")
+    with open(path, "w+") as f:
+        f.write("[python]\naccess_token = profile-token\n")
+
+    pool = InstancePool(max_size=2, config_path=path)
+    try:
+        a = pool.get(access_token="a")
+        b = pool.get(access_token="b")
+        assert pool.get(access_token="a") is a
+        assert a.client is b.client
+        # Token instances don't pick up tokens from the config file
+        assert a.access_token == "a"
+        assert a.refresh_token is None
+
+        profile = pool.get(profile="python")
+        assert profile.access_token == "profile-token"
+        assert len(pool) == 2
+        # "b" was the least recently used
+        assert pool.get(access_token="b") is not b
+    finally:
+        pool.close()
+
+
+def test_instance_pool_shares_sender(tmp_path):
+    path = os.path.join(tmp_path, "config")
+    open(path, "w").close()
+
+    pool = InstancePool(config_path=path)
+    sent = []
+
+    def call_json(method, path, body, headers, response_types, async_req=False):
+        async def send():
+            sent.append((headers["Authorization"], body["message"]))
+            return SimpleNamespace(event_id="evt_1")
+
+        return send()
+
+    pool.client().call_json = call_json  # type: ignore
+    try:
+        a = pool.get(access_token="a", refresh_token="refresh-a")
+        b = pool.get(access_token="b")
+        assert a.sender is b.sender is pool.sender()
+
+        a.access_token_expires = int((time.time() + 3600) * 1000)
+        a._schedule_refresh()
+        assert a._refresh_timer is None
+
+        futures = [
+            a.notify("for a", deferred=True),
+            b.notify("for b", deferred=True),
+        ]
+        assert all(future.result(timeout=5) for future in futures)
+        assert sorted(sent) == [("Bearer a", "for a"), ("Bearer b", "for b")]
+
+        # Evicting an instance doesn't close the shared sender
+        pool.evict(access_token="a")
+        assert b.notify("again", deferred=True).result(timeout=5)
+    finally:
+        pool.close()
@@ -0,0 +1,82 @@
+import asyncio
+import contextlib
+import time
+
+from lmk.progress_bar import ProgressBar, ProgressReporter
+
+
+class FakeSession:
+    session_id = "ses_123"
+
+
+class FakeWebSocket:
+    def __init__(self) -> None:
+        self.messages = []
+
+    async def send(self, data):
+        self.messages.append(data)
+
+    async def __aiter__(self):
+        await asyncio.Event().wait()
+        yield
+
+
+class FakeInstance:
+    aggregator = None
+
+    def __init__(self) -> None:
+        self.ws = FakeWebSocket()
+        self.sessions = []
+        self.ended = []
+
+    def logged_in(self):
+        return True
+
+    async def create_session(self, name, state, async_req=False):
+        self.sessions.append((name, state))
+        return FakeSession()
+
+    @contextlib.asynccontextmanager
+    async def session_connect(self, session_id, read_only=True):
+        yield self.ws
+
+    async def end_session(self, session_id, async_req=False, durable=False):
+        self.ended.append(session_id)
+
+
+def test_progress_reports_long_loops_only():
+    instance = FakeInstance()
+    reporter = ProgressReporter(instance, interval=0.05)  # type: ignore
+
+    # Finishes before the first update, so no session is created
+    assert sum(ProgressBar(reporter, range(10))) == 45
+    time.sleep(0.1)
+    assert instance.sessions == []
+
+    bar = ProgressBar(reporter, range(4), desc="train")
+    for _ in bar:
+        time.sleep(0.05)
+    assert bar.n == 4
+    assert reporter.close(5)
+
+    assert [name for name, _ in instance.sessions] == ["train"]
+    assert instance.ended == ["ses_123"]
+    last = instance.ws.messages[-1]["progress"][0]
+    assert last["n"] == last["total"] == 4
+    assert last["done"] and last["eta"] == 0
+
+
+def test_progress_reports_metrics():
+    instance = FakeInstance()
+    reporter = ProgressReporter(instance, interval=0.05, max_points=5)  # type: ignore
+
+    for step in range(50):
+        reporter.log_metric("loss", 1 / (step + 1), step=step)
+    time.sleep(0.2)
+    assert reporter.close(5)
+
+    assert [name for name, _ in instance.sessions] == ["progress"]
+    (message,) = instance.ws.messages
+    loss = message["metrics"]["loss"]
+    assert loss["step"] == [9, 19, 29, 39, 49]
+    assert loss["max"][0] == 1.0
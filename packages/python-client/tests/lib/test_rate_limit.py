@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from lmk.api_client import (
+    RateLimiter,
+    TokenBucket,
+    endpoint_class,
+    parse_retry_after,
+)
+
+
+def test_token_bucket_burst():
+    bucket = TokenBucket(rate=10.0, burst=5.0)
+    delays = [bucket.reserve() for _ in range(7)]
+    assert all(delay == 0 for delay in delays[:5])
+    assert delays[5] == pytest.approx(0.1, abs=0.01)
+    assert delays[6] == pytest.approx(0.2, abs=0.01)
+
+
+def test_token_bucket_shared(tmp_path):
+    path = os.path.join(tmp_path, "event.bucket")
+    first = TokenBucket(rate=1.0, burst=2.0, path=path)
+    second = TokenBucket(rate=1.0, burst=2.0, path=path)
+
+    assert first.reserve() == 0
+    assert second.reserve() == 0
+    assert first.reserve() == pytest.approx(1.0, abs=0.05)
+
+
+def test_token_bucket_block():
+    bucket = TokenBucket(rate=10.0, burst=5.0)
+    bucket.block(2.0)
+    assert bucket.reserve() == pytest.approx(2.1, abs=0.05)
+
+
+def test_rate_limit_helpers():
+    assert endpoint_class("https://api.lmkapp.dev/v1/event") == "event"
+    assert endpoint_class("https://api.lmkapp.dev/v1/session/abc") == "session"
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("garbage") is None
+
+
+def test_rate_limiter_defaults_to_retry_after_only():
+    limiter = RateLimiter()
+    url = "https://api.lmkapp.dev/v1/event"
+    bucket = limiter.bucket(url)
+    assert all(bucket.reserve() == 0 for _ in range(1000))
+
+    # As after a 429 response with "Retry-After: 1"
+    bucket.block(1.0)
+    assert bucket.reserve() == pytest.approx(1.0, abs=0.05)
+
+    limited = RateLimiter({"event": (10.0, 1.0)}).bucket(url)
+    assert limited.reserve() == 0
+    assert limited.reserve() == pytest.approx(0.1, abs=0.01)
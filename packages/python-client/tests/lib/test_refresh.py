@@ -0,0 +1,130 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import lmk
+from lmk.config import config_store
+from lmk.instance import HeadlessAuthApi, Instance
+
+
+def make_instance(tmp_path, monkeypatch):
+    config_path = os.path.join(tmp_path, "config")
+    expired = int((time.time() - 60) * 1000)
+    with open(config_path, "w+") as f:
+        f.write(
+            "[python]\n"
+            "access_token = old\n"
+            "refresh_token = refresh\n"
+            f"access_token_expires = {expired}\n"
+        )
+
+    calls = []
+
+    def refresh(self, request, async_req=False):
+        calls.append(threading.current_thread())
+        response = SimpleNamespace(access_token=f"new-{len(calls)}", expires_in=3600)
+        if not async_req:
+            time.sleep(0.1)
+            return response
+
+        async def wait():
+            await asyncio.sleep(0.1)
+            return response
+
+        return wait()
+
+    monkeypatch.setattr(HeadlessAuthApi, "refresh_headless_auth_token", refresh)
+    instance = Instance(config_path=config_path, background_refresh=False)
+    return instance, calls
+
+
+def test_concurrent_sync_callers_share_refresh(tmp_path, monkeypatch):
+    instance, calls = make_instance(tmp_path, monkeypatch)
+    tokens = []
+    threads = [
+        threading.Thread(
+            target=lambda: tokens.append(instance._get_access_token_sync())
+        )
+        for _ in range(5)
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        instance.close()
+
+    assert len(calls) == 1
+    assert tokens == ["new-1"] * 5
+
+
+def test_concurrent_async_callers_share_refresh(tmp_path, monkeypatch):
+    instance, calls = make_instance(tmp_path, monkeypatch)
+    flush_threads = []
+    store = config_store(instance.config_path)
+    flush = store.flush
+
+    def record_flush():
+        flush_threads.append(threading.current_thread())
+        flush()
+
+    monkeypatch.setattr(store, "flush", record_flush)
+
+    async def main():
+        return await asyncio.gather(
+            *[instance._get_access_token_async() for _ in range(5)]
+        )
+
+    try:
+        tokens = asyncio.run(main())
+    finally:
+        instance.close()
+
+    assert len(calls) == 1
+    assert tokens == ["new-1"] * 5
+    # The refreshed token is written to the config file off the event loop
+    assert flush_threads and threading.current_thread() not in flush_threads
+    assert store.get_profile("python")["access_token"] == "new-1"
+
+
+def test_adopts_token_refreshed_by_another_process(tmp_path, monkeypatch):
+    instance, calls = make_instance(tmp_path, monkeypatch)
+    expires = int((time.time() + 3600) * 1000)
+    # Holds the refresh lock while it "refreshes" the token, then writes it to the
+    # shared config file the way another Instance would
+    script = f"""
+import time
+from lmk.config import ConfigStore
+from lmk.utils.os import file_lock
+
+with file_lock({instance._token_lock_path()!r}):
+    print("locked", flush=True)
+    time.sleep(0.5)
+    ConfigStore({instance.config_path!r}, write_delay=0).set_profile("python", {{
+        "access_token": "from-other-process",
+        "refresh_token": "refresh",
+        "access_token_expires": "{expires}",
+    }})
+"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.path.dirname(os.path.dirname(lmk.__file__))
+    process = subprocess.Popen(
+        [sys.executable, "-c", script], stdout=subprocess.PIPE, text=True, env=env
+    )
+    try:
+        assert process.stdout is not None
+        assert process.stdout.readline().strip() == "locked"
+        # Waits for the other process to release the lock, then uses its token
+        assert instance._get_access_token_sync() == "from-other-process"
+        assert process.wait(timeout=10) == 0
+    finally:
+        process.kill()
+        instance.close()
+
+    assert calls == []
+    assert instance.access_token_expires == expires
@@ -0,0 +1,104 @@
+import json
+import os
+from unittest.mock import MagicMock
+
+import pytest
+import urllib3  # type: ignore
+
+from lmk import exc
+from lmk.api_client import CircuitBreaker, CircuitState, RetryPolicy, api_client
+from lmk.generated.exceptions import ApiException
+from lmk.generated.rest import RESTResponse
+from lmk.instance import Instance
+
+
+def test_retry_policy():
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.retry_in(ConnectionError(), 1) is not None
+    assert policy.retry_in(ApiException(status=503), 2) is not None
+    assert policy.retry_in(ApiException(status=503), 3) is None
+    assert policy.retry_in(ApiException(status=400), 1) is None
+
+
+def test_circuit_breaker():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+
+    for _ in range(2):
+        breaker.before_request()
+        breaker.record_failure(ConnectionError())
+
+    assert breaker.state == CircuitState.Open
+    with pytest.raises(exc.CircuitOpen):
+        breaker.before_request()
+
+    breaker._opened_at -= 1
+    # Only one trial request is let through while half-open
+    breaker.before_request()
+    assert breaker.state == CircuitState.HalfOpen
+    with pytest.raises(exc.CircuitOpen):
+        breaker.before_request()
+
+    breaker.record_success()
+    assert breaker.state == CircuitState.Closed
+
+
+def test_circuit_breaker_interrupted_trial():
+    client = api_client("http://lmk.test")
+    client.rest_client.request = MagicMock(side_effect=KeyboardInterrupt)
+    breaker = client.circuit_breaker = CircuitBreaker(
+        failure_threshold=1, reset_timeout=0
+    )
+    breaker.record_failure(ConnectionError())
+
+    with pytest.raises(KeyboardInterrupt):
+        client.request("GET", "http://lmk.test/v1/app/current")
+
+    # The interrupted trial doesn't count, so another one is let through
+    assert breaker.state == CircuitState.HalfOpen
+    breaker.before_request()
+
+
+def test_notify_retries_with_same_idempotency_key(tmp_path):
+    config_path = os.path.join(tmp_path, "config")
+    open(config_path, "w").close()
+    instance = Instance(
+        config_path=config_path, access_token="token", sync_config=False
+    )
+    instance.ledger = None
+    instance.client.retry_policy = RetryPolicy(base=0.001)
+    keys = []
+
+    def request(method, url, headers=None, **kwargs):
+        keys.append(headers["Idempotency-Key"])
+        if len(keys) < 3:
+            # e.g. a gateway timeout after the server created the event
+            raise ApiException(status=504)
+        body = {
+            "eventId": "evt_1",
+            "userId": "user",
+            "actor": {"type": "APP", "actorId": "app", "name": "App"},
+            "message": "hi",
+            "contentType": "text/plain",
+            "channels": [],
+            "createdAt": "2024-01-01T00:00:00Z",
+        }
+        return RESTResponse(
+            urllib3.HTTPResponse(
+                body=json.dumps(body).encode(),
+                status=201,
+                headers={"content-type": "application/json"},
+                preload_content=True,
+            )
+        )
+
+    instance.client.rest_client.request = request
+    try:
+        instance.notify("hi")
+        instance.notify("hi")
+    finally:
+        instance.close()
+
+    assert len(keys) == 4
+    assert keys[0] == keys[1] == keys[2]
+    # Each call gets its own key
+    assert keys[3] != keys[0]
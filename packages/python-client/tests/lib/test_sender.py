@@ -0,0 +1,62 @@
+import asyncio
+import os
+from unittest.mock import MagicMock
+
+import pytest
+
+from lmk.instance import Instance
+from lmk.sender import NotificationSender
+
+
+class FakeInstance:
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.calls = []
+        self.client = MagicMock()
+        self.client.transport.aclose.side_effect = lambda: asyncio.sleep(0)
+
+    async def notify(self, **kwargs):
+        self.calls.append(kwargs)
+        await asyncio.sleep(self.delay)
+        return {"message": kwargs["message"]}
+
+
+def test_sender_coalesces_burst():
+    instance = FakeInstance()
+    sender = NotificationSender(instance, batch_window=0.1, coalesce=True)  # type: ignore
+
+    futures = [
+        sender.submit(message=f"shard {i}", content_type="text/plain", notify=True)
+        for i in range(5)
+    ]
+
+    assert sender.close(timeout=5)
+    assert len(instance.calls) == 1
+    assert instance.calls[0]["message"] == "\n\n".join(f"shard {i}" for i in range(5))
+    assert all(f.result() == {"message": instance.calls[0]["message"]} for f in futures)
+
+
+def test_sender_queue_full():
+    instance = FakeInstance(delay=0.1)
+    sender = NotificationSender(  # type: ignore
+        instance, max_queue_size=1, batch_window=0.5, coalesce=False
+    )
+
+    first = sender.submit(message="first", content_type="text/plain", notify=True)
+    second = sender.submit(message="second", content_type="text/plain", notify=True)
+
+    assert second.exception() is not None
+    assert sender.close(timeout=5)
+    assert first.result() == {"message": "first"}
+
+
+def test_notify_rejects_durable_deferred(tmp_path):
+    open(os.path.join(tmp_path, "config"), "w").close()
+    instance = Instance(
+        config_path=os.path.join(tmp_path, "config"),
+        access_token="token",
+        sync_config=False,
+    )
+    with pytest.raises(ValueError):
+        instance.notify("hi", durable=True, deferred=True)
+    assert not instance.outbox.claim(10)
@@ -0,0 +1,336 @@
+import asyncio
+import json
+import time
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from lmk import exc
+from lmk.utils.asyncio import deadline_retry_rule
+
+from lmk.utils.ws import (
+    InvalidWSMessage,
+    StateChannel,
+    WebSocket,
+    WSMessageDropped,
+    WSQueueFull,
+    is_permanent_ws_error,
+    ws_connected,
+)
+
+
+class FakeWebSocket:
+    def __init__(self) -> None:
+        self.sent = []
+
+    async def send(self, data) -> None:
+        self.sent.append(json.loads(json.dumps(data)))
+
+
+def test_state_channel_sends_changed_keys():
+    ws = FakeWebSocket()
+    channel = StateChannel(ws)  # type: ignore
+    state = {"shellState": "busy", "cellText": "x = 1\n" * 10_000, "cellError": None}
+
+    async def main():
+        assert await channel.update(state)
+        assert await channel.update({**state, "shellState": "idle"})
+        assert not await channel.update({**state, "shellState": "idle"})
+        assert await channel.update({"shellState": "idle", "cellText": "y"})
+        # Messages may have been lost while the web socket was reconnecting
+        ws_connected.send(ws)
+        assert await channel.update({"shellState": "idle", "cellText": "y"})
+        assert await channel.update({"shellState": "busy", "cellText": "y"}, full=True)
+
+    asyncio.run(main())
+
+    assert ws.sent == [
+        state,
+        {"shellState": "idle"},
+        {"cellText": "y", "cellError": None},
+        {"shellState": "idle", "cellText": "y"},
+        {"shellState": "busy", "cellText": "y"},
+    ]
+    assert len(json.dumps(ws.sent[1])) * 1000 < len(json.dumps(ws.sent[0]))
+
+
+def test_state_channel_resyncs_periodically():
+    ws = FakeWebSocket()
+    channel = StateChannel(ws, resync_interval=0.0)  # type: ignore
+
+    async def main():
+        await channel.update({"a": 1, "b": 2})
+        await channel.update({"a": 1, "b": 3})
+
+    asyncio.run(main())
+
+    assert ws.sent == [{"a": 1, "b": 2}, {"a": 1, "b": 3}]
+
+
+def test_state_channel_resends_after_failed_send():
+    ws = FakeWebSocket()
+    channel = StateChannel(ws)  # type: ignore
+    send = ws.send
+
+    async def failing_send(data) -> None:
+        ws.send = send  # type: ignore
+        raise WSMessageDropped()
+
+    async def main():
+        await channel.update({"a": 1, "b": 2})
+        ws.send = failing_send  # type: ignore
+        with pytest.raises(WSMessageDropped):
+            await channel.update({"a": 1, "b": 3})
+        assert await channel.update({"a": 1, "b": 3})
+
+    asyncio.run(main())
+
+    assert ws.sent == [{"a": 1, "b": 2}, {"a": 1, "b": 3}]
+
+
+def test_websocket_overflow_policies():
+    async def main():
+        ws = WebSocket(None, "", max_queue_size=2)  # type: ignore
+        ws.send_nowait(1)
+        ws.send_nowait(2)
+        with pytest.raises(WSQueueFull):
+            ws.send_nowait(3)
+
+        ws = WebSocket(None, "", max_queue_size=2, overflow="drop-oldest")  # type: ignore
+        waiting = asyncio.create_task(ws.send(1))
+        await asyncio.sleep(0)
+        ws.send_nowait(2)
+        ws.send_nowait(3)
+        with pytest.raises(WSMessageDropped):
+            await waiting
+        assert [item.data for item in ws._pending] == [2, 3]
+        assert ws.dropped == 1
+
+        ws = WebSocket(None, "", max_queue_size=2, overflow="coalesce")  # type: ignore
+        ws.send_nowait({"bar": 1, "n": 1}, key=1)
+        ws.send_nowait({"bar": 2, "n": 1}, key=2)
+        ws.send_nowait({"bar": 1, "n": 2}, key=1)
+        assert [item.data for item in ws._pending] == [
+            {"bar": 1, "n": 2},
+            {"bar": 2, "n": 1},
+        ]
+
+    asyncio.run(main())
+
+
+def test_websocket_echo():
+    async def echo(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for message in ws:
+            await ws.send_str(message.data)
+        return ws
+
+    async def main():
+        app = web.Application()
+        app.add_routes([web.get("/ws", echo)])
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]  # type: ignore
+
+        received = []
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with WebSocket(session, f"http://127.0.0.1:{port}/ws") as ws:
+                    await ws.send({"seq": 0})
+                    for seq in range(1, 100):
+                        ws.send_nowait({"seq": seq})
+                    await ws.flush()
+                    async for message in ws:
+                        received.append(message["seq"])
+                        if len(received) == 100:
+                            break
+                    await ws.close()
+        finally:
+            await runner.cleanup()
+        return received
+
+    assert asyncio.run(main()) == list(range(100))
+
+
+def test_websocket_reconnects_without_replay():
+    connections = []
+
+    async def handler(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        received = []
+        connections.append(received)
+        async for message in ws:
+            received.append(json.loads(message.data))
+            # The first connection drops, as if the server was restarting
+            if len(connections) == 1 and len(received) == 4:
+                await ws.close(code=aiohttp.WSCloseCode.GOING_AWAY)
+            elif len(connections) > 1 and received[-1].get("seq") == 9:
+                await ws.send_str(json.dumps({"ack": True}))
+        return ws
+
+    async def main():
+        app = web.Application()
+        app.add_routes([web.get("/ws", handler)])
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]  # type: ignore
+
+        async def get_url():
+            return f"http://127.0.0.1:{port}/ws"
+
+        try:
+            async with aiohttp.ClientSession() as session:
+                ws = WebSocket(
+                    session,
+                    get_url,
+                    retry_rule=deadline_retry_rule(10, backoff=lambda failures: 0),
+                    handshake=lambda: {"event": "connect"},
+                )
+                async with ws:
+                    for seq in range(5):
+                        await ws.send({"seq": seq})
+
+                    async def first_message():
+                        async for message in ws:
+                            return message
+
+                    # The receiver sees the disconnect and reconnects
+                    received = asyncio.create_task(first_message())
+                    while ws.reconnects == 0:
+                        await asyncio.sleep(0.01)
+                    for seq in range(5, 10):
+                        await ws.send({"seq": seq})
+                    assert await received == {"ack": True}
+                    assert ws.reconnects == 1
+                    await ws.close()
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(main())
+
+    first, second = connections
+    assert first == [{"event": "connect"}] + [{"seq": seq} for seq in range(3)]
+    # Messages written to the dropped connection aren't written again
+    assert second == [{"event": "connect"}] + [{"seq": seq} for seq in range(5, 10)]
+
+
+def test_deadline_retry_rule(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    rule = deadline_retry_rule(60, backoff=lambda failures: 1.0)
+    error = ConnectionError()
+
+    assert rule(1, error) == 1.0
+    now[0] = 59.0
+    assert rule(100, error) == 1.0
+    now[0] = 60.0
+    assert rule(101, error) is None
+    # A new outage gets the full deadline again
+    assert rule(1, error) == 1.0
+    assert deadline_retry_rule(None)(10**6, error) <= 30.0
+
+
+def test_deadline_retry_rule_permanent_errors():
+    rule = deadline_retry_rule(
+        60, backoff=lambda failures: 1.0, is_permanent=is_permanent_ws_error
+    )
+
+    def handshake_error(status):
+        return aiohttp.WSServerHandshakeError(None, (), status=status)  # type: ignore
+
+    assert rule(1, exc.NotLoggedIn()) is None
+    assert rule(1, handshake_error(403)) is None
+    assert rule(1, InvalidWSMessage("{")) is None
+    assert rule(1, handshake_error(503)) == 1.0
+    assert rule(2, ConnectionError()) == 1.0
+
+
+async def start_server(handler):
+    app = web.Application()
+    app.add_routes([web.get("/ws", handler)])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # type: ignore
+    return runner, f"http://127.0.0.1:{port}/ws"
+
+
+def test_websocket_permanent_error_not_retried():
+    attempts = []
+
+    async def handler(request):
+        attempts.append(request)
+        return web.Response(status=403)
+
+    async def main():
+        runner, url = await start_server(handler)
+        rule = deadline_retry_rule(
+            60, backoff=lambda failures: 0, is_permanent=is_permanent_ws_error
+        )
+        try:
+            async with aiohttp.ClientSession() as session:
+                with pytest.raises(aiohttp.WSServerHandshakeError):
+                    async with WebSocket(session, url, retry_rule=rule):
+                        pass
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(main())
+
+    assert len(attempts) == 1
+
+
+def test_websocket_exit_during_outage():
+    attempts = []
+
+    async def handler(request):
+        attempts.append(request)
+        if len(attempts) > 1:
+            # The server stays down
+            return web.Response(status=503)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await ws.close(code=aiohttp.WSCloseCode.GOING_AWAY)
+        return ws
+
+    async def main():
+        runner, url = await start_server(handler)
+        try:
+            async with aiohttp.ClientSession() as session:
+                ws = WebSocket(
+                    session,
+                    url,
+                    retry_rule=deadline_retry_rule(3600, backoff=lambda failures: 0.01),
+                    close_timeout=0.2,
+                )
+                async with ws:
+
+                    async def receive():
+                        async for _ in ws:
+                            pass
+
+                    receiver = asyncio.create_task(receive())
+                    await asyncio.sleep(0.2)
+                    ws.send_nowait({"seq": 1})
+                    started = time.monotonic()
+                # Queued messages are dropped rather than waiting out the deadline,
+                # and the reconnect loop stops
+                assert time.monotonic() - started < 2
+                await asyncio.wait_for(receiver, 2)
+                count = len(attempts)
+                await asyncio.sleep(0.1)
+                assert len(attempts) == count
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(main())
+
+    assert len(attempts) > 2